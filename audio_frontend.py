@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+音频前端：解码为float32单声道、去直流、多相滤波重采样到16kHz
+"""
+
+import math
+from functools import lru_cache
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+import soundfile as sf
+
+TARGET_SAMPLE_RATE = 16000
+
+
+class PolyphaseResampler:
+    """固定 src_rate → dst_rate 的多相FIR重采样器
+
+    重采样比化简为 up/down（44.1k→16k 为 160/441，48k→16k 为 1/3），
+    Kaiser窗低通滤波器只设计一次并拆成 up 个相位子滤波器；
+    每个输出样本只与一个子滤波器做点积，不需要显式插零上采样。
+    输入可以是 [samples] 或 [batch, samples]（逐行计算）。
+    """
+
+    BLOCK_ELEMENTS = 1 << 18
+
+    def __init__(self, src_rate: int, dst_rate: int, half_width: int = 10, beta: float = 5.0):
+        g = math.gcd(src_rate, dst_rate)
+        self.up = dst_rate // g
+        self.down = src_rate // g
+        max_rate = max(self.up, self.down)
+        self.half_len = half_width * max_rate
+        n = np.arange(-self.half_len, self.half_len + 1)
+        # 截止频率为 1/max_rate（相对上采样后的奈奎斯特频率），直流增益归一化为 up
+        h = np.sinc(n / max_rate) * np.kaiser(len(n), beta)
+        h = h / h.sum() * self.up
+        self.taps = -(-len(h) // self.up)
+        h = np.pad(h, (0, self.taps * self.up - len(h)))
+        # kernels[p] 为第 p 个相位的子滤波器，已翻转为与滑动窗口直接做点积
+        self.kernels = np.ascontiguousarray(h.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+
+    def output_length(self, num_samples: int) -> int:
+        return -(-num_samples * self.up // self.down)
+
+    def __call__(self, audio: np.ndarray) -> np.ndarray:
+        if self.up == self.down == 1:
+            return audio.astype(np.float32, copy=False)
+        num_samples = audio.shape[-1]
+        n_out = self.output_length(num_samples)
+        # 输出样本 n 对应上采样序列中的位置 t = n*down + half_len：
+        # 相位 p = t % up，输入下标 t // up 及其之前的 taps 个样本参与点积
+        last_index = ((n_out - 1) * self.down + self.half_len) // self.up
+        pad = [(0, 0)] * (audio.ndim - 1) + [(self.taps - 1, max(0, last_index - num_samples + 1))]
+        windows = np.lib.stride_tricks.sliding_window_view(
+            np.pad(audio.astype(np.float32, copy=False), pad), self.taps, axis=-1
+        )
+        out = np.empty(audio.shape[:-1] + (n_out,), dtype=np.float32)
+        # 逐行做点积比对 [batch, ...] 的三维视图做批量matmul更快（跨行跨步访问破坏缓存局部性）
+        for row in np.ndindex(audio.shape[:-1]):
+            self._resample_row(windows[row], out[row])
+        return out
+
+    def _resample_row(self, windows: np.ndarray, out: np.ndarray):
+        n_out = out.shape[-1]
+        # 输出下标按 n % up 分组：同组共用一个相位，输入下标以 down 为步长递增；
+        # 每次点积取出约 BLOCK_ELEMENTS 个元素的窗口，工作集留在缓存中
+        block = max(1, self.BLOCK_ELEMENTS // self.taps)
+        for r in range(min(self.up, n_out)):
+            t = r * self.down + self.half_len
+            start = t // self.up
+            kernel = self.kernels[t % self.up]
+            count = len(range(r, n_out, self.up))
+            for q0 in range(0, count, block):
+                q1 = min(count, q0 + block)
+                out[r + q0 * self.up:r + (q1 - 1) * self.up + 1:self.up] = (
+                    windows[start + q0 * self.down:start + q1 * self.down:self.down] @ kernel
+                )
+
+
+@lru_cache(maxsize=None)
+def get_resampler(src_rate: int, dst_rate: int = TARGET_SAMPLE_RATE) -> PolyphaseResampler:
+    """每个 (源采样率, 目标采样率) 只设计一次滤波器"""
+    return PolyphaseResampler(src_rate, dst_rate)
+
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """[samples, channels] 平均混为单声道 float32"""
+    audio = np.asarray(audio, dtype=np.float32)
+    return audio.mean(axis=1, dtype=np.float32) if audio.ndim == 2 else audio
+
+
+def remove_dc(audio: np.ndarray) -> np.ndarray:
+    """减去均值（直流分量）"""
+    return audio - audio.mean(dtype=np.float32) if len(audio) else audio
+
+
+def decode_audio(path: str) -> Tuple[np.ndarray, int]:
+    """直接解码为float32（不经float64），多声道混为单声道"""
+    audio, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+    return to_mono(audio), sample_rate
+
+
+def prepare_batch(clips: Sequence[Tuple[np.ndarray, int]],
+                  target_rate: int = TARGET_SAMPLE_RATE) -> List[np.ndarray]:
+    """把 (音频, 采样率) 列表混为单声道、去直流并重采样到 target_rate，结果与输入一一对应
+
+    同一采样率的片段共用一个已缓存的重采样器。片段逐条重采样而不是填充成一个矩阵：
+    不同长度的片段填充后会在填充部分做无用计算，而且实测批量三维matmul在CPU上反而更慢。
+    """
+    return [get_resampler(sample_rate, target_rate)(remove_dc(to_mono(audio))) for audio, sample_rate in clips]
+
+
+def iter_windows(path: str, window_seconds: float = 30, overlap_seconds: float = 2,
+                 target_rate: int = TARGET_SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """按固定窗口分块读取长音频，相邻窗口重叠 overlap_seconds，逐个产出 target_rate 的float32单声道窗口
+
+    通过 soundfile 分块读取，内存中任何时候只有一个窗口，与录音总时长无关。
+    """
+    sample_rate = sf.info(path).samplerate
+    window = int(window_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    resampler = get_resampler(sample_rate, target_rate)
+    for block in sf.blocks(path, blocksize=window, overlap=overlap, dtype="float32", always_2d=True):
+        yield resampler(remove_dc(to_mono(block)))
+
+
+def load_batch(paths: Sequence[str], target_rate: int = TARGET_SAMPLE_RATE) -> List[np.ndarray]:
+    """批量解码并转换为 target_rate 的float32单声道音频"""
+    return prepare_batch([decode_audio(path) for path in paths], target_rate)
+
+
+def load_audio(path: str, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """解码单个文件为 target_rate 的float32单声道音频"""
+    return load_batch([path], target_rate)[0]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+异步微批处理：把并发的单条请求攒成批次，交给批量函数统一执行
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """按最大批次大小和最长等待时间聚合请求
+
+    调用方 await submit(item) 拿到自己那一条的结果；后台循环把队列中的请求
+    攒成批次，在线程池中调用 batch_fn(items) -> results（与输入一一对应）。
+    results 中的异常实例只作为对应那一条请求的异常抛出；batch_fn 本身抛出的异常作用于整批。
+    同时执行的批次数受 workers 限制，所有 worker 忙碌时新请求继续排队，
+    下一批次因此更容易被填满。
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 20,
+                 workers: int = 1, executor: Optional[Executor] = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+
+    def start(self):
+        """启动后台聚合循环"""
+        if self._loop_task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop_task = asyncio.create_task(self._collect_loop())
+
+    async def submit(self, item: Any) -> Any:
+        """提交单条请求，等待其批次执行完成后返回对应结果"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def close(self):
+        """停止聚合循环，等待已发出的批次完成"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 先占住执行槽位再取请求：worker全忙时请求留在队列里继续积累
+            await self._slots.acquire()
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except BaseException:
+                self._slots.release()
+                for _, future in batch:
+                    future.cancel()
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.batch_fn, items
+            )
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
@@ -0,0 +1,641 @@
+#!/usr/bin/env python3
+"""
+微调数据Pipeline吞吐量基准测试
+端到端吞吐量使用模拟的下载/转录/LLM后端；批量转录对比需要本地Whisper模型
+"""
+
+import asyncio
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from fine_tuning_pipeline import AudioFineTuningPipeline
+
+# 模拟各阶段耗时（秒）；转录按批次计：固定开销 + 每条增量
+DOWNLOAD_LATENCY = 0.05
+TRANSCRIBE_LATENCY = 0.02
+TRANSCRIBE_PER_CLIP = 0.004
+LABEL_LATENCY = 0.08
+
+
+class FakePipeline(AudioFineTuningPipeline):
+    """替换掉Supabase/Whisper/OpenAI的模拟Pipeline"""
+
+    def __init__(self, download_concurrency: int = 8, transcribe_workers: int = 1,
+                 label_concurrency: int = 8, batch_size: int = 16, latency_scale: float = 1.0):
+        self._init_stages(download_concurrency, transcribe_workers, label_concurrency, batch_size)
+        self.latency_scale = latency_scale
+        self.downloads = 0
+
+    async def download_audio(self, audio_url: str) -> str:
+        self.downloads += 1
+        await asyncio.sleep(DOWNLOAD_LATENCY * self.latency_scale)
+        return audio_url
+
+    def discard_audio(self, audio_path: str):
+        pass
+
+    def transcribe_batch(self, items):
+        time.sleep((TRANSCRIBE_LATENCY + TRANSCRIBE_PER_CLIP * len(items)) * self.latency_scale)
+        return [f"转录内容 {audio_path}" for _, audio_path in items]
+
+    async def generate_expected_summary(self, text: str) -> str:
+        await asyncio.sleep(LABEL_LATENCY * self.latency_scale)
+        return text[-6:]
+
+
+async def sequential_baseline(pipeline: FakePipeline, records):
+    """原始实现：逐条下载、转录、标注"""
+    samples = []
+    for record in records:
+        audio_path = await pipeline.download_audio(record["audio_url"])
+        transcription = pipeline.transcribe_batch([(record["id"], audio_path)])[0]
+        summary = await pipeline.generate_expected_summary(transcription)
+        samples.append(pipeline.build_training_sample(transcription, summary))
+    return samples
+
+
+async def bench_collect_training_data(num_records: int = 200):
+    """对比串行实现与分阶段并发实现的吞吐量"""
+    records = [{"id": i, "audio_url": f"fake://audio/{i:05d}.m4a"} for i in range(num_records)]
+
+    print(f"📊 collect_training_data 吞吐量 ({num_records} 条记录)")
+    print(f"   模拟耗时: 下载 {DOWNLOAD_LATENCY}s / 转录 {TRANSCRIBE_LATENCY}s+{TRANSCRIBE_PER_CLIP}s×条 / 标注 {LABEL_LATENCY}s")
+
+    baseline = FakePipeline()
+    start = time.perf_counter()
+    expected = await sequential_baseline(baseline, records[:20])
+    elapsed = time.perf_counter() - start
+    print(f"   串行基线: {20 / elapsed:8.1f} 条/秒 (取前20条)")
+
+    for download, workers, label in [(4, 1, 4), (8, 1, 8), (16, 2, 16), (32, 4, 32)]:
+        pipeline = FakePipeline(download, workers, label)
+        start = time.perf_counter()
+        samples = [sample async for _, sample in pipeline.iter_training_samples(records)]
+        elapsed = time.perf_counter() - start
+        await pipeline.close()
+
+        assert samples[:20] == expected, "输出顺序必须与输入一致"
+        print(f"   下载{download:>2} 转录{workers} 标注{label:>2}: {num_records / elapsed:8.1f} 条/秒")
+
+    # 多个数据分区同时运行时共享下载/标注的并发上限（build_corpus 的场景）
+    class CountingPipeline(FakePipeline):
+        in_flight = peak = 0
+
+        async def download_audio(self, audio_url: str) -> str:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await super().download_audio(audio_url)
+            finally:
+                self.in_flight -= 1
+
+    pipeline = CountingPipeline(download_concurrency=4, latency_scale=0.1)
+
+    async def partition(part):
+        return [sample async for _, sample in pipeline.iter_training_samples(records[part::4])]
+
+    await asyncio.gather(*(partition(part) for part in range(4)))
+    await pipeline.close()
+    assert pipeline.peak == 4, f"4 个分区的总下载并发应为 4，实际 {pipeline.peak}"
+    print(f"   4 个分区并行: 下载并发峰值 {pipeline.peak} (上限 4)")
+
+    # 批内单条音频解码失败只影响这一条，同批其他记录照常产出
+    class BrokenClipPipeline(FakePipeline):
+        def transcribe_batch(self, items):
+            return [ValueError(f"无法解码 {path}") if path.endswith("broken.m4a") else text
+                    for (_, path), text in zip(items, super().transcribe_batch(items))]
+
+    broken = [dict(record, audio_url="fake://audio/broken.m4a") if record["id"] % 10 == 3 else record
+              for record in records]
+    pipeline = BrokenClipPipeline(latency_scale=0.1)
+    produced = [record_id async for record_id, _ in pipeline.iter_training_samples(broken)]
+    await pipeline.close()
+    assert produced == [str(record["id"]) for record in records if record["id"] % 10 != 3], "坏文件不应拖垮同批记录"
+    print(f"   {num_records // 10} 条坏文件: 其余 {len(produced)} 条全部产出")
+
+
+def bench_batch_transcription(num_clips: int = 32, model_name: str = "base"):
+    """对比逐条 model.transcribe 与 BatchTranscriber 的转录吞吐量（真实Whisper，CPU）"""
+    import shutil
+    import tempfile
+    import soundfile as sf
+    import torch
+    import whisper
+    from whisper_batch import BatchTranscriber
+
+    model = whisper.load_model(model_name, device="cpu")
+    rng = np.random.default_rng(0)
+    # 5-25秒的合成语音包络噪声，时长分布接近语音备忘录
+    clips = {}
+    for i in range(num_clips):
+        n = int(rng.uniform(5, 25) * 16000)
+        envelope = np.abs(np.sin(np.linspace(0, 20, n)))
+        clips[f"clip_{i:03d}"] = (rng.normal(0, 0.1, n) * envelope).astype(np.float32)
+    total_audio = sum(len(a) for a in clips.values()) / 16000
+
+    print(f"📊 Whisper批量转录 ({num_clips} 段, 共 {total_audio:.0f} 秒音频, 模型 {model_name})")
+
+    # 安静片段和响亮片段同批时，特征应与各自单独提取时一致
+    quiet, loud = clips["clip_000"] * 0.001, clips["clip_001"]
+    batched = BatchTranscriber(model).log_mel([quiet, loud])
+    for i, audio in enumerate((quiet, loud)):
+        alone = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels)
+        assert torch.allclose(batched[i], alone, atol=1e-5), "批内特征不应受同批片段影响"
+
+    # 长音频在停顿处切窗，不在30秒整点把词切开
+    transcriber = BatchTranscriber(model)
+    speech = np.concatenate([rng.normal(0, 0.1, 28 * 16000), np.zeros(8000),
+                             rng.normal(0, 0.1, 40 * 16000)]).astype(np.float32)
+    spans = transcriber.split_windows(speech)
+    assert all(end - start <= 30 * 16000 for start, end in spans) and spans[-1][1] == len(speech)
+    assert 28 * 16000 <= spans[0][1] <= 28 * 16000 + 8000, f"切窗点应落在停顿内: {spans[0][1] / 16000:.2f}s"
+
+    # 批内有无法解码的文件时，只有这一条返回异常
+    audio_dir = tempfile.mkdtemp()
+    try:
+        good, bad = f"{audio_dir}/good.wav", f"{audio_dir}/bad.m4a"
+        sf.write(good, clips["clip_002"], 16000)
+        with open(bad, "wb") as f:
+            f.write(b"not audio")
+        results = transcriber.transcribe_batch({"good": good, "bad": bad})
+        assert isinstance(results["good"], str) and isinstance(results["bad"], Exception), "坏文件不应拖垮整批"
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+    start = time.perf_counter()
+    for audio in clips.values():
+        model.transcribe(audio, language="zh", fp16=False, temperature=0.0)
+    elapsed = time.perf_counter() - start
+    print(f"   逐条转录:         {num_clips / elapsed:6.2f} 段/秒")
+
+    for batch_size, max_padding_ratio in [(8, 0.3), (16, 0.3), (16, 0.6)]:
+        transcriber = BatchTranscriber(model, batch_size=batch_size, max_padding_ratio=max_padding_ratio)
+        start = time.perf_counter()
+        transcriber.transcribe_arrays(clips)
+        elapsed = time.perf_counter() - start
+        print(f"   批量 bs={batch_size:<2} pad≤{max_padding_ratio}: {num_clips / elapsed:6.2f} 段/秒")
+
+
+async def bench_streaming_memory():
+    """流式写入分片时，峰值内存应与记录总数无关"""
+    import shutil
+    import tempfile
+    import tracemalloc
+    from dataset_writer import ShardedJsonlWriter
+
+    print("📊 流式分片写入峰值内存")
+    for num_records in (1000, 10000):
+        records = ({"id": i, "audio_url": f"fake://audio/{i:05d}.m4a"} for i in range(num_records))
+        output_dir = tempfile.mkdtemp()
+        pipeline = FakePipeline(32, 2, 32, latency_scale=0.02)
+        writer = ShardedJsonlWriter(output_dir, max_samples_per_shard=500, compress=True)
+        tracemalloc.start()
+        async for record_id, sample in pipeline.iter_training_samples(records):
+            writer.write(sample, key=record_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        manifest = writer.close()
+        await pipeline.close()
+        shutil.rmtree(output_dir)
+        print(f"   {num_records:>6} 条记录: 峰值 {peak / 1024:8.1f} KiB, {len(manifest['shards'])} 个分片")
+
+
+async def bench_resume(num_records: int = 10000, crash_after: int = 6000):
+    """模拟构建中途崩溃，比较重启后需要重新处理的记录数和耗时"""
+    import shutil
+    import tempfile
+    from build_journal import BuildJournal
+    from dataset_writer import open_manifest
+
+    records = [{"id": i, "audio_url": f"fake://audio/{i:05d}.m4a"} for i in range(num_records)]
+    output_dir = tempfile.mkdtemp()
+    print(f"📊 断点续跑 ({num_records} 条记录, 第 {crash_after} 条样本后崩溃)")
+
+    async def run(crash_at=None, journal=True):
+        pipeline = FakePipeline(32, 2, 32, latency_scale=0.02)
+        if journal:
+            pipeline.journal = BuildJournal(f"{output_dir}/journal.sqlite3")
+        writer = pipeline.open_training_writer(output_dir, max_samples_per_shard=500)
+        start = time.perf_counter()
+        written = 0
+        samples = pipeline.iter_training_samples(records)
+        async for record_id, sample in samples:
+            writer.write(sample, key=record_id)
+            written += 1
+            if written == crash_at:
+                await samples.aclose()
+                break
+        else:
+            writer.close()
+        elapsed = time.perf_counter() - start
+        downloads = pipeline.downloads
+        await pipeline.close()
+        return elapsed, downloads, writer.samples_written
+
+    try:
+        elapsed, downloads, total = await run(crash_at=crash_after)
+        print(f"   首次运行:   {elapsed:6.2f}s, 下载 {downloads:>5} 次, 完整分片内 {total} 条")
+        elapsed, downloads, total = await run()
+        print(f"   崩溃后重启: {elapsed:6.2f}s, 下载 {downloads:>5} 次, 完整分片内 {total} 条")
+        elapsed, downloads, total = await run()
+        print(f"   全部完成后: {elapsed:6.2f}s, 下载 {downloads:>5} 次, 完整分片内 {total} 条")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    # 不启用构建日志时每次重新写：连续运行两次，上传文件的行数不变
+    output_dir = tempfile.mkdtemp()
+    try:
+        line_counts = []
+        for _ in range(2):
+            await run(journal=False)
+            with open_manifest(output_dir) as f:
+                line_counts.append(sum(1 for _ in f))
+        assert line_counts == [num_records, num_records], f"不启用日志时重复运行不应重复写入: {line_counts}"
+        print(f"   无构建日志连续运行两次: 各 {line_counts[0]} 行")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+async def bench_process_pool_scaling(num_clips: int = 64, model_name: str = "base"):
+    """转录进程池的吞吐量随进程数的扩展情况（每个进程只加载一次模型）"""
+    import multiprocessing
+    import os
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    import soundfile as sf
+    import whisper_batch
+    from batching import MicroBatcher
+
+    audio_dir = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(num_clips):
+        n = int(rng.uniform(5, 25) * 16000)
+        path = f"{audio_dir}/clip_{i:03d}.wav"
+        sf.write(path, (rng.normal(0, 0.1, n) * np.abs(np.sin(np.linspace(0, 20, n)))).astype(np.float32), 16000)
+        items.append((f"clip_{i:03d}", path))
+
+    cores = os.cpu_count() or 1
+    print(f"📊 转录进程池扩展性 ({num_clips} 段, {cores} 核, 模型 {model_name})")
+    baseline = None
+    try:
+        for processes in sorted({1, 2, 4, cores}):
+            if processes > cores:
+                continue
+            executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=whisper_batch.init_worker,
+                initargs=(model_name, 8, 0.3, max(1, cores // processes))
+            )
+            # 预热：确保所有进程完成模型加载，不计入吞吐
+            list(executor.map(whisper_batch.transcribe_in_worker, [items[:1]] * processes))
+            batcher = MicroBatcher(whisper_batch.transcribe_in_worker, max_batch_size=8,
+                                   workers=processes, executor=executor)
+            start = time.perf_counter()
+            async with batcher:
+                await asyncio.gather(*(batcher.submit(item) for item in items))
+            elapsed = time.perf_counter() - start
+            executor.shutdown()
+            throughput = num_clips / elapsed
+            baseline = baseline or throughput
+            print(f"   {processes:>2} 进程: {throughput:6.2f} 段/秒 (加速 {throughput / baseline:4.2f}x)")
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+# 各入口的最小启动脚本；子进程中执行，互不共享已导入的模块
+COLD_START_ENTRY_POINTS = {
+    "上传/轮询 (不加载模型)": """
+from fine_tuning_pipeline import AudioFineTuningPipeline
+AudioFineTuningPipeline("http://127.0.0.1:9", "stub.service.key", "sk-stub", cache_dir=CACHE_DIR)
+""",
+    "上传/轮询 (原先: 模块级导入whisper)": """
+import whisper
+from fine_tuning_pipeline import AudioFineTuningPipeline
+AudioFineTuningPipeline("http://127.0.0.1:9", "stub.service.key", "sk-stub", cache_dir=CACHE_DIR)
+""",
+    "构建数据集 (加载Whisper)": """
+from fine_tuning_pipeline import AudioFineTuningPipeline
+from model_registry import registry, whisper_model_key
+pipeline = AudioFineTuningPipeline("http://127.0.0.1:9", "stub.service.key", "sk-stub", cache_dir=CACHE_DIR)
+pipeline.whisper_model_key = whisper_model_key(MODEL_NAME)
+pipeline.whisper_model
+""",
+    "Step-Audio处理器 (仅构造)": """
+from step_audio_integration import StepAudioProcessor
+StepAudioProcessor(cache_dir=CACHE_DIR)
+""",
+}
+
+
+def bench_cold_start(model_name: str = "base"):
+    """每个入口在独立子进程中的冷启动耗时与峰值RSS"""
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    print(f"📊 冷启动耗时与峰值RSS (Whisper模型 {model_name})")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, body in COLD_START_ENTRY_POINTS.items():
+            script = (
+                f"CACHE_DIR = {cache_dir!r}\nMODEL_NAME = {model_name!r}\n{body}\n"
+                "import json, resource\n"
+                "print(json.dumps(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))\n"
+            )
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            elapsed = time.perf_counter() - start
+            if result.returncode != 0:
+                error = result.stderr.strip().splitlines()[-1:] or ["?"]
+                print(f"   {name}: 失败 ({error[0]})")
+                continue
+            # Linux上 ru_maxrss 单位为KiB
+            peak_kib = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"   {name}: {elapsed:6.2f}s, 峰值RSS {peak_kib / 1024:7.1f} MiB")
+
+
+async def start_stub_postgrest_server(num_rows: int, user_id: str = "user_1"):
+    """本地PostgREST兼容桩服务，支持本基准用到的 select / eq / or键集游标 / order / limit"""
+    import bisect
+    import re
+    from aiohttp import web
+
+    # 每3条记录共享同一个created_at，验证 (created_at, id) 复合游标
+    rows = [{
+        "id": i,
+        "user_id": user_id,
+        "audio_url": f"https://storage.example.com/audio/{i:06d}.m4a",
+        "created_at": f"2024-01-01T00:{(i // 3) // 60 % 60:02d}:{(i // 3) % 60:02d}.{i // 10800:06d}+00:00",
+        "duration": 30,
+        "metadata": {"device": "iPhone", "notes": "备注" * 100}
+    } for i in range(num_rows)]
+    rows.sort(key=lambda r: (r["created_at"], r["id"]))
+    index = [(r["created_at"], r["id"]) for r in rows]
+    keyset = re.compile(r'\(created_at\.gt\."([^"]+)",and\(created_at\.eq\."([^"]+)",id\.gt\."([^"]+)"\)\)')
+
+    async def audio_records(request):
+        params = request.query
+        offset = 0
+        if "or" in params:
+            # 相当于数据库在 (created_at, id) 索引上的范围扫描
+            created_at, _, record_id = keyset.fullmatch(params["or"]).groups()
+            offset = bisect.bisect_right(index, (created_at, int(record_id)))
+        limit = int(params.get("limit", len(rows)))
+        result = [r for r in rows[offset:offset + limit]
+                  if params.get("user_id") in (None, f"eq.{r['user_id']}")]
+        select = params.get("select", "*")
+        if select != "*":
+            columns = select.split(",")
+            result = [{c: r[c] for c in columns} for r in result]
+        return web.json_response(result)
+
+    app = web.Application()
+    app.router.add_get("/rest/v1/audio_records", audio_records)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def bench_record_reader(num_rows: int = 20000):
+    """对比一次性 select("*") 与键集分页读取的峰值内存"""
+    import tracemalloc
+    from supabase import create_client
+    from record_reader import KeysetPageReader
+
+    runner, url = await start_stub_postgrest_server(num_rows)
+    client = create_client(url, "stub.service.key")
+    print(f"📊 Supabase记录读取 ({num_rows} 行, 本地PostgREST桩服务)")
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = await asyncio.to_thread(
+            client.table("audio_records").select("*").eq("user_id", "user_1").execute
+        )
+        full_ids = [r["id"] for r in response.data]
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del response
+        print(f"   select(\"*\") 一次读取: {elapsed:6.2f}s, 峰值 {peak / 1024 / 1024:7.1f} MiB")
+
+        for page_size in (200, 1000):
+            reader = KeysetPageReader(client, page_size=page_size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            ids = [record["id"] async for record in reader.iter_records("user_1")]
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert sorted(ids) == sorted(full_ids) and len(set(ids)) == len(ids), "分页结果必须不重不漏"
+            print(f"   键集分页 page={page_size:<5}: {elapsed:6.2f}s, 峰值 {peak / 1024 / 1024:7.1f} MiB, "
+                  f"{reader.pages_fetched} 页")
+    finally:
+        await runner.cleanup()
+
+
+async def start_stub_llm_server(latency: float = 0.05, rate_limit_every: int = 10, retry_after=lambda: "0.05"):
+    """本地OpenAI兼容桩服务：固定延迟，每 rate_limit_every 个请求返回一次429，Retry-After 取 retry_after()"""
+    from aiohttp import web
+
+    counter = {"requests": 0}
+
+    async def chat_completions(request):
+        counter["requests"] += 1
+        if rate_limit_every and counter["requests"] % rate_limit_every == 0:
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": retry_after()})
+        body = await request.json()
+        await asyncio.sleep(latency)
+        text = body["messages"][-1]["content"]
+        return web.json_response({"choices": [{"message": {"content": f" {text[:8]} "}}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+
+async def bench_labeling(num_texts: int = 400, unique: int = 100):
+    """对比逐条同步请求与去重+缓存+并发的标签生成"""
+    import shutil
+    import tempfile
+    from email.utils import formatdate
+    from step_audio_client import parse_retry_after
+    from summary_labeler import SummaryLabeler
+
+    rng = np.random.default_rng(0)
+    base_texts = [f"第{i}条语音备忘 记得买菜和开会" for i in range(unique)]
+    # 同一内容在标点、空格、全半角上略有差异
+    variants = ["{}", "{}。", " {} ", "{}！", "{}，"]
+    texts = [variants[rng.integers(len(variants))].format(base_texts[rng.integers(unique)])
+             for _ in range(num_texts)]
+
+    runner, base_url = await start_stub_llm_server()
+    cache_dir = tempfile.mkdtemp()
+    print(f"📊 标签生成 ({num_texts} 条转录, {unique} 条不同内容, 本地桩服务)")
+    try:
+        naive = SummaryLabeler("test-key", base_url=base_url, max_in_flight=1, cache_path=None)
+        start = time.perf_counter()
+        for text in texts[:50]:
+            await naive._request(text)
+        elapsed = time.perf_counter() - start
+        await naive.close()
+        print(f"   逐条请求:       {50 / elapsed:8.1f} 条/秒 (取前50条)")
+
+        for run in ("冷启动", "缓存命中"):
+            labeler = SummaryLabeler("test-key", base_url=base_url, max_in_flight=16,
+                                     cache_path=f"{cache_dir}/summaries.sqlite3")
+            start = time.perf_counter()
+            await labeler.summarize_many(texts)
+            elapsed = time.perf_counter() - start
+            stats = labeler.cache.stats()
+            print(f"   去重+缓存 {run}: {num_texts / elapsed:8.1f} 条/秒, "
+                  f"请求 {labeler.requests_sent} 次, 缓存命中 {stats['hits']}")
+            await labeler.close()
+    finally:
+        await runner.cleanup()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # Retry-After 为HTTP日期时同样按其等待，而不是解析失败中断标注
+    now = time.time()
+    assert parse_retry_after("2") == 2.0 and parse_retry_after("soon") is None
+    assert 9 <= parse_retry_after(formatdate(now + 10, usegmt=True)) <= 10
+    assert parse_retry_after(formatdate(now - 10, usegmt=True)) == 0.0
+    runner, base_url = await start_stub_llm_server(retry_after=lambda: formatdate(time.time(), usegmt=True))
+    try:
+        labeler = SummaryLabeler("test-key", base_url=base_url, max_in_flight=16, cache_path=None)
+        summaries = await labeler.summarize_many(base_texts[:40])
+        await labeler.close()
+        assert len(summaries) == 40 and labeler.requests_sent > 40, "应在HTTP日期格式的429后重试成功"
+        print(f"   HTTP日期 Retry-After: {labeler.requests_sent - 40} 次429后全部重试成功")
+    finally:
+        await runner.cleanup()
+
+
+async def start_stub_fine_tuning_server(job_durations: Dict[str, float], event_every: float = 0.2):
+    """本地微调作业桩服务：作业按给定时长运行，期间定期产生事件，事件接口按时间倒序分页"""
+    from aiohttp import web
+
+    started = time.monotonic()
+    counter = {"requests": 0}
+
+    def job_events(job_id: str) -> List[Dict]:
+        elapsed = time.monotonic() - started
+        duration = job_durations[job_id]
+        steps = int(min(elapsed, duration) / event_every)
+        events = [{"object": "fine_tuning.job.event", "id": f"{job_id}-evt-{i:05d}", "created_at": i,
+                   "level": "info", "message": f"Step {i}"} for i in range(steps + 1)]
+        if elapsed >= duration:
+            events.append({"object": "fine_tuning.job.event", "id": f"{job_id}-evt-done",
+                           "created_at": steps + 1, "level": "info", "message": "The job has successfully completed"})
+        return events[::-1]
+
+    async def retrieve(request):
+        counter["requests"] += 1
+        job_id = request.match_info["job_id"]
+        done = time.monotonic() - started >= job_durations[job_id]
+        return web.json_response({
+            "object": "fine_tuning.job", "id": job_id, "model": "gpt-4o-mini", "created_at": 0,
+            "status": "succeeded" if done else "running",
+            "fine_tuned_model": f"ft:gpt-4o-mini:{job_id}" if done else None, "error": None
+        })
+
+    async def list_events(request):
+        counter["requests"] += 1
+        events = job_events(request.match_info["job_id"])
+        limit = int(request.query.get("limit", 20))
+        after = request.query.get("after")
+        if after is not None:
+            events = events[[e["id"] for e in events].index(after) + 1:]
+        return web.json_response({"object": "list", "data": events[:limit], "has_more": len(events) > limit})
+
+    app = web.Application()
+    app.router.add_get("/v1/fine_tuning/jobs/{job_id}", retrieve)
+    app.router.add_get("/v1/fine_tuning/jobs/{job_id}/events", list_events)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1", started, counter
+
+
+async def bench_job_watcher(num_jobs: int = 20, poll_interval: float = 3.0):
+    """对比固定间隔轮询与自适应退避的作业监控：发现作业结束的延迟和请求数
+
+    poll_interval 代表原先的60秒轮询（按比例缩短）
+    """
+    import openai
+    from job_watcher import FineTuneJobWatcher
+
+    rng = np.random.default_rng(0)
+    durations = {f"ftjob-{i:03d}": float(rng.uniform(1.0, 4.0)) for i in range(num_jobs)}
+    print(f"📊 微调作业监控 ({num_jobs} 个作业, 本地桩服务)")
+
+    # 原实现：逐个作业同步 retrieve 后固定 sleep
+    runner, base_url, started, counter = await start_stub_fine_tuning_server(durations)
+    client = openai.AsyncOpenAI(api_key="sk-stub", base_url=base_url)
+    try:
+        async def poll(job_id):
+            while True:
+                job = await client.fine_tuning.jobs.retrieve(job_id)
+                if job.status == "succeeded":
+                    return time.monotonic() - started - durations[job_id]
+                await asyncio.sleep(poll_interval)
+        delays = await asyncio.gather(*(poll(job_id) for job_id in durations))
+        print(f"   固定 {poll_interval:.0f}s 轮询: 平均延迟 {np.mean(delays):5.2f}s, "
+              f"最大 {np.max(delays):5.2f}s, 请求 {counter['requests']} 次, 无事件")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    runner, base_url, started, counter = await start_stub_fine_tuning_server(durations)
+    delays = {}
+    seen_events: Dict[str, List[str]] = {job_id: [] for job_id in durations}
+    watcher = FineTuneJobWatcher(
+        openai.AsyncOpenAI(api_key="sk-stub", base_url=base_url),
+        min_interval=0.1, max_interval=poll_interval, backoff=1.5, event_page_size=5,
+        on_event=lambda job_id, event: seen_events[job_id].append(event.id),
+        on_terminal=lambda job: delays.setdefault(job.id, time.monotonic() - started - durations[job.id])
+    )
+    try:
+        jobs = await watcher.wait_all(durations)
+        assert all(job.status == "succeeded" for job in jobs.values())
+        for job_id, ids in seen_events.items():
+            assert len(ids) == len(set(ids)), "事件不能重复"
+            assert ids[-1] == f"{job_id}-evt-done" and ids == sorted(ids[:-1]) + ids[-1:], "事件按时间顺序"
+        print(f"   自适应退避监控: 平均延迟 {np.mean(list(delays.values())):5.2f}s, "
+              f"最大 {np.max(list(delays.values())):5.2f}s, 请求 {counter['requests']} 次, "
+              f"事件 {sum(len(ids) for ids in seen_events.values())} 条")
+    finally:
+        await watcher.close()
+        await runner.cleanup()
+
+
+async def main():
+    bench_cold_start()
+    await bench_collect_training_data()
+    await bench_streaming_memory()
+    await bench_resume()
+    await bench_record_reader()
+    await bench_labeling()
+    await bench_job_watcher()
+    bench_batch_transcription()
+    await bench_process_pool_scaling()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
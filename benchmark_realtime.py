@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Step Realtime API 客户端基准测试
+使用本地的WebSocket替身服务，协议与Step Realtime API一致，度量连接、发送和等待本身的开销
+"""
+
+import asyncio
+import base64
+import json
+import time
+import tracemalloc
+import uuid
+from typing import Dict, List
+
+import numpy as np
+import websockets
+from websockets.asyncio.server import serve
+
+from pcm_uplink import PCMUplink
+from realtime_client import TERMINAL_EVENTS, RealtimeClient, RealtimeError
+from realtime_pool import RealtimeSessionPool
+
+API_KEY = "stand-in-key"
+SESSION_CONFIG = {
+    "modalities": ["text", "audio"],
+    "instructions": "你是音频分析助手。请用5-10个字总结用户输入的内容。",
+    "voice": "qingchunshaonv",
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+}
+
+
+def stub_summary(text: str) -> str:
+    """替身服务的"总结"：取输入的前8个字，便于核对回复与请求是否对应"""
+    return text[:8]
+
+
+class StubRealtimeServer:
+    """本地Step Realtime替身服务
+
+    连接建立后发送 session.created；session.update 回复 session.updated；
+    response.create 立即回复 response.created，response_latency_ms 后依次发送文本、语音转录和 response.done；
+    input_audio_buffer.commit 回复 committed 和转录完成事件，会话配置了 turn_detection 时（模拟服务端VAD）
+    接着对转录自动回复。不认识的事件回复带 event_id 的 error。
+    """
+
+    def __init__(self, session_latency_ms: float = 20, response_latency_ms: float = 50):
+        self.session_latency = session_latency_ms / 1000
+        self.response_latency = response_latency_ms / 1000
+        self.connections = 0
+        self.messages = 0
+        self.audio_bytes = 0
+        self.active = set()
+        self.url = None
+        self._server = None
+
+    async def start(self):
+        self._server = await serve(self.handle, "127.0.0.1", 0)
+        port = next(iter(self._server.sockets)).getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/v1/realtime"
+        return self
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def drop_connections(self):
+        """服务端主动断开所有连接，模拟网络中断"""
+        await asyncio.gather(*(websocket.close() for websocket in list(self.active)))
+
+    async def handle(self, websocket):
+        self.connections += 1
+        self.active.add(websocket)
+        try:
+            await self.serve_session(websocket)
+        finally:
+            self.active.discard(websocket)
+
+    async def serve_session(self, websocket):
+        session = {"id": f"sess_{uuid.uuid4().hex[:8]}", "model": "step-audio-2-mini"}
+        await websocket.send(json.dumps({"type": "session.created", "session": session}))
+        texts: List[str] = []
+        audio = bytearray()
+        tasks = set()
+        async for message in websocket:
+            self.messages += 1
+            event = json.loads(message)
+            kind = event.get("type")
+            if kind == "session.update":
+                await asyncio.sleep(self.session_latency)
+                session.update(event.get("session", {}))
+                await websocket.send(json.dumps({"type": "session.updated", "session": session}))
+            elif kind == "conversation.item.create":
+                texts.append(event["item"]["content"][0]["text"])
+                await websocket.send(json.dumps({"type": "conversation.item.created", "item": event["item"]}))
+            elif kind == "response.create":
+                response_id = f"resp_{uuid.uuid4().hex[:8]}"
+                await websocket.send(json.dumps({"type": "response.created", "response": {"id": response_id}}))
+                task = asyncio.create_task(self.respond(websocket, response_id, texts[-1] if texts else ""))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            elif kind == "input_audio_buffer.append":
+                chunk = base64.b64decode(event["audio"])
+                audio.extend(chunk)
+                self.audio_bytes += len(chunk)
+            elif kind == "input_audio_buffer.commit":
+                await websocket.send(json.dumps({"type": "input_audio_buffer.committed"}))
+                transcript = f"{len(audio) // 2} samples"
+                await websocket.send(json.dumps({
+                    "type": "conversation.item.input_audio_transcription.completed",
+                    "transcript": transcript
+                }))
+                audio.clear()
+                if session.get("turn_detection"):
+                    response_id = f"resp_{uuid.uuid4().hex[:8]}"
+                    await websocket.send(json.dumps({"type": "response.created", "response": {"id": response_id}}))
+                    task = asyncio.create_task(self.respond(websocket, response_id, transcript))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            else:
+                await websocket.send(json.dumps({
+                    "type": "error",
+                    "error": {"message": f"unknown event {kind}", "event_id": event.get("event_id")}
+                }))
+
+    async def respond(self, websocket, response_id: str, text: str):
+        await asyncio.sleep(self.response_latency)
+        summary = stub_summary(text)
+        for event in (
+            {"type": "response.text.delta", "response_id": response_id, "delta": summary},
+            {"type": "response.text.done", "response_id": response_id, "content": summary},
+            {"type": "response.audio_transcript.done", "response_id": response_id, "transcript": summary},
+            {"type": "response.done", "response": {"id": response_id, "status": "completed"}},
+        ):
+            try:
+                await websocket.send(json.dumps(event, ensure_ascii=False))
+            except websockets.ConnectionClosed:
+                return
+
+
+async def script_style_summary(url: str, text: str) -> str:
+    """测试脚本原来的做法：每次新建连接、发送配置、等待 session.updated，再请求总结"""
+    async with websockets.connect(f"{url}?model=step-audio-2-mini",
+                                  additional_headers={"Authorization": f"Bearer {API_KEY}"}) as websocket:
+        await websocket.send(json.dumps({"type": "session.update", "session": SESSION_CONFIG}))
+        sent = False
+        async for message in websocket:
+            data = json.loads(message)
+            if data["type"] == "session.updated" and not sent:
+                await websocket.send(json.dumps({
+                    "type": "conversation.item.create",
+                    "item": {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+                }))
+                await websocket.send(json.dumps({"type": "response.create"}))
+                sent = True
+            elif data["type"] == "response.text.done":
+                return data["content"]
+
+
+def make_texts(count: int) -> List[str]:
+    topics = ["今天下午和团队开会讨论新产品设计", "刚才去超市买了水果和蔬菜", "学习了Python的异步编程",
+              "晚上想吃什么要不要点外卖", "外面刮风了还有鸟儿在叫", "明天上午要提交季度报告"]
+    return [f"{i:03d}{topics[i % len(topics)]}" for i in range(count)]
+
+
+async def bench_multiplexed_client(num_summaries: int = 24, response_latency_ms: float = 50):
+    """总结请求：每个请求一条新连接（原测试脚本） vs 一条持久连接上多路复用"""
+    texts = make_texts(num_summaries)
+    print(f"📊 Realtime客户端多路复用 ({num_summaries} 条总结, 替身服务响应 {response_latency_ms:.0f}ms)")
+    async with StubRealtimeServer(response_latency_ms=response_latency_ms) as server:
+        start = time.perf_counter()
+        summaries = [await script_style_summary(server.url, text) for text in texts]
+        elapsed = time.perf_counter() - start
+        assert summaries == [stub_summary(text) for text in texts]
+        print(f"   每次新建连接 (顺序):          {elapsed * 1000 / num_summaries:6.1f}ms/条, "
+              f"{server.connections} 个连接")
+
+        for max_active in (1, 8):
+            server.connections = 0
+            async with RealtimeClient(API_KEY, url=server.url, max_active_responses=max_active,
+                                      send_queue_size=4) as client:
+                received: Dict[str, int] = {}
+                client.on("*", lambda event: received.__setitem__(event.type, received.get(event.type, 0) + 1))
+                await client.update_session(SESSION_CONFIG)
+                start = time.perf_counter()
+                responses = await asyncio.gather(*(client.create_response(text) for text in texts))
+                elapsed = time.perf_counter() - start
+            assert [response.text for response in responses] == [stub_summary(text) for text in texts], \
+                "每个请求应拿到自己的回复"
+            assert received["response.done"] == num_summaries
+            print(f"   单连接多路复用 (并发回复 {max_active}): {elapsed * 1000 / num_summaries:6.1f}ms/条, "
+                  f"{server.connections} 个连接")
+
+        # 服务端 error 事件按 event_id 交给对应的请求
+        async with RealtimeClient(API_KEY, url=server.url) as client:
+            try:
+                await client.request({"type": "unknown.event"}, "unknown.done")
+                raise AssertionError("应当收到 RealtimeError")
+            except RealtimeError:
+                pass
+
+
+ENVIRONMENT_CONFIG = dict(SESSION_CONFIG, instructions="你是环境音分析助手。请用3-6个字描述环境特征。")
+
+
+async def bench_session_pool(num_jobs: int = 200, session_latency_ms: float = 200):
+    """取得可用会话的耗时：每次新建连接+session.update vs 会话池中的预热会话；以及断线重连和空闲淘汰"""
+    print(f"📊 Realtime会话池 ({num_jobs} 次取用, 替身服务 session.update {session_latency_ms:.0f}ms)")
+    async with StubRealtimeServer(session_latency_ms=session_latency_ms) as server:
+        async with RealtimeSessionPool(API_KEY, url=server.url, health_interval=3600) as pool:
+            start = time.perf_counter()
+            for _ in range(5):
+                async with RealtimeClient(API_KEY, url=server.url) as client:
+                    await client.update_session(SESSION_CONFIG)
+            cold = (time.perf_counter() - start) / 5
+
+            await pool.prewarm(SESSION_CONFIG, count=2)
+            await pool.prewarm(ENVIRONMENT_CONFIG, count=1)
+            connects = pool.stats["connects"]
+            start = time.perf_counter()
+            for i in range(num_jobs):
+                async with pool.acquire(SESSION_CONFIG if i % 2 else ENVIRONMENT_CONFIG):
+                    pass
+            warm = (time.perf_counter() - start) / num_jobs
+            assert pool.stats["connects"] == connects, "预热后不应再新建连接"
+            print(f"   新建连接 + session.update: {cold * 1e6:10.0f}µs")
+            print(f"   会话池预热会话:            {warm * 1e6:10.1f}µs ({cold / warm:,.0f}x)")
+
+            # 键顺序不同的同一配置命中同一组会话
+            async with pool.acquire(dict(reversed(list(SESSION_CONFIG.items())))) as client:
+                assert client.session["instructions"] == SESSION_CONFIG["instructions"]
+            assert pool.stats["connects"] == connects
+
+            # 服务端断开全部连接：健康检查淘汰断开的会话并重新连接补足预热数量
+            await server.drop_connections()
+            await asyncio.sleep(0.05)
+            await pool.check_health()
+            assert pool.idle_count(SESSION_CONFIG) == 2 and pool.idle_count(ENVIRONMENT_CONFIG) == 1
+            async with pool.acquire(SESSION_CONFIG) as client:
+                response = await client.create_response("断线重连之后的请求")
+                assert response.text == stub_summary("断线重连之后的请求")
+            print(f"   断线后健康检查: 淘汰 {pool.stats['evicted']} 个, 重连 {pool.stats['reconnects']} 个")
+
+            # 健康检查ping期间并发取用：空闲会话仍可取到，不新建连接，空闲数不超过上限
+            connects = pool.stats["connects"]
+            health = asyncio.create_task(pool.check_health())
+            await asyncio.sleep(0)
+            async with pool.acquire(SESSION_CONFIG), pool.acquire(ENVIRONMENT_CONFIG):
+                pass
+            await health
+            assert pool.stats["connects"] == connects, "健康检查期间取用不应新建连接"
+            assert pool.idle_count(SESSION_CONFIG) == 2 and pool.idle_count(ENVIRONMENT_CONFIG) == 1
+
+            # 使用中出错（如等待回复超时）的会话不归还：进行中的回复不能串到下一个使用者
+            discarded = pool.stats["discarded"]
+            idle = pool.idle_count(SESSION_CONFIG)
+            try:
+                async with pool.acquire(SESSION_CONFIG) as client:
+                    await asyncio.wait_for(client.create_response("超时的请求"), 0.001)
+            except asyncio.TimeoutError:
+                pass
+            assert pool.stats["discarded"] == discarded + 1 and pool.idle_count(SESSION_CONFIG) == idle - 1
+            await pool.check_health()
+            assert pool.idle_count(SESSION_CONFIG) == idle
+            print("   使用中出错的会话: 关闭丢弃, 健康检查补足预热数量")
+
+            # 超出预热数量的空闲会话超时后被淘汰
+            async with pool.acquire(SESSION_CONFIG), pool.acquire(SESSION_CONFIG), pool.acquire(SESSION_CONFIG):
+                pass
+            assert pool.idle_count(SESSION_CONFIG) == 3
+            pool.idle_timeout = 0
+            await pool.check_health()
+            assert pool.idle_count(SESSION_CONFIG) == 2
+            print(f"   空闲超时淘汰后保留预热的 {pool.idle_count(SESSION_CONFIG)} 个会话")
+
+
+def legacy_append_messages(pcm: bytes, chunk_size: int = 3200) -> List[bytes]:
+    """测试脚本原来的做法：整段音频转成base64字符串，按字符数切片，每片 json.dumps 后再编码成UTF-8"""
+    base64_audio = base64.b64encode(pcm).decode()
+    return [json.dumps({"event_id": f"audio_chunk_test_{i // chunk_size}", "type": "input_audio_buffer.append",
+                        "audio": base64_audio[i:i + chunk_size]}, ensure_ascii=False).encode("utf-8")
+            for i in range(0, len(base64_audio), chunk_size)]
+
+
+def uplink_append_messages(uplink: PCMUplink, pcm: bytes) -> int:
+    size = 0
+    for i, chunk in enumerate(uplink.chunks(pcm)):
+        size += len(uplink.encode(chunk, f"audio_chunk_test_{i}"))
+    return size
+
+
+def peak_memory(fn, *args) -> int:
+    """fn 执行期间Python堆内存的峰值增量（字节）"""
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+async def bench_pcm_uplink(seconds: float = 60, repeats: int = 5):
+    """音频上行编码：整段base64字符串切片 vs 按采样切块、逐块编码进预分配缓冲区"""
+    sample_rate = 16000
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    pcm_array = (np.sin(2 * np.pi * 440 * t) * 0.3 * 32767).astype(np.int16)
+    pcm = pcm_array.tobytes()
+    uplink = PCMUplink(sample_rate=sample_rate, chunk_ms=200)
+    print(f"📊 PCM音频上行 ({seconds:.0f}秒 16kHz pcm16, 每块 {uplink.chunk_ms}ms)")
+
+    # 块边界：原来的3200个base64字符只有2400字节，即75ms；新的块是3200个采样，正好200ms
+    legacy = legacy_append_messages(pcm)
+    legacy_chunk = len(base64.b64decode(json.loads(legacy[0])["audio"]))
+    chunks = list(uplink.chunks(pcm_array))
+    assert all(uplink.chunk_seconds(chunk) == 0.2 for chunk in chunks)
+    assert len(uplink.encode(chunks[0], "x")) - len(b'{"type":"input_audio_buffer.append","event_id":"x","audio":""}') == 8536
+    print(f"   原来每块: {legacy_chunk} 字节 = {legacy_chunk / 2 / sample_rate * 1000:.0f}ms, {len(legacy)} 块")
+    print(f"   现在每块: {uplink.chunk_bytes} 字节 = {uplink.chunk_ms}ms, {len(chunks)} 块")
+
+    # 两种方式发出的音频内容一致
+    decoded = b"".join(base64.b64decode(json.loads(bytes(uplink.encode(chunk, f"c{i}")))["audio"])
+                       for i, chunk in enumerate(chunks))
+    assert decoded == pcm
+
+    # 多声道音频按整帧（每个采样 × 声道数）校验长度，半帧的尾巴会让声道错位
+    try:
+        list(PCMUplink(sample_rate=sample_rate, channels=2).chunks(pcm[:6]))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("双声道音频的字节数不是4的整数倍时应报错")
+
+    timings = {}
+    for name, fn, args in (("base64字符串切片:", legacy_append_messages, (pcm,)),
+                           ("预分配缓冲区:   ", uplink_append_messages, (uplink, pcm))):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(*args)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"   {name} {best * 1000:6.2f}ms, 峰值内存 {peak_memory(fn, *args) / 1024:8.1f}KB")
+    legacy_time, uplink_time = timings.values()
+    print(f"   编码加速: {legacy_time / uplink_time:.1f}x")
+
+    # 端到端：替身服务收到的音频字节数和采样数与发送的一致
+    async with StubRealtimeServer() as server:
+        async with RealtimeClient(API_KEY, url=server.url) as client:
+            transcripts = []
+            client.on("conversation.item.input_audio_transcription.completed",
+                      lambda event: transcripts.append(event.get("transcript")))
+            for i, chunk in enumerate(uplink.chunks(pcm)):
+                await uplink.send_chunk(client, chunk, f"audio_chunk_test_{i}")
+            await uplink.flush()
+            await client.request({"type": "input_audio_buffer.commit"}, "input_audio_buffer.committed")
+            await asyncio.sleep(0.05)
+        assert server.audio_bytes == len(pcm)
+        assert transcripts == [f"{len(pcm_array)} samples"]
+        print(f"   端到端: 替身服务收到 {server.audio_bytes} 字节, 转录 {transcripts[0]!r}")
+
+        # 发送途中连接断开：排队中的音频块以 ConnectionError 结束，发送方不会一直等待
+        async with RealtimeClient(API_KEY, url=server.url, send_queue_size=4) as client:
+            async def drop_soon():
+                await asyncio.sleep(0.2)
+                await server.drop_connections()
+
+            try:
+                await asyncio.wait_for(asyncio.gather(drop_soon(), uplink.stream(client, pcm, speed=2)), 10)
+                raise AssertionError("应当收到 ConnectionError")
+            except ConnectionError:
+                pass
+            try:
+                await client.send_frame(b"{}")
+                raise AssertionError("连接断开后 send_frame 应立即失败")
+            except ConnectionError:
+                pass
+        print("   发送途中断开: 等待中的音频块立即以 ConnectionError 结束")
+
+
+async def sleep_paced_stream(uplink: PCMUplink, client: RealtimeClient, pcm: bytes) -> List[float]:
+    """测试脚本原来的做法：每块发送后 sleep 一块的时长，返回每块相对计划时间的延迟"""
+    start = time.monotonic()
+    offset = 0.0
+    jitters = []
+    for i, chunk in enumerate(uplink.chunks(pcm)):
+        await uplink.send_chunk(client, chunk, f"audio_chunk_{i}")
+        jitters.append(time.monotonic() - start - offset)
+        offset += uplink.chunk_seconds(chunk)
+        await asyncio.sleep(uplink.chunk_seconds(chunk))
+    await uplink.flush()
+    return jitters
+
+
+def busy_wait(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def bench_paced_sender(seconds: float = 4, chunk_ms: int = 50, send_cost_ms: float = 2):
+    """定时发送：每块 sleep 一块时长（误差逐块累积） vs 按单调时钟的计划时间发送；以及倍速、不限速和欠载统计"""
+    sample_rate = 16000
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    pcm = (np.sin(2 * np.pi * 440 * t) * 0.3 * 32767).astype(np.int16).tobytes()
+    uplink = PCMUplink(sample_rate=sample_rate, chunk_ms=chunk_ms)
+    print(f"📊 定时发送 ({seconds:.0f}秒音频, 每块 {chunk_ms}ms, 每块附加 {send_cost_ms:.0f}ms 发送开销)")
+    async with StubRealtimeServer() as server:
+        async with RealtimeClient(API_KEY, url=server.url) as client:
+            # 模拟每块的发送开销（编码、采集回调等）：每条消息发送前占用事件循环
+            send_frame = client.send_frame
+
+            async def costly_send_frame(payload):
+                busy_wait(send_cost_ms / 1000)
+                return await send_frame(payload)
+
+            client.send_frame = costly_send_frame
+
+            jitters = await sleep_paced_stream(uplink, client, pcm)
+            print(f"   每块 sleep:     最后一块延迟 {jitters[-1] * 1000:6.1f}ms, 最大 {max(jitters) * 1000:6.1f}ms")
+            stats = await uplink.stream(client, pcm, speed=1)
+            print(f"   单调时钟计划:   最大延迟 {stats.max_jitter * 1000:6.1f}ms, 平均 {stats.mean_jitter * 1000:5.1f}ms, "
+                  f"欠载 {stats.underruns} 次, 用时 {stats.elapsed:.2f}s")
+            assert stats.max_jitter < jitters[-1], "按计划时间发送时延迟不应逐块累积"
+            assert stats.underruns == 0
+            client.send_frame = send_frame
+
+            for speed in (10, None):
+                stats = await uplink.stream(client, pcm, speed=speed)
+                label = f"{speed}x 回放" if speed else "不限速 "
+                print(f"   {label}:       用时 {stats.elapsed * 1000:7.1f}ms, {stats.realtime_factor:7.1f}倍实时, "
+                      f"欠载 {stats.underruns} 次")
+            assert stats.realtime_factor > 10
+
+            # 事件循环被阻塞超过一块的时长：接收端在下一块到达前已经没有音频，计为欠载
+            async def stall():
+                await asyncio.sleep(seconds / 4)
+                busy_wait(3 * chunk_ms / 1000)
+
+            _, stats = await asyncio.gather(stall(), uplink.stream(client, pcm, speed=1))
+            assert stats.underruns >= 1
+            print(f"   阻塞 {3 * chunk_ms}ms:   欠载 {stats.underruns} 次, 最大延迟 {stats.max_jitter * 1000:.1f}ms")
+            await client.request({"type": "input_audio_buffer.commit"}, "input_audio_buffer.committed")
+        assert server.audio_bytes == 5 * len(pcm)
+
+
+VAD_CONFIG = dict(SESSION_CONFIG, turn_detection={"type": "server_vad", "threshold": 0.4, "silence_duration_ms": 500})
+
+
+async def run_text_scenario(client: RealtimeClient, text: str, fixed_wait: float = None):
+    """验证脚本的一个文本场景：发送消息和 response.create 后，固定等待 fixed_wait 秒，或等到终止事件"""
+    response = client.expect()
+    await client.send({"type": "conversation.item.create",
+                       "item": {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}})
+    await client.send({"type": "response.create"})
+    if fixed_wait is not None:
+        await asyncio.sleep(fixed_wait)
+    return await response.wait(timeout=10)
+
+
+async def bench_event_driven_waits(num_scenarios: int = 6, response_latency_ms: float = 300, fixed_wait: float = 1):
+    """每个场景的用时：固定 sleep（验证脚本原来的做法） vs 终止事件到达即结束"""
+    texts = make_texts(num_scenarios)
+    print(f"📊 等待回复 ({num_scenarios} 个场景, 替身服务响应 {response_latency_ms:.0f}ms, "
+          f"固定等待 {fixed_wait:.0f}s; 验证脚本中为 7-10s)")
+    async with StubRealtimeServer(response_latency_ms=response_latency_ms) as server:
+        async with RealtimeClient(API_KEY, url=server.url) as client:
+            await client.update_session(SESSION_CONFIG)
+            for label, wait in (("固定 sleep:  ", fixed_wait), ("终止事件驱动:", None)):
+                start = time.perf_counter()
+                for text in texts:
+                    events = await run_text_scenario(client, text, wait)
+                    assert events["response.text.done"].get("content") == stub_summary(text)
+                    assert set(events) == set(TERMINAL_EVENTS)
+                elapsed = (time.perf_counter() - start) / num_scenarios
+                print(f"   {label} {elapsed * 1000:7.1f}ms/场景")
+            assert elapsed < response_latency_ms / 1000 * 1.5, "用时应跟随服务端延迟"
+
+            # 音频场景：服务端VAD在提交后自动回复，发送前登记等待
+            pcm = np.zeros(16000, dtype=np.int16)
+            await client.update_session(VAD_CONFIG)
+            start = time.perf_counter()
+            response = client.expect(*TERMINAL_EVENTS)
+            await PCMUplink().stream(client, pcm, speed=None)
+            await client.send({"type": "input_audio_buffer.commit"})
+            events = await response.wait(timeout=10)
+            assert events["response.audio_transcript.done"].get("transcript") == stub_summary("16000 samples")
+            print(f"   音频场景 (服务端VAD回复): {(time.perf_counter() - start) * 1000:7.1f}ms")
+
+            # 超时：timeout 是上限，超时后等待被取消并从客户端移除
+            await client.update_session(SESSION_CONFIG)
+            response = client.expect()
+            await client.send({"type": "response.create"})
+            try:
+                await response.wait(timeout=response_latency_ms / 1000 / 3)
+                raise AssertionError("应当超时")
+            except asyncio.TimeoutError:
+                pass
+            assert not client._waiters
+            await asyncio.sleep(response_latency_ms / 1000)
+
+            # 同一连接上其他请求的 error 不影响等待：交给该请求自己的 Future
+            response = client.expect(event_ids=("trigger",))
+            try:
+                await client.request({"type": "unknown.event"}, "unknown.done")
+                raise AssertionError("应当收到 RealtimeError")
+            except RealtimeError:
+                pass
+            await client.send({"event_id": "item", "type": "conversation.item.create", "item": {
+                "type": "message", "role": "user", "content": [{"type": "input_text", "text": "并发请求出错之后"}]}})
+            await client.send({"event_id": "trigger", "type": "response.create"})
+            events = await response.wait(timeout=10)
+            assert events["response.text.done"].get("content") == stub_summary("并发请求出错之后")
+
+            # 服务端拒绝触发事件时等待立即失败
+            response = client.expect(event_ids=("bad_trigger",))
+            await client.send({"event_id": "bad_trigger", "type": "unknown.event"})
+            try:
+                await response.wait(timeout=10)
+                raise AssertionError("应当收到 RealtimeError")
+            except RealtimeError:
+                pass
+
+
+async def main():
+    await bench_multiplexed_client()
+    await bench_session_pool()
+    await bench_pcm_uplink()
+    await bench_paced_sender()
+    await bench_event_driven_waits()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,892 @@
+#!/usr/bin/env python3
+"""
+Step-Audio推理路径基准测试（CPU）
+使用与Step-Audio接口一致的小型替身模型，度量批处理、调度等推理路径本身的开销
+"""
+
+import asyncio
+import glob
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from model_registry import quantize_dynamic_int8, registry
+from step_audio_integration import StepAudioProcessor
+
+STAND_IN_MODEL = "stand-in/step-audio"
+# 替身tokenizer的输出字母表
+ALPHABET = "今天开会讨论项目进度明天提交报告记得买菜晚上跑步学习英语周末看电影"
+
+
+class _Encoding(dict):
+    def to(self, device):
+        return _Encoding({k: v.to(device) for k, v in self.items()})
+
+
+class StandInTokenizer:
+    """按字符编码的替身tokenizer，接口与HF tokenizer一致（id 0 为填充）"""
+
+    pad_token = "<pad>"
+    eos_token = "<pad>"
+    pad_token_id = 0
+    eos_token_id = 0
+
+    def __init__(self, vocab_size: int):
+        self.vocab_size = vocab_size
+        self.padding_side = "right"
+
+    def __call__(self, texts, return_tensors: str = "pt", padding: bool = False,
+                 add_special_tokens: bool = True) -> _Encoding:
+        texts = [texts] if isinstance(texts, str) else texts
+        ids = [[ord(c) % (self.vocab_size - 1) + 1 for c in text] for text in texts]
+        width = max(len(row) for row in ids)
+        input_ids = torch.zeros(len(ids), width, dtype=torch.long)
+        attention_mask = torch.zeros(len(ids), width, dtype=torch.long)
+        for i, row in enumerate(ids):
+            span = slice(width - len(row), width) if self.padding_side == "left" else slice(0, len(row))
+            input_ids[i, span] = torch.tensor(row)
+            attention_mask[i, span] = 1
+        return _Encoding(input_ids=input_ids, attention_mask=attention_mask)
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        ids = ids.tolist() if isinstance(ids, torch.Tensor) else ids
+        return "".join(ALPHABET[i % len(ALPHABET)] for i in ids if i != 0 or not skip_special_tokens)
+
+    def batch_decode(self, outputs, skip_special_tokens: bool = True) -> List[str]:
+        return [self.decode(row, skip_special_tokens) for row in outputs]
+
+
+class StandInStepAudioModel(torch.nn.Module):
+    """与Step-Audio接口一致的小模型：encode_audio 按帧投影，generate 逐token贪心解码
+
+    计算量远小于真实模型，但每一步解码的调用开销与批大小无关，
+    因此批处理带来的吞吐提升与真实模型在CPU上的表现方向一致。
+    文本输入经过几层causal自注意力预填充，支持 past_key_values，预填充耗时与prompt长度成正比。
+    """
+
+    def __init__(self, dim: int = 512, vocab_size: int = 4000, frame: int = 320, encoder_layers: int = 4,
+                 prompt_layers: int = 2):
+        super().__init__()
+        torch.manual_seed(0)
+        self.frame = frame
+        self.config = SimpleNamespace(_commit_hash="stand-in")
+        self.audio_proj = torch.nn.Linear(frame, dim)
+        self.encoder = torch.nn.Sequential(*(
+            torch.nn.Sequential(torch.nn.Linear(dim, 4 * dim), torch.nn.GELU(), torch.nn.Linear(4 * dim, dim))
+            for _ in range(encoder_layers)
+        ))
+        self.embed = torch.nn.Embedding(vocab_size, dim)
+        self.prompt_qkv = torch.nn.ModuleList(torch.nn.Linear(dim, 3 * dim) for _ in range(prompt_layers))
+        self.prompt_mlp = torch.nn.ModuleList(
+            torch.nn.Sequential(torch.nn.Linear(dim, 4 * dim), torch.nn.GELU(), torch.nn.Linear(4 * dim, dim))
+            for _ in range(prompt_layers)
+        )
+        self.proj = torch.nn.Linear(dim, dim)
+        self.head = torch.nn.Linear(dim, vocab_size)
+
+    def encode_audio(self, audio: torch.Tensor) -> torch.Tensor:
+        """[batch, samples] 或 [samples] → [batch, frames, dim]"""
+        audio = audio if audio.dim() == 2 else audio[None]
+        frames = max(audio.shape[1] // self.frame, 1)
+        audio = torch.nn.functional.pad(audio, (0, max(frames * self.frame - audio.shape[1], 0)))
+        hidden = self.audio_proj(audio[:, :frames * self.frame].reshape(audio.shape[0], frames, self.frame))
+        return torch.tanh(self.encoder(hidden))
+
+    def prefill(self, input_ids: torch.Tensor, attention_mask=None, past_key_values=None):
+        """input_ids 为 past_key_values 之后的新token，返回 (新位置的隐状态, 全部位置的KV缓存)"""
+        past_len = past_key_values[0][0].shape[1] if past_key_values is not None else 0
+        hidden = self.embed(input_ids)
+        positions = past_len + torch.arange(hidden.shape[1])
+        cache = []
+        for i, (qkv, mlp) in enumerate(zip(self.prompt_qkv, self.prompt_mlp)):
+            q, k, v = qkv(hidden).chunk(3, dim=-1)
+            if past_key_values is not None:
+                k = torch.cat([past_key_values[i][0], k], dim=1)
+                v = torch.cat([past_key_values[i][1], v], dim=1)
+            cache.append((k, v))
+            allowed = (torch.arange(k.shape[1])[None, :] <= positions[:, None])[None]
+            if attention_mask is not None:
+                allowed = allowed & attention_mask.bool()[:, None, :]
+            scores = (q @ k.transpose(1, 2) / q.shape[-1] ** 0.5).masked_fill(~allowed, -1e9)
+            hidden = hidden + scores.softmax(dim=-1) @ v
+            hidden = hidden + mlp(hidden)
+        return hidden, tuple(cache)
+
+    def forward(self, input_ids: torch.Tensor, attention_mask=None, past_key_values=None,
+                use_cache: bool = True, **kwargs):
+        hidden, cache = self.prefill(input_ids, attention_mask, past_key_values)
+        return SimpleNamespace(logits=self.head(torch.tanh(self.proj(hidden))),
+                               past_key_values=cache if use_cache else None)
+
+    def generate(self, inputs=None, input_ids=None, attention_mask=None, encoder_outputs=None,
+                 past_key_values=None, max_new_tokens: int = 20, output_scores: bool = False,
+                 return_dict_in_generate: bool = False, **kwargs):
+        """音频输入（或 encoder_outputs）时为ASR解码，token输入时为文本续写"""
+        inputs = input_ids if input_ids is not None else inputs
+        if encoder_outputs is not None or inputs.is_floating_point():
+            features = encoder_outputs[0] if encoder_outputs is not None else self.encode_audio(inputs)
+            state = features.mean(dim=1)
+            prefix = torch.zeros(state.shape[0], 0, dtype=torch.long)
+        else:
+            past_len = past_key_values[0][0].shape[1] if past_key_values is not None else 0
+            state = self.prefill(inputs[:, past_len:], attention_mask, past_key_values)[0][:, -1]
+            prefix = inputs
+        tokens, scores = [], []
+        for _ in range(max_new_tokens):
+            hidden = torch.tanh(self.proj(state))
+            logits = self.head(hidden)
+            token = logits.argmax(dim=-1)
+            tokens.append(token)
+            if output_scores:
+                scores.append(logits)
+            state = hidden + self.embed(token)
+        sequences = torch.cat([prefix, torch.stack(tokens, dim=1)], dim=1)
+        if return_dict_in_generate:
+            return SimpleNamespace(sequences=sequences, scores=tuple(scores) if output_scores else None)
+        return sequences
+
+
+def register_stand_in_model():
+    """在注册表中登记替身模型（含int8量化版本），StepAudioProcessor(STAND_IN_MODEL) 将使用它"""
+    def load(quantize_int8: bool = False):
+        model = StandInStepAudioModel().eval()
+        tokenizer = StandInTokenizer(model.head.out_features)
+        return (quantize_dynamic_int8(model) if quantize_int8 else model), tokenizer, torch.device("cpu")
+    registry.register(f"step-audio:{STAND_IN_MODEL}", load)
+    registry.register(f"step-audio:{STAND_IN_MODEL}:int8", lambda: load(quantize_int8=True))
+    registry.register(f"step-audio-config:{STAND_IN_MODEL}", lambda: SimpleNamespace(_commit_hash="stand-in"))
+
+
+def make_clips(audio_dir: str, num_clips: int, min_seconds: float = 2, max_seconds: float = 8) -> List[str]:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(num_clips):
+        n = int(rng.uniform(min_seconds, max_seconds) * 16000)
+        path = f"{audio_dir}/clip_{i:03d}.wav"
+        sf.write(path, (rng.normal(0, 0.1, n)).astype(np.float32), 16000)
+        paths.append(path)
+    return paths
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    return {"p50": float(np.percentile(latencies, 50)) * 1000, "p99": float(np.percentile(latencies, 99)) * 1000}
+
+
+def legacy_process_clip(processor: StepAudioProcessor, audio_input: torch.Tensor):
+    """原 process_audio 的模型调用方式：generate 内部编码一次，语义分析再编码一次"""
+    outputs = processor.model.generate(audio_input, max_new_tokens=512, temperature=0.1, do_sample=False)
+    processor.tokenizer.decode(outputs[0], skip_special_tokens=True)
+    processor.model.encode_audio(audio_input)
+
+
+def shared_process_clip(processor: StepAudioProcessor, audio_input: torch.Tensor):
+    """共享编码：encode_audio 一次，ASR解码通过 encoder_outputs 复用"""
+    features = processor.model.encode_audio(audio_input)
+    outputs = processor.model.generate(audio_input, encoder_outputs=(features,), max_new_tokens=512,
+                                       temperature=0.1, do_sample=False)
+    processor.tokenizer.decode(outputs[0], skip_special_tokens=True)
+    return features
+
+
+def bench_shared_encoding(num_clips: int = 16, clip_seconds: float = 30):
+    """单条音频的转录+语义分析：两次编码 vs 共享一次编码"""
+    register_stand_in_model()
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+    rng = np.random.default_rng(0)
+    clips = [torch.from_numpy(rng.normal(0, 0.1, int(clip_seconds * 16000)).astype(np.float32))
+             for _ in range(num_clips)]
+    print(f"📊 共享音频编码 ({num_clips} 段 × {clip_seconds:.0f}s, CPU, 替身模型)")
+
+    with torch.no_grad():
+        start = time.perf_counter()
+        for clip in clips:
+            processor.model.encode_audio(clip)
+        encode_time = (time.perf_counter() - start) / num_clips
+
+        timings = {}
+        for name, fn in (("两次编码 (原实现)", legacy_process_clip), ("共享编码", shared_process_clip)):
+            start = time.perf_counter()
+            for clip in clips:
+                fn(processor, clip)
+            timings[name] = (time.perf_counter() - start) / num_clips
+
+        # 共享编码与原实现的ASR结果必须一致
+        for clip in clips[:2]:
+            legacy = processor.model.generate(clip, max_new_tokens=512)
+            shared = processor.model.generate(clip, encoder_outputs=(processor.model.encode_audio(clip),),
+                                              max_new_tokens=512)
+            assert torch.equal(legacy, shared), "共享编码不应改变解码结果"
+
+    baseline = timings["两次编码 (原实现)"]
+    print(f"   编码器单次耗时: {encode_time * 1000:7.1f}ms")
+    for name, elapsed in timings.items():
+        print(f"   {name}: {elapsed * 1000:7.1f}ms/段 ({baseline / elapsed:4.2f}x)")
+
+
+def bench_confidence_and_heads(num_clips: int = 8, clip_seconds: float = 10, batch_size: int = 8):
+    """logit置信度和语义分类头相对于单纯ASR解码增加的耗时（目标 < 5%）"""
+    from semantic_heads import SemanticHeads
+
+    register_stand_in_model()
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+    model = processor.model
+    rng = np.random.default_rng(0)
+    clips = [torch.from_numpy(rng.normal(0, 0.1, int(clip_seconds * 16000)).astype(np.float32))
+             for _ in range(num_clips)]
+    print(f"📊 置信度与语义分类头开销 ({num_clips} 段 × {clip_seconds:.0f}s, batch={batch_size}, CPU, 替身模型)")
+
+    with torch.no_grad():
+        encoded = processor.encode_batch(clips[:batch_size])
+        # 没有训练好的分类头时不输出标签
+        assert processor.classify_semantics(encoded.features, encoded.frame_mask) == [None] * batch_size
+        # 随机标签训练一组分类头，只用于计时
+        pooled = torch.randn(64, encoded.features.shape[-1])
+        heads = SemanticHeads(encoded.features.shape[-1])
+        with torch.enable_grad():
+            heads.fit(pooled, {task: torch.randint(len(labels), (64,)) for task, labels in heads.heads.items()},
+                      epochs=5)
+        processor.semantic_heads = heads.eval()
+
+        def decode(with_scores: bool):
+            return model.generate(encoded.audio, attention_mask=encoded.frame_mask,
+                                  encoder_outputs=(encoded.features,), max_new_tokens=512,
+                                  output_scores=with_scores, return_dict_in_generate=with_scores)
+
+        repeats = 3
+        start = time.perf_counter()
+        for _ in range(repeats):
+            decode(False)
+        plain = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            outputs = decode(True)
+            confidences = processor.calculate_confidence(outputs)
+            semantic = processor.classify_semantics(encoded.features, encoded.frame_mask)
+        full = (time.perf_counter() - start) / repeats
+
+    assert confidences.shape == (batch_size,) and bool(((confidences > 0) & (confidences <= 1)).all())
+    assert len(semantic) == batch_size and all("emotion" in info for info in semantic)
+    print(f"   仅ASR解码:               {plain * 1000 / batch_size:7.1f}ms/段")
+    print(f"   解码 + 置信度 + 语义分类: {full * 1000 / batch_size:7.1f}ms/段 "
+          f"(+{(full / plain - 1) * 100:4.1f}%)")
+
+    # 从标注音频训练分类头：保存后可由 semantic_heads_path 加载，预测与标注一致
+    audio_dir = tempfile.mkdtemp()
+    try:
+        samples = []
+        for i, clip in enumerate(clips):
+            path = f"{audio_dir}/labeled_{i}.wav"
+            sf.write(path, clip.numpy(), 16000)
+            samples.append((path, {"emotion": ("平静", "焦虑")[i % 2], "urgency": ("普通", "紧急")[i % 2]}))
+        processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+        processor.fit_semantic_heads(samples, f"{audio_dir}/heads.pt", epochs=100)
+        loaded = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False,
+                                    semantic_heads_path=f"{audio_dir}/heads.pt")
+        with torch.no_grad():
+            encoded = loaded.encode_batch(clips)
+            predicted = loaded.classify_semantics(encoded.features, encoded.frame_mask)
+        assert [(info["emotion"], info["urgency"]) for info in predicted] == [
+            (labels["emotion"], labels["urgency"]) for _, labels in samples], "分类头应拟合标注"
+        print(f"   标注训练分类头: {len(samples)} 条标注全部拟合，保存后加载一致")
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+def bench_transcription_cache_hits(num_clips: int = 16, clip_seconds: float = 10):
+    """转录缓存全部命中时不应加载模型：缓存键的模型版本只读配置"""
+    register_stand_in_model()
+    rng = np.random.default_rng(0)
+    clips = [torch.from_numpy(rng.normal(0, 0.1, int(clip_seconds * 16000)).astype(np.float32))
+             for _ in range(num_clips)]
+    print(f"📊 转录缓存全部命中 ({num_clips} 段 × {clip_seconds:.0f}s, 替身模型)")
+    cache_dir = tempfile.mkdtemp()
+    try:
+        processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=cache_dir, trim_silence=False)
+        start = time.perf_counter()
+        first, _ = processor.transcribe_batch(clips)
+        cold = time.perf_counter() - start
+
+        registry.unload(processor.model_key)
+        processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=cache_dir, trim_silence=False)
+        start = time.perf_counter()
+        cached, confidences = processor.transcribe_batch(clips)
+        warm = time.perf_counter() - start
+        assert cached == first and confidences == [None] * num_clips
+        assert not registry.is_loaded(processor.model_key), "缓存全部命中时不应加载模型"
+        print(f"   首次 (加载模型 + 解码): {cold * 1000:8.1f}ms")
+        print(f"   全部命中 (不加载模型):  {warm * 1000:8.1f}ms")
+
+        # 影响转录结果的设置不同，缓存版本也不同
+        variants = [StepAudioProcessor(STAND_IN_MODEL, cache_dir=cache_dir, trim_silence=trim, cpu_int8=int8)
+                    for int8 in (False, True) for trim in (False, True)]
+        assert len({variant.model_id for variant in variants}) == len(variants), "int8/裁剪设置应区分缓存版本"
+        int8 = next(variant for variant in variants if variant.cpu_int8 and not variant.silence_trimmer)
+        assert int8.transcribe_batch(clips[:1])[1] != [None], "int8不应命中float32的缓存"
+
+        # 本地checkpoint的版本跟随权重文件变化
+        weights = Path(cache_dir) / "local-model" / "model.safetensors"
+        weights.parent.mkdir()
+        weights.write_bytes(b"v1")
+        local = StepAudioProcessor(str(weights.parent), cache_dir=None).model_id
+        weights.write_bytes(b"v2-retrained")
+        assert StepAudioProcessor(str(weights.parent), cache_dir=None).model_id != local, "本地权重更新后版本应变化"
+        print(f"   缓存版本: {processor.model_id[1]} / {int8.model_id[1]} / 本地 {local[1]}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def bench_audio_frontend(num_clips: int = 24, clip_seconds: float = 10):
+    """音频前端吞吐量（音频秒数/秒）：原 sf.read+librosa vs float32解码+缓存多相滤波器"""
+    from audio_frontend import PolyphaseResampler, load_batch, remove_dc, to_mono
+
+    audio_dir = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    # 常见来源：44.1k立体声、48k单声道、16k单声道
+    formats = [(44100, 2), (48000, 1), (16000, 1)]
+    paths = []
+    for i in range(num_clips):
+        sample_rate, channels = formats[i % len(formats)]
+        n = int(clip_seconds * sample_rate)
+        data = (rng.normal(0, 0.1, (n, channels)) + 0.05).astype(np.float32)
+        path = f"{audio_dir}/clip_{i:03d}.wav"
+        sf.write(path, data, sample_rate, subtype="PCM_16")
+        paths.append(path)
+    total_seconds = num_clips * clip_seconds
+    print(f"📊 音频前端 ({num_clips} 段 × {clip_seconds:.0f}s, 44.1k立体声/48k/16k混合)")
+
+    def legacy(path):
+        import librosa
+        audio_data, sample_rate = sf.read(path)
+        if sample_rate != 16000:
+            audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=16000)
+        return torch.from_numpy(audio_data).float()
+
+    def uncached(path):
+        # float64解码，每个文件重新设计滤波器
+        audio_data, sample_rate = sf.read(path)
+        return PolyphaseResampler(sample_rate, 16000)(remove_dc(to_mono(audio_data)))
+
+    runs = [("float64解码 + 每次设计滤波器", lambda: [uncached(path) for path in paths]),
+            ("float32解码 + 缓存多相滤波器", lambda: load_batch(paths))]
+    try:
+        import librosa  # noqa: F401
+        runs.insert(0, ("原实现 sf.read + librosa", lambda: [legacy(path) for path in paths]))
+    except ImportError:
+        print("   (未安装librosa，跳过原实现)")
+
+    try:
+        load_batch(paths[:len(formats)])  # 预热：滤波器设计不计入吞吐
+        for name, run in runs:
+            start = time.perf_counter()
+            clips = run()
+            elapsed = time.perf_counter() - start
+            print(f"   {name}: {total_seconds / elapsed:8.0f} 音频秒/秒")
+        assert all(clip.ndim == 1 and len(clip) == int(clip_seconds * 16000) for clip in load_batch(paths))
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+def check_merge_overlap(num_cases: int = 200):
+    """拼接正确性：把一段token序列切成重叠窗口（边界token随机出错），拼回后应与原序列一致"""
+    from step_audio_integration import merge_overlap
+
+    rng = np.random.default_rng(0)
+    for _ in range(num_cases):
+        reference = rng.integers(1, 4000, int(rng.integers(50, 400))).tolist()
+        window, overlap = int(rng.integers(30, 80)), int(rng.integers(4, 12))
+        merged: List[int] = []
+        for start in range(0, len(reference), window - overlap):
+            tokens = list(reference[start:start + window])
+            if start and rng.random() < 0.5:
+                tokens[0] = 0  # 窗口边界处第一个token被截断识别错
+            merged += merge_overlap(merged, tokens)
+            if start + window >= len(reference):
+                break
+        assert merged == reference, "重叠去重后应还原原序列"
+    print(f"   重叠拼接: {num_cases} 组随机序列全部还原")
+
+
+async def bench_streaming_transcription(durations=(60, 300, 600)):
+    """长音频：整段读入的内存峰值 vs 流式窗口读取；峰值应与录音时长无关"""
+    import tracemalloc
+    from audio_frontend import decode_audio, prepare_batch
+
+    register_stand_in_model()
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+    audio_dir = tempfile.mkdtemp()
+    print("📊 长音频流式转录 (44.1k立体声, 30s窗口/2s重叠, CPU, 替身模型)")
+    check_merge_overlap()
+    try:
+        for seconds in durations:
+            path = f"{audio_dir}/long_{seconds}.wav"
+            with sf.SoundFile(path, "w", samplerate=44100, channels=2, subtype="PCM_16") as f:
+                rng = np.random.default_rng(seconds)
+                for _ in range(seconds // 10):
+                    f.write((rng.normal(0, 0.1, (441000, 2))).astype(np.float32))
+
+            tracemalloc.start()
+            audio, sample_rate = decode_audio(path)
+            prepare_batch([(audio, sample_rate)])
+            _, full_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del audio
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            segments = [segment async for segment in processor.stream_transcription(path)]
+            elapsed = time.perf_counter() - start
+            _, stream_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"   {seconds:>4}s: 整段读入峰值 {full_peak / 1024 / 1024:6.1f} MiB, "
+                  f"流式峰值 {stream_peak / 1024 / 1024:5.1f} MiB, {len(segments)} 段, {elapsed:5.1f}s")
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+def synth_voice_memo(rng: np.random.Generator, seconds: float, speech_spans, sample_rate: int = 16000) -> np.ndarray:
+    """合成语音备忘：低电平环境噪声 + 若干段调幅的类语音信号"""
+    audio = rng.normal(0, 0.002, int(seconds * sample_rate)).astype(np.float32)
+    for start, end in speech_spans:
+        n = int((end - start) * sample_rate)
+        t = np.arange(n) / sample_rate
+        voiced = 0.2 * np.sin(2 * np.pi * 180 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+        audio[int(start * sample_rate):int(start * sample_rate) + n] += (voiced + rng.normal(0, 0.03, n)).astype(np.float32)
+    return audio
+
+
+async def bench_silence_trimming(num_clips: int = 12, clip_seconds: float = 30, silent_every: int = 4):
+    """VAD静音裁剪：跳过的音频比例、语音召回、VAD自身吞吐和端到端处理耗时"""
+    from vad import SilenceTrimmer
+
+    register_stand_in_model()
+    rng = np.random.default_rng(0)
+    audio_dir = tempfile.mkdtemp()
+    paths, spans = [], []
+    for i in range(num_clips):
+        clip_spans = []
+        if i % silent_every:
+            cursor = rng.uniform(0.5, 3)
+            while cursor < clip_seconds - 2:
+                length = rng.uniform(1, 4)
+                clip_spans.append((cursor, min(cursor + length, clip_seconds)))
+                cursor += length + rng.uniform(1, 6)
+        path = f"{audio_dir}/memo_{i:03d}.wav"
+        sf.write(path, synth_voice_memo(rng, clip_seconds, clip_spans), 16000)
+        paths.append(path)
+        spans.append(clip_spans)
+    print(f"📊 VAD静音裁剪 ({num_clips} 段 × {clip_seconds:.0f}s 合成语音备忘, 每 {silent_every} 段一段全环境音)")
+
+    try:
+        trimmer = SilenceTrimmer()
+        clips = [synth_voice_memo(np.random.default_rng(i), clip_seconds, clip_spans)
+                 for i, clip_spans in enumerate(spans)]
+        start = time.perf_counter()
+        results = [trimmer.trim(clip) for clip in clips]
+        elapsed = time.perf_counter() - start
+        # 语音召回：真实语音样本落在保留段内的比例
+        covered = total = 0
+        for result, clip_spans in zip(results, spans):
+            kept = np.zeros(result.original_samples, dtype=bool)
+            for seg_start, seg_end in result.segments:
+                kept[seg_start:seg_end] = True
+            for span_start, span_end in clip_spans:
+                covered += kept[int(span_start * 16000):int(span_end * 16000)].sum()
+                total += int(span_end * 16000) - int(span_start * 16000)
+        assert all(result.silent for result, clip_spans in zip(results, spans) if not clip_spans), "全环境音片段应被跳过"
+        assert covered / total > 0.99, "语音段不应被裁掉"
+        print(f"   VAD吞吐: {num_clips * clip_seconds / elapsed:8.0f} 音频秒/秒, 语音召回 {covered / total:.2%}")
+        print(f"   {trimmer.report()}")
+
+        # 没有停顿的连续语音：能量分布只有一簇，低分位数落在语音内部，不能当作噪声底
+        for depth in (0, 0.3, 1):
+            n = 5 * 16000
+            t = np.arange(n) / 16000
+            voiced = 0.2 * np.sin(2 * np.pi * 180 * t) * (1 + depth * np.sin(2 * np.pi * 3 * t))
+            result = trimmer.trim((voiced + rng.normal(0, 0.03, n)).astype(np.float32))
+            kept = sum(end - start for start, end in result.segments)
+            assert not result.silent and kept / n > 0.99, f"连续语音 (调幅深度 {depth}) 应整段保留"
+        print("   连续语音 (无停顿): 整段保留")
+
+        # 稳定的环境音同样只有一簇能量，但不是语音：白噪声过零率高，交流声基频低于人声
+        ambient = {f"白噪声 σ={sigma}": rng.normal(0, sigma, n) for sigma in (0.01, 0.02, 0.05)}
+        ambient["60Hz 交流声"] = 0.05 * np.sin(2 * np.pi * 60 * t) + rng.normal(0, 0.005, n)
+        ambient["50Hz 交流声 (含谐波)"] = sum(
+            amplitude * np.sin(2 * np.pi * 50 * harmonic * t)
+            for harmonic, amplitude in ((1, 0.05), (2, 0.02), (3, 0.01)))
+        for name, clip in ambient.items():
+            assert trimmer.trim(clip.astype(np.float32)).silent, f"{name} 应被跳过"
+        print(f"   稳定环境音 ({len(ambient)} 种): 全部跳过")
+
+        for trim_silence in (False, True):
+            processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=trim_silence)
+            start = time.perf_counter()
+            for path in paths:
+                await processor.process_audio(path)
+            elapsed = time.perf_counter() - start
+            label = "裁剪静音" if trim_silence else "不裁剪  "
+            print(f"   {label}: {elapsed / num_clips * 1000:7.1f}ms/段 "
+                  f"(每录音小时 {elapsed / (num_clips * clip_seconds) * 3600:6.0f}s 计算)")
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+async def bench_micro_batching(num_requests: int = 64, concurrency: int = 16, max_wait_ms: float = 10):
+    """微批服务：p50/p99延迟和吞吐量随最大批大小的变化（concurrency 个客户端持续发请求）"""
+    from step_audio_server import StepAudioBatchServer
+
+    register_stand_in_model()
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+    audio_dir = tempfile.mkdtemp()
+    paths = make_clips(audio_dir, num_requests)
+    print(f"📊 Step-Audio微批服务 ({num_requests} 个请求, {concurrency} 个并发客户端, "
+          f"max_wait={max_wait_ms:.0f}ms, CPU, 替身模型)")
+    try:
+        # 原实现：每个请求单独走 process_audio，模型串行处理
+        latencies = []
+        start = time.perf_counter()
+        for path in paths[:16]:
+            t = time.perf_counter()
+            await processor.process_audio(path)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        stats = percentiles(latencies)
+        print(f"   逐条 process_audio: p50 {stats['p50']:7.1f}ms (单请求服务时间), "
+              f"吞吐 {16 / elapsed:6.2f} 请求/秒")
+
+        for max_batch_size in (1, 2, 4, 8, 16):
+            latencies = []
+            queue = list(paths)
+            async with StepAudioBatchServer(processor, max_batch_size=max_batch_size,
+                                            max_wait_ms=max_wait_ms) as server:
+                async def client():
+                    while queue:
+                        path = queue.pop()
+                        t = time.perf_counter()
+                        await server.process_audio(path)
+                        latencies.append(time.perf_counter() - t)
+
+                start = time.perf_counter()
+                await asyncio.gather(*(client() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - start
+            stats = percentiles(latencies)
+            print(f"   batch={max_batch_size:>2}: p50 {stats['p50']:7.1f}ms, p99 {stats['p99']:7.1f}ms, "
+                  f"吞吐 {num_requests / elapsed:6.2f} 请求/秒")
+
+        # 同批中有无法解码的上传时，只有这一个请求失败
+        bad = f"{audio_dir}/bad.wav"
+        with open(bad, "wb") as f:
+            f.write(b"not audio")
+        async with StepAudioBatchServer(processor, max_batch_size=8, max_wait_ms=50) as server:
+            results = await asyncio.gather(*(server.process_audio(path) for path in [bad, *paths[:7]]),
+                                           return_exceptions=True)
+        assert isinstance(results[0], Exception), "坏文件应单独失败"
+        assert all(isinstance(result, dict) for result in results[1:]), "坏文件不应拖垮同批请求"
+        print(f"   批内 1 个坏文件: 其余 {len(results) - 1} 个请求正常返回")
+    finally:
+        shutil.rmtree(audio_dir, ignore_errors=True)
+
+
+def bench_summary_prompt_cache(transcript_lengths=(10, 30, 60, 120), repeats: int = 20):
+    """总结的首token延迟：每次完整预填充prompt vs 复用固定前缀的KV缓存"""
+    from step_audio_integration import SUMMARY_PREFIX
+
+    register_stand_in_model()
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False)
+    model, tokenizer = processor.model, processor.tokenizer
+    rng = np.random.default_rng(0)
+    print(f"📊 总结prompt前缀KV缓存 (前缀 {len(tokenizer(SUMMARY_PREFIX)['input_ids'][0])} token, CPU, 替身模型)")
+
+    with torch.inference_mode():
+        processor.summary_prefix  # 预填充一次，计入模型加载
+        for length in transcript_lengths:
+            text = "".join(rng.choice(list(ALPHABET), length))
+            full = tokenizer(processor.summary_prompt(text), return_tensors="pt")
+            # 复用缓存不应改变生成结果
+            assert torch.equal(model.generate(**full, max_new_tokens=20),
+                               model.generate(**processor.summary_inputs(text), max_new_tokens=20))
+
+            timings = {}
+            for name, make_inputs in (("完整预填充", lambda: tokenizer(processor.summary_prompt(text), return_tensors="pt")),
+                                      ("前缀缓存", lambda: processor.summary_inputs(text))):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    model.generate(**make_inputs(), max_new_tokens=1)
+                timings[name] = (time.perf_counter() - start) / repeats
+            prompt_tokens = full["input_ids"].shape[1]
+            print(f"   转录 {length:>3} 字 (prompt {prompt_tokens:>3} token): 首token "
+                  f"{timings['完整预填充'] * 1000:6.2f}ms → {timings['前缀缓存'] * 1000:6.2f}ms "
+                  f"({timings['完整预填充'] / timings['前缀缓存']:4.2f}x)")
+
+
+DRAFT_MODEL = "stand-in/step-audio-int8-draft"
+
+
+class EosEagerModel(torch.nn.Module):
+    """把结束符的logit抬高的包装模型，用于检查最短长度约束"""
+
+    def __init__(self, model: torch.nn.Module, eos_token_id: int = 0, bias: float = 50.0):
+        super().__init__()
+        self.model = model
+        self.eos_token_id = eos_token_id
+        self.bias = bias
+
+    def forward(self, **kwargs):
+        outputs = self.model(**kwargs)
+        outputs.logits[..., self.eos_token_id] += self.bias
+        return outputs
+
+
+def check_summary_lengths(processor: StepAudioProcessor, texts: List[str]):
+    """约束解码的总结必须是5-10个汉字；结束符最优先时也不能短于5字"""
+    import re
+    from constrained_decoding import SummaryConstraint, constrained_decode
+
+    han = re.compile(r"^[一-鿿]{5,10}$")
+    for text in texts:
+        summary = processor.tokenizer.decode(processor.decode_summary(text).tokens, skip_special_tokens=True)
+        assert han.match(summary), f"总结不符合5-10个汉字: {summary!r}"
+
+    eager = EosEagerModel(processor.model)
+    for min_chars, max_chars in ((5, 10), (3, 6), (1, 1)):
+        constraint = SummaryConstraint(processor.tokenizer, min_chars, max_chars)
+        for text in texts[:4]:
+            input_ids = processor.tokenizer(processor.summary_prompt(text), return_tensors="pt")["input_ids"]
+            for model in (processor.model, eager):
+                tokens = constrained_decode(model, input_ids, constraint).tokens
+                length = len(processor.tokenizer.decode(tokens, skip_special_tokens=True))
+                assert min_chars <= length <= max_chars, (min_chars, max_chars, length)
+            # 结束符优先时应恰好在最短长度处停止
+            assert len(constrained_decode(eager, input_ids, constraint).tokens) == min_chars
+
+    # tokenizer 没有结束符时不能放开整个词表，只能在满 max_chars 字时停止
+    no_eos = StandInTokenizer(processor.tokenizer.vocab_size)
+    no_eos.eos_token_id = None
+    constraint = SummaryConstraint(no_eos)
+    allowed = torch.isfinite(constraint.mask(torch.zeros(no_eos.vocab_size), constraint.min_chars))
+    assert int(allowed.sum()) == int((constraint.char_counts > 0).sum()), "缺少结束符时不应放开非汉字token"
+    input_ids = processor.tokenizer(processor.summary_prompt(texts[0]), return_tensors="pt")["input_ids"]
+    tokens = constrained_decode(processor.model, input_ids, constraint).tokens
+    assert len(processor.tokenizer.decode(tokens, skip_special_tokens=True)) == constraint.max_chars
+
+
+def bench_constrained_summary(num_texts: int = 24, num_draft_tokens: int = 4):
+    """总结解码步数：解码20个token后截断 vs 约束解码 vs 约束+投机解码（int8草稿模型）"""
+    from constrained_decoding import cache_length
+
+    register_stand_in_model()
+    registry.register(f"causal-lm:{DRAFT_MODEL}", lambda: registry.get(f"step-audio:{STAND_IN_MODEL}:int8")[0])
+    processor = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False, constrained_summary=True)
+    speculative = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False, constrained_summary=True,
+                                     draft_model_path=DRAFT_MODEL, num_draft_tokens=num_draft_tokens)
+    rng = np.random.default_rng(0)
+    texts = ["".join(rng.choice(list(ALPHABET), int(rng.integers(10, 60)))) for _ in range(num_texts)]
+    print(f"📊 约束解码总结 ({num_texts} 条, CPU, 替身模型, 草稿模型为int8量化副本)")
+
+    check_summary_lengths(processor, texts)
+    # 非约束模式的批量总结自行左填充，不改共享tokenizer的填充方向（ASR批次依赖右填充）
+    unconstrained = StepAudioProcessor(STAND_IN_MODEL, cache_dir=None, trim_silence=False, constrained_summary=False)
+    assert len(unconstrained.generate_summaries(texts[:4])) == 4
+    assert processor.tokenizer.padding_side == "right", "批量总结不应修改共享tokenizer"
+    with torch.inference_mode():
+        processor.summary_prefix
+        # 原实现：固定解码20个token再截断；与约束解码走同样的逐token前向，只比较步数的影响
+        start = time.perf_counter()
+        for text in texts:
+            inputs = processor.summary_inputs(text)
+            outputs = processor.model(input_ids=inputs["input_ids"][:, cache_length(inputs["past_key_values"]):],
+                                      past_key_values=inputs["past_key_values"])
+            tokens = [int(outputs.logits[0, -1].argmax())]
+            for _ in range(19):
+                outputs = processor.model(input_ids=torch.tensor([tokens[-1:]]),
+                                          past_key_values=outputs.past_key_values)
+                tokens.append(int(outputs.logits[0, -1].argmax()))
+            processor.extract_summary(processor.tokenizer.decode(tokens, skip_special_tokens=True))
+        sampled_time = (time.perf_counter() - start) / num_texts
+
+        results = {}
+        for name, p in (("约束解码", processor), ("约束 + 投机解码", speculative)):
+            p.decode_summary(texts[0])  # 预热（加载草稿模型、扫描词表）
+            start = time.perf_counter()
+            results[name] = ([p.decode_summary(text) for text in texts], (time.perf_counter() - start) / num_texts)
+
+    plain, spec = results["约束解码"][0], results["约束 + 投机解码"][0]
+    assert all(a.tokens == b.tokens for a, b in zip(plain, spec)), "投机解码不应改变贪心结果"
+    print(f"   解码20 token后截断: 目标模型前向 20.0 次/条, {sampled_time * 1000:6.1f}ms/条")
+    for name, (decoded, elapsed) in results.items():
+        forwards = np.mean([result.target_forwards for result in decoded])
+        line = f"   {name}: 目标模型前向 {forwards:4.1f} 次/条, {elapsed * 1000:6.1f}ms/条"
+        proposed = sum(result.proposed_tokens for result in decoded)
+        if proposed:
+            accepted = sum(result.accepted_tokens for result in decoded)
+            line += f", 草稿接受率 {accepted / proposed:.0%}"
+        print(line)
+
+
+async def start_stub_api_server(latency_ms: float = 5, fail_every: int = 0):
+    """本地的Step-Audio API替身：/process 等待 latency_ms 后返回JSON；fail_every>0 时每N个请求返回一次503
+
+    返回 (runner, endpoint, stats)，stats 记录请求数和不同的客户端连接数。
+    """
+    from aiohttp import web
+
+    stats = {"requests": 0, "connections": set()}
+
+    async def process(request):
+        stats["requests"] += 1
+        stats["connections"].add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        if fail_every and stats["requests"] % fail_every == 0:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.json_response({"transcription": body["audio_url"], "summary": "替身总结", "confidence": 0.9})
+
+    app = web.Application()
+    app.router.add_post("/process", process)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/process", stats
+
+
+async def legacy_process_via_api(endpoint: str, audio_url: str):
+    """原 process_via_api：每次调用新建 ClientSession"""
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(endpoint, json={"audio_url": audio_url}) as response:
+            return await response.json()
+
+
+async def bench_api_client(num_requests: int = 400, concurrency: int = 16, latency_ms: float = 5):
+    """Step-Audio API调用吞吐：每次新建session vs 连接池客户端的 process_many"""
+    from step_audio_client import StepAudioAPIClient
+
+    urls = [f"https://example.com/audio/{i}.wav" for i in range(num_requests)]
+    print(f"📊 Step-Audio API客户端 ({num_requests} 个请求, 并发 {concurrency}, 本地替身服务 {latency_ms:.0f}ms)")
+
+    runner, endpoint, stats = await start_stub_api_server(latency_ms)
+    try:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def legacy(url):
+            async with slots:
+                return await legacy_process_via_api(endpoint, url)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(legacy(url) for url in urls))
+        elapsed = time.perf_counter() - start
+        print(f"   每次新建session: {num_requests / elapsed:7.1f} 请求/秒, {len(stats['connections'])} 个TCP连接")
+
+        stats["connections"].clear()
+        async with StepAudioAPIClient(endpoint, limit_per_host=concurrency) as client:
+            start = time.perf_counter()
+            results = await client.process_many(urls)
+            elapsed = time.perf_counter() - start
+        assert [result["transcription"] for result in results] == urls, "结果应与输入顺序一致"
+        print(f"   连接池 process_many: {num_requests / elapsed:7.1f} 请求/秒, {len(stats['connections'])} 个TCP连接")
+    finally:
+        await runner.cleanup()
+
+    # 503 按 Retry-After 重试，最终全部成功
+    runner, endpoint, stats = await start_stub_api_server(latency_ms, fail_every=5)
+    try:
+        async with StepAudioAPIClient(endpoint, limit_per_host=concurrency, backoff=0.01) as client:
+            results = await client.process_many(urls[:50])
+        assert [result["transcription"] for result in results] == urls[:50]
+        print(f"   每5个请求一次503: 50 个请求全部成功, 重试 {client.retries} 次")
+    finally:
+        await runner.cleanup()
+
+
+def edit_distance(reference: str, hypothesis: str) -> int:
+    """字符级编辑距离（中文按字计算，即CER的分子）"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1]
+
+
+def error_rate(references: List[str], hypotheses: List[str]) -> float:
+    """语料级字错误率：总编辑距离 / 参考总字数"""
+    errors = sum(edit_distance(ref, hyp) for ref, hyp in zip(references, hypotheses))
+    return errors / max(sum(len(ref) for ref in references), 1)
+
+
+def bench_cpu_int8(sample_dir: str = None, model_path: str = STAND_IN_MODEL, num_clips: int = 16,
+                   clip_seconds: float = 10, num_threads: int = None):
+    """CPU推理模式：float32 vs 线性层动态int8量化的耗时和字错误率
+
+    sample_dir 下放固定的 *.wav 及同名 *.txt 参考文本时，用参考文本计算两种模式各自的错误率；
+    否则使用固定随机种子生成的音频，以float32的转录为参考，只衡量量化带来的错误率漂移。
+    替身模型是随机权重，logit之间的差距极小，一个token被量化误差翻转后贪心解码的后续全部改变，
+    因此替身模型上的漂移只是上界；实际漂移需用 sample_dir 和真实模型测量。
+    """
+    from audio_frontend import load_batch
+
+    register_stand_in_model()
+    num_threads = num_threads or os.cpu_count()
+    if sample_dir:
+        paths = sorted(glob.glob(os.path.join(sample_dir, "*.wav")))
+        references = [Path(path).with_suffix(".txt").read_text(encoding="utf-8").strip() for path in paths]
+        clips = [torch.from_numpy(audio) for audio in load_batch(paths)]
+    else:
+        rng = np.random.default_rng(0)
+        clips = [torch.from_numpy(rng.normal(0, 0.1, int(clip_seconds * 16000)).astype(np.float32))
+                 for _ in range(num_clips)]
+        references = None
+    print(f"📊 CPU int8 动态量化 ({len(clips)} 段, {num_threads} 线程, {model_path})")
+
+    timings, transcripts = {}, {}
+    for name, cpu_int8 in (("float32", False), ("int8", True)):
+        processor = StepAudioProcessor(model_path, cache_dir=None, trim_silence=False, cpu_int8=cpu_int8,
+                                       num_threads=num_threads)
+
+        def transcribe(clip: torch.Tensor) -> str:
+            return processor.tokenizer.decode(processor.generate_transcript(clip).sequences[0],
+                                              skip_special_tokens=True)
+
+        with torch.inference_mode():
+            transcribe(clips[0])  # 预热
+            start = time.perf_counter()
+            transcripts[name] = [transcribe(clip) for clip in clips]
+            timings[name] = (time.perf_counter() - start) / len(clips)
+
+    references = references or transcripts["float32"]
+    baseline = timings["float32"]
+    for name, elapsed in timings.items():
+        print(f"   {name:>7}: {elapsed * 1000:7.1f}ms/段 ({baseline / elapsed:4.2f}x), "
+              f"字错误率 {error_rate(references, transcripts[name]):6.2%}")
+    drift = error_rate(transcripts["float32"], transcripts["int8"])
+    print(f"   int8 相对 float32 的转录漂移: {drift:6.2%}")
+
+
+async def main():
+    bench_audio_frontend()
+    bench_shared_encoding()
+    bench_confidence_and_heads()
+    bench_transcription_cache_hits()
+    bench_summary_prompt_cache()
+    bench_constrained_summary()
+    await bench_streaming_transcription()
+    await bench_silence_trimming()
+    await bench_micro_batching()
+    await bench_api_client()
+    bench_cpu_int8()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
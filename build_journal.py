@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+数据集构建日志：记录每条音频记录完成到哪个阶段，崩溃后从断点继续
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+STAGES = ("downloaded", "transcribed", "labeled", "written")
+
+
+class JournalEntry(NamedTuple):
+    stage: Optional[str]
+    audio_path: Optional[str]
+    transcription: Optional[str]
+    summary: Optional[str]
+    shard: Optional[str]
+    error: Optional[str]
+
+    def reached(self, stage: str) -> bool:
+        """是否已完成指定阶段"""
+        return self.stage is not None and STAGES.index(self.stage) >= STAGES.index(stage)
+
+
+class BuildJournal:
+    """SQLite中按 record_id 记录阶段：downloaded → transcribed → labeled → written
+
+    每个阶段完成时保存其产物（本地音频路径、转录、总结），重启时已完成的阶段直接复用。
+    written 只在样本所在分片完整落盘后才标记，并记录分片名，
+    分片丢失或校验失败时可以用 reconcile_shards 把对应记录退回 labeled。
+    """
+
+    def __init__(self, db_path: str = "training_data/journal.sqlite3"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                record_id TEXT PRIMARY KEY,
+                stage TEXT,
+                audio_path TEXT,
+                transcription TEXT,
+                summary TEXT,
+                shard TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def load(self) -> Dict[str, JournalEntry]:
+        """一次性读出所有记录的状态"""
+        rows = self._conn.execute(
+            "SELECT record_id, stage, audio_path, transcription, summary, shard, error FROM records"
+        )
+        return {row[0]: JournalEntry(*row[1:]) for row in rows}
+
+    def mark(self, record_id: str, stage: str, **fields):
+        """记录某条记录完成了 stage，fields 为该阶段产物（audio_path/transcription/summary）"""
+        columns = ["stage", "error", "updated_at"] + list(fields)
+        values = [stage, None, time.time()] + list(fields.values())
+        assignments = ", ".join(f"{c} = excluded.{c}" for c in columns)
+        self._conn.execute(
+            f"INSERT INTO records (record_id, {', '.join(columns)}) "
+            f"VALUES (?, {', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (record_id) DO UPDATE SET {assignments}",
+            [record_id] + values
+        )
+        self._conn.commit()
+
+    def mark_failed(self, record_id: str, error: str):
+        """记录失败原因，已完成的阶段保持不变，下次运行重试"""
+        self._conn.execute(
+            "INSERT INTO records (record_id, error, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (record_id) DO UPDATE SET error = excluded.error, updated_at = excluded.updated_at",
+            (record_id, error, time.time())
+        )
+        self._conn.commit()
+
+    def mark_written(self, record_ids: Iterable[str], shard: str):
+        """分片落盘后批量标记其中的记录"""
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE records SET stage = 'written', shard = ?, audio_path = NULL, updated_at = ? "
+            "WHERE record_id = ?",
+            [(shard, now, record_id) for record_id in record_ids]
+        )
+        self._conn.commit()
+
+    def reconcile_shards(self, valid_shards: List[str]) -> int:
+        """把指向已失效分片的 written 记录退回 labeled，返回受影响的记录数"""
+        placeholders = ", ".join("?" * len(valid_shards))
+        cursor = self._conn.execute(
+            "UPDATE records SET stage = 'labeled', shard = NULL "
+            f"WHERE stage = 'written' AND shard NOT IN ({placeholders})",
+            valid_shards
+        )
+        self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
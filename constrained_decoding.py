@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+定长总结的约束解码：只允许汉字token，总结满5-10字即停止，可选草稿模型做投机解码
+"""
+
+import re
+from typing import Any, List, NamedTuple, Sequence, Tuple
+
+import torch
+
+_HAN = re.compile(r"^[一-鿿]+$")
+
+
+class SummaryConstraint:
+    """总结的字母表和长度约束
+
+    词表中解码结果全部为汉字的token才允许生成（字节级BPE中被拆成多个字节token的生僻字因此不会出现）；
+    已生成字数少于 min_chars 时禁止结束符，会使总长度超过 max_chars 的token被禁止。
+    tokenizer 没有结束符时只能在满 max_chars 字时停止。
+    """
+
+    def __init__(self, tokenizer, min_chars: int = 5, max_chars: int = 10):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.eos_token_id = tokenizer.eos_token_id
+        texts = tokenizer.batch_decode(torch.arange(tokenizer.vocab_size)[:, None], skip_special_tokens=True)
+        # 每个token的汉字数，不允许的token为 0
+        self.char_counts = torch.tensor([len(text) if _HAN.match(text) else 0 for text in texts])
+
+    def mask(self, logits: torch.Tensor, produced: int) -> torch.Tensor:
+        """已生成 produced 个字时，把不允许的token的logit置为 -inf；logits 为 [vocab]"""
+        counts = self.char_counts[:logits.shape[-1]].to(logits.device)
+        allowed = torch.zeros(logits.shape[-1], dtype=torch.bool, device=logits.device)
+        allowed[:len(counts)] = (counts > 0) & (counts + produced <= self.max_chars)
+        if produced >= self.min_chars and self.eos_token_id is not None:
+            allowed[self.eos_token_id] = True
+        return logits.masked_fill(~allowed, float("-inf"))
+
+    def choose(self, logits: torch.Tensor, produced: int) -> int:
+        """约束下的贪心选择"""
+        return int(self.mask(logits, produced).argmax())
+
+    def count(self, token: int) -> int:
+        return int(self.char_counts[token]) if token < len(self.char_counts) else 0
+
+
+class DecodeResult(NamedTuple):
+    """tokens 不含结束符；target_forwards 为目标模型的前向次数（含预填充）"""
+    tokens: List[int]
+    target_forwards: int
+    draft_forwards: int
+    proposed_tokens: int
+    accepted_tokens: int
+
+
+def cache_length(past_key_values: Any) -> int:
+    """KV缓存中已有的位置数；兼容HF Cache对象和 ((k, v), ...) 元组"""
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, "get_seq_length"):
+        return past_key_values.get_seq_length()
+    return past_key_values[0][0].shape[-2]
+
+
+def crop_cache(past_key_values: Any, length: int) -> Any:
+    """丢弃 length 之后的位置（投机解码中被拒绝的token）"""
+    if hasattr(past_key_values, "crop"):
+        past_key_values.crop(length)
+        return past_key_values
+    return tuple((k[..., :length, :], v[..., :length, :]) for k, v in past_key_values)
+
+
+def _forward(model, token_ids: Sequence[int], past_key_values: Any) -> Tuple[torch.Tensor, Any]:
+    """喂入新token（batch=1），返回每个新位置的logits [n, vocab] 和更新后的缓存"""
+    device = next(model.parameters()).device
+    outputs = model(input_ids=torch.tensor([list(token_ids)], device=device),
+                    past_key_values=past_key_values, use_cache=True)
+    return outputs.logits[0].float(), outputs.past_key_values
+
+
+def constrained_decode(model, input_ids: torch.Tensor, constraint: SummaryConstraint,
+                       past_key_values: Any = None, draft_model=None,
+                       num_draft_tokens: int = 4) -> DecodeResult:
+    """在约束下贪心解码一条总结（batch=1），生成结束符或满 max_chars 字时立即停止
+
+    past_key_values 为 input_ids 前缀的KV缓存（可选），模型只计算其后的位置。
+    提供 draft_model（与目标模型共用tokenizer的小模型）时做投机解码：草稿模型在同样的约束下
+    提出至多 num_draft_tokens 个token，目标模型一次前向验证，保留与目标贪心选择一致的前缀，
+    第一个不一致的位置采用目标模型的选择。输出与不用草稿模型时完全相同，只是目标模型前向次数更少。
+    """
+    prompt = input_ids[0].tolist()
+    prompt_length = len(prompt)
+    logits, past = _forward(model, prompt[cache_length(past_key_values):], past_key_values)
+    target_forwards, draft_forwards, proposed, accepted = 1, 0, 0, 0
+
+    token = constraint.choose(logits[-1], 0)
+    if token == constraint.eos_token_id:
+        return DecodeResult([], target_forwards, draft_forwards, proposed, accepted)
+    tokens = [token]
+    produced = constraint.count(token)
+    draft_past, draft_seen = None, 0  # draft_seen: 草稿模型缓存中已确认token的个数
+    while produced < constraint.max_chars:
+        proposals: List[int] = []
+        if draft_model is not None:
+            feed = (prompt if draft_past is None else []) + tokens[draft_seen:]
+            draft_produced = produced
+            for _ in range(num_draft_tokens):
+                draft_logits, draft_past = _forward(draft_model, feed, draft_past)
+                draft_forwards += 1
+                proposal = constraint.choose(draft_logits[-1], draft_produced)
+                proposals.append(proposal)
+                draft_produced += constraint.count(proposal)
+                if proposal == constraint.eos_token_id or draft_produced >= constraint.max_chars:
+                    break
+                feed = [proposal]
+            proposed += len(proposals)
+
+        # 目标模型一次验证：logits[i] 为喂入 tokens[-1] 和 proposals[:i] 之后的预测
+        confirmed = len(tokens)
+        logits, past = _forward(model, [tokens[-1]] + proposals, past)
+        target_forwards += 1
+        new_tokens: List[int] = []
+        finished = False
+        for i in range(len(proposals) + 1):
+            token = constraint.choose(logits[i], produced)
+            new_tokens.append(token)
+            if token == constraint.eos_token_id:
+                finished = True
+                break
+            produced += constraint.count(token)
+            if produced >= constraint.max_chars or i == len(proposals) or token != proposals[i]:
+                break
+        matched = sum(1 for token, proposal in zip(new_tokens, proposals) if token == proposal)
+        accepted += matched
+
+        # 缓存只保留 prompt、已确认token和被接受的草稿token
+        past = crop_cache(past, prompt_length + confirmed + matched)
+        if draft_past is not None:
+            draft_seen = min(cache_length(draft_past) - prompt_length, confirmed + matched)
+            draft_past = crop_cache(draft_past, prompt_length + draft_seen)
+        tokens.extend(token for token in new_tokens if token != constraint.eos_token_id)
+        if finished:
+            break
+    return DecodeResult(tokens, target_forwards, draft_forwards, proposed, accepted)
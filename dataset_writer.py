@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+流式分片JSONL写入：定期flush、按样本数/大小切分片、可选gzip、带校验和的manifest
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ShardedJsonlWriter:
+    """逐条写入训练样本，内存占用与数据集大小无关
+
+    每个分片写满 max_samples_per_shard 条或 max_bytes_per_shard 字节（按未压缩计）后关闭，
+    计算SHA-256并原子地更新 manifest.json。manifest中只记录已完整写入的分片，
+    因此进程崩溃后以 resume=True 重新打开即可从最后一个完整分片之后继续：
+    未完成的分片文件会被删除，samples_written 给出需要跳过的样本数。
+
+    on_shard_closed(shard_name, keys) 在分片落盘后调用，keys 为该分片内样本写入时传入的 key，
+    用于把记录级的完成状态与分片边界对齐。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, output_dir: str = "training_data", prefix: str = "training_data",
+                 max_samples_per_shard: int = 1000, max_bytes_per_shard: int = 50 * 1024 * 1024,
+                 flush_every: int = 100, compress: bool = False, resume: bool = False,
+                 on_shard_closed: Optional[Callable[[str, List[Any]], None]] = None):
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.max_samples_per_shard = max_samples_per_shard
+        self.max_bytes_per_shard = max_bytes_per_shard
+        self.flush_every = flush_every
+        self.compress = compress
+        self.on_shard_closed = on_shard_closed
+        self.shards: List[Dict] = []
+        self._shard_keys: List[Any] = []
+        self._file = None
+        self._shard_path: Optional[Path] = None
+        self._shard_samples = 0
+        self._shard_bytes = 0
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.output_dir / self.MANIFEST
+        if resume and manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            for shard in manifest["shards"]:
+                if not self._verify(shard):
+                    break
+                self.shards.append(shard)
+        known = {s["name"] for s in self.shards}
+        for stale in self.output_dir.glob(f"{self.prefix}-*.jsonl*"):
+            if stale.name not in known:
+                stale.unlink()
+        self._write_manifest(complete=False)
+
+    @property
+    def samples_written(self) -> int:
+        """已完整落盘（写入manifest）的样本数"""
+        return sum(s["samples"] for s in self.shards)
+
+    def write(self, sample: Dict, key: Any = None):
+        """写入一条样本"""
+        if self._file is None:
+            self._open_shard()
+        line = (json.dumps(sample, ensure_ascii=False) + "\n").encode("utf-8")
+        self._file.write(line)
+        if key is not None:
+            self._shard_keys.append(key)
+        self._shard_samples += 1
+        self._shard_bytes += len(line)
+        if self._shard_samples % self.flush_every == 0:
+            self._file.flush()
+        if (self._shard_samples >= self.max_samples_per_shard
+                or self._shard_bytes >= self.max_bytes_per_shard):
+            self._close_shard()
+
+    def close(self) -> Dict:
+        """关闭当前分片并把manifest标记为完成，返回manifest"""
+        if self._file is not None:
+            self._close_shard()
+        return self._write_manifest(complete=True)
+
+    def open_concatenated(self) -> io.BufferedReader:
+        """按manifest顺序把所有分片拼接成一个可读的JSONL流（gzip分片自动解压）"""
+        return io.BufferedReader(_ConcatenatedShards([self.output_dir / s["name"] for s in self.shards]))
+
+    def _open_shard(self):
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        self._shard_path = self.output_dir / f"{self.prefix}-{len(self.shards):05d}{suffix}"
+        raw = open(self._shard_path, "wb")
+        self._file = gzip.GzipFile(fileobj=raw, mode="wb") if self.compress else raw
+        self._shard_samples = 0
+        self._shard_bytes = 0
+        self._shard_keys = []
+
+    def _close_shard(self):
+        if self.compress:
+            # GzipFile.close() 只写入尾部，不关闭传入的底层文件
+            raw = self._file.fileobj
+            self._file.close()
+        else:
+            raw = self._file
+        raw.flush()
+        os.fsync(raw.fileno())
+        raw.close()
+        self.shards.append({
+            "name": self._shard_path.name,
+            "samples": self._shard_samples,
+            "bytes": self._shard_path.stat().st_size,
+            "sha256": _sha256_file(self._shard_path)
+        })
+        self._file = None
+        self._write_manifest(complete=False)
+        if self.on_shard_closed is not None:
+            self.on_shard_closed(self._shard_path.name, self._shard_keys)
+
+    def _verify(self, shard: Dict) -> bool:
+        path = self.output_dir / shard["name"]
+        return path.exists() and _sha256_file(path) == shard["sha256"]
+
+    def _write_manifest(self, complete: bool) -> Dict:
+        manifest = {
+            "shards": self.shards,
+            "total_samples": self.samples_written,
+            "compressed": self.compress,
+            "complete": complete
+        }
+        _write_json_atomic(self.output_dir / self.MANIFEST, manifest)
+        return manifest
+
+
+def merge_manifests(output_dir: str, part_dirs: List[Path]) -> Dict:
+    """把多个分区目录的manifest合并为 output_dir/manifest.json，分片名带上分区子目录前缀"""
+    output_dir = Path(output_dir)
+    shards = []
+    complete = True
+    compressed = False
+    for part_dir in part_dirs:
+        part_dir = Path(part_dir)
+        manifest = json.loads((part_dir / ShardedJsonlWriter.MANIFEST).read_text(encoding="utf-8"))
+        relative = part_dir.relative_to(output_dir)
+        shards.extend({**shard, "name": str(relative / shard["name"])} for shard in manifest["shards"])
+        complete = complete and manifest["complete"]
+        compressed = compressed or manifest["compressed"]
+    merged = {
+        "shards": shards,
+        "total_samples": sum(s["samples"] for s in shards),
+        "compressed": compressed,
+        "complete": complete
+    }
+    _write_json_atomic(output_dir / ShardedJsonlWriter.MANIFEST, merged)
+    return merged
+
+
+def open_manifest(output_dir: str) -> io.BufferedReader:
+    """按 output_dir/manifest.json 的顺序拼接读取所有分片"""
+    output_dir = Path(output_dir)
+    manifest = json.loads((output_dir / ShardedJsonlWriter.MANIFEST).read_text(encoding="utf-8"))
+    return io.BufferedReader(_ConcatenatedShards([output_dir / s["name"] for s in manifest["shards"]]))
+
+
+def _write_json_atomic(path: Path, data: Dict):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _ConcatenatedShards(io.RawIOBase):
+    """顺序读取多个分片文件的只读流"""
+
+    def __init__(self, paths: List[Path]):
+        self._paths = list(paths)
+        self._current = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return 0
+                path = self._paths.pop(0)
+                self._current = gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+            n = self._current.readinto(buffer)
+            if n:
+                return n
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
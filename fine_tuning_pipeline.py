@@ -3,68 +3,366 @@
 语音识别+LLM微调数据处理Pipeline
 """
 
-import json
-import whisper
+import multiprocessing
+import os
+import sys
+import tempfile
 import openai
+from importlib.metadata import version
 from pathlib import Path
-from typing import List, Dict
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from supabase import create_client, Client
 
+from batching import MicroBatcher
+from build_journal import BuildJournal, JournalEntry
+from dataset_writer import ShardedJsonlWriter, merge_manifests, open_manifest
+from job_watcher import FineTuneJobWatcher
+from model_registry import registry, whisper_model_key
+from record_reader import KeysetPageReader
+from summary_labeler import SummaryLabeler
+from transcription_cache import TranscriptionCache
+
+SYSTEM_PROMPT = "你是一个专业的语音内容总结助手，能够将语音转录文本总结为5-10个字的简洁标题。"
+WHISPER_MODEL = "base"
+
+
 class AudioFineTuningPipeline:
-    def __init__(self, supabase_url: str, supabase_key: str, openai_key: str):
+    def __init__(self, supabase_url: str, supabase_key: str, openai_key: str,
+                 download_concurrency: int = 8, transcribe_workers: int = 1,
+                 label_concurrency: int = 8, batch_size: int = 16,
+                 max_padding_ratio: float = 0.3, cache_dir: Optional[str] = ".cache",
+                 journal_path: Optional[str] = None, page_size: int = 500,
+                 transcribe_processes: int = 0, warm_up: bool = False,
+                 language: Optional[str] = None):
         self.supabase: Client = create_client(supabase_url, supabase_key)
+        self.record_reader = KeysetPageReader(self.supabase, page_size=page_size)
         openai.api_key = openai_key
-        self.whisper_model = whisper.load_model("base")
-    
-    async def collect_training_data(self, user_id: str) -> List[Dict]:
-        """从Supabase收集用户的音频数据"""
-        response = self.supabase.table("audio_records").select("*").eq("user_id", user_id).execute()
-        
-        training_data = []
-        for record in response.data:
-            # 下载音频文件
-            audio_data = await self.download_audio(record["audio_url"])
-            
-            # Whisper转录
-            transcription = self.whisper_model.transcribe(audio_data)["text"]
-            
-            # 构造训练样本
-            training_sample = {
-                "messages": [
-                    {"role": "system", "content": "你是一个专业的语音内容总结助手，能够将语音转录文本总结为5-10个字的简洁标题。"},
-                    {"role": "user", "content": f"请总结这段话：{transcription}"},
-                    {"role": "assistant", "content": self.generate_expected_summary(transcription)}
-                ]
-            }
-            training_data.append(training_sample)
-        
-        return training_data
-    
-    def generate_expected_summary(self, text: str) -> str:
-        """生成期望的总结（基线模型）"""
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "用5-10个中文字总结核心内容"},
-                {"role": "user", "content": text}
-            ],
-            max_tokens=20
+        self.max_padding_ratio = max_padding_ratio
+        self._init_stages(download_concurrency, transcribe_workers, label_concurrency, batch_size,
+                          transcribe_processes, language)
+        # Whisper在第一次转录时才加载；进程池模式下由每个工作进程各自加载
+        self.whisper_model_key = whisper_model_key(WHISPER_MODEL)
+        self._transcriber = None
+        if warm_up and not transcribe_processes:
+            registry.warm_up(self.whisper_model_key)
+        if cache_dir:
+            self.transcription_cache = TranscriptionCache(str(Path(cache_dir) / "transcriptions.sqlite3"))
+        self.labeler = SummaryLabeler(
+            api_key=openai_key,
+            max_in_flight=label_concurrency,
+            cache_path=str(Path(cache_dir) / "summaries.sqlite3") if cache_dir else None
         )
-        return response.choices[0].message.content.strip()
+        if journal_path:
+            self.journal = BuildJournal(journal_path)
+
+    def _init_stages(self, download_concurrency: int, transcribe_workers: int,
+                     label_concurrency: int, batch_size: int = 16, transcribe_processes: int = 0,
+                     language: Optional[str] = None):
+        """初始化各阶段的并发限制
+
+        下载和标注是IO密集型，用信号量限流；转录是CPU密集型，
+        攒成批次后放到独立线程池中执行，避免阻塞事件循环。
+        transcribe_processes > 0 时改用进程池，每个进程加载一份模型，可随核数扩展。
+        language 为Whisper转录语言，None 时自动检测。
+        """
+        self.download_concurrency = download_concurrency
+        self.transcribe_processes = transcribe_processes
+        self.transcribe_workers = transcribe_processes or transcribe_workers
+        self.label_concurrency = label_concurrency
+        self.batch_size = batch_size
+        # 同时在处理中的记录数上限，保证内存占用不随数据集大小增长
+        self.max_pending = 2 * max(download_concurrency, label_concurrency, batch_size * self.transcribe_workers)
+        self._transcribe_executor: Optional[Executor] = None
+        self._batcher: Optional[MicroBatcher] = None
+        self._stage_limits: Optional[Tuple[asyncio.Semaphore, asyncio.Semaphore]] = None
+        self._http_session = None
+        self.transcription_cache: Optional[TranscriptionCache] = None
+        self.labeler: Optional[SummaryLabeler] = None
+        self.journal: Optional[BuildJournal] = None
+        self.language = language
+        # 转录语言影响结果，计入缓存版本；None 为自动检测
+        self.transcription_model = (f"whisper-{WHISPER_MODEL}",
+                                    f"{version('openai-whisper')}+{self.language or 'auto'}")
+
+    @property
+    def whisper_model(self):
+        return registry.get(self.whisper_model_key)
+
+    @property
+    def transcriber(self):
+        if self._transcriber is None:
+            from whisper_batch import BatchTranscriber
+            self._transcriber = BatchTranscriber(
+                self.whisper_model,
+                batch_size=self.batch_size,
+                max_padding_ratio=self.max_padding_ratio,
+                language=self.language
+            )
+        return self._transcriber
+
+    async def collect_training_data(self, user_id: str) -> AsyncIterator[Tuple[str, Dict]]:
+        """从Supabase收集用户的音频数据，逐条产出 (record_id, 训练样本)"""
+        async for item in self.iter_training_samples(self.record_reader.iter_records(user_id)):
+            yield item
+
+    async def iter_training_samples(self, records: Union[Iterable[Dict], AsyncIterable[Dict]]
+                                    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """分阶段并发处理记录：下载 → 转录 → 标注
+
+        每个阶段有独立的并发上限，不同记录的下载、转录、标注可以互相重叠。
+        最多 max_pending 条记录同时在处理中；样本按输入记录顺序产出，保证输出确定。
+
+        启用构建日志时，已写入分片的记录直接跳过，已完成转录/标注的记录复用日志中的结果；
+        单条记录失败只记入日志，不中断整个构建，下次运行时重试。
+        """
+        download_sem, label_sem = self._get_stage_limits()
+        batcher = self._get_batcher()
+
+        journal_state = self.journal.load() if self.journal is not None else {}
+        no_entry = JournalEntry(None, None, None, None, None, None)
+
+        async def transcribe_record(record_id: str, record: Dict, entry: JournalEntry) -> str:
+            if entry.stage == "downloaded" and entry.audio_path and os.path.exists(entry.audio_path):
+                audio_path = entry.audio_path
+            else:
+                async with download_sem:
+                    audio_path = await self.download_audio(record["audio_url"])
+                self.journal_mark(record_id, "downloaded", audio_path=audio_path)
+            try:
+                content_hash, transcription = await asyncio.to_thread(
+                    self.lookup_transcription, audio_path
+                )
+                if transcription is None:
+                    transcription = await batcher.submit((record_id, audio_path))
+                    if content_hash is not None:
+                        self.transcription_cache.put(content_hash, *self.transcription_model, transcription)
+            finally:
+                self.discard_audio(audio_path)
+            self.journal_mark(record_id, "transcribed", transcription=transcription, audio_path=None)
+            return transcription
+
+        async def process(record: Dict) -> Optional[Tuple[str, Dict]]:
+            record_id = str(record["id"])
+            entry = journal_state.get(record_id, no_entry)
+            try:
+                if entry.reached("transcribed"):
+                    transcription = entry.transcription
+                else:
+                    transcription = await transcribe_record(record_id, record, entry)
+                if entry.reached("labeled"):
+                    summary = entry.summary
+                else:
+                    async with label_sem:
+                        summary = await self.generate_expected_summary(transcription)
+                    self.journal_mark(record_id, "labeled", summary=summary)
+            except Exception as e:
+                print(f"❌ 记录 {record_id} 处理失败: {e}")
+                if self.journal is not None:
+                    self.journal.mark_failed(record_id, repr(e))
+                return None
+            return record_id, self.build_training_sample(transcription, summary)
+
+        pending = deque()
+        skipped = 0
+        try:
+            async for record in _as_async_iter(records):
+                if journal_state.get(str(record["id"]), no_entry).reached("written"):
+                    skipped += 1
+                    continue
+                pending.append(asyncio.create_task(process(record)))
+                if len(pending) >= self.max_pending:
+                    item = await pending.popleft()
+                    if item is not None:
+                        yield item
+            while pending:
+                item = await pending.popleft()
+                if item is not None:
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if skipped:
+            print(f"跳过 {skipped} 条已写入分片的记录")
+
+    def _get_stage_limits(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        """下载和标注的并发信号量，由同时运行的所有数据分区共享，总并发不随分区数倍增"""
+        if self._stage_limits is None:
+            self._stage_limits = (asyncio.Semaphore(self.download_concurrency),
+                                  asyncio.Semaphore(self.label_concurrency))
+        return self._stage_limits
+
+    def _get_batcher(self) -> MicroBatcher:
+        """所有数据分区共享的转录批处理器，保证批次尽量填满"""
+        if self._batcher is None:
+            if self.transcribe_processes:
+                import whisper_batch
+                # spawn：不把事件循环、数据库连接和线程状态fork进工作进程
+                self._transcribe_executor = ProcessPoolExecutor(
+                    max_workers=self.transcribe_processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=whisper_batch.init_worker,
+                    initargs=(WHISPER_MODEL, self.batch_size, self.max_padding_ratio,
+                              max(1, (os.cpu_count() or 1) // self.transcribe_processes), self.language)
+                )
+                batch_fn = whisper_batch.transcribe_in_worker
+            else:
+                self._transcribe_executor = ThreadPoolExecutor(
+                    max_workers=self.transcribe_workers,
+                    thread_name_prefix="whisper"
+                )
+                batch_fn = self.transcribe_batch
+            self._batcher = MicroBatcher(
+                batch_fn,
+                max_batch_size=self.batch_size,
+                workers=self.transcribe_workers,
+                executor=self._transcribe_executor
+            )
+        return self._batcher
+
+    def reset_cache_stats(self):
+        """清零转录/标签缓存的命中统计"""
+        if self.transcription_cache is not None:
+            self.transcription_cache.reset_stats()
+        if self.labeler is not None and self.labeler.cache is not None:
+            self.labeler.cache.reset_stats()
+
+    def report_cache_stats(self):
+        """打印本次运行的缓存命中情况"""
+        if self.transcription_cache is not None:
+            stats = self.transcription_cache.stats()
+            print(f"转录缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}")
+        if self.labeler is not None and self.labeler.cache is not None:
+            stats = self.labeler.cache.stats()
+            print(f"标签缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}")
+
+    async def download_audio(self, audio_url: str) -> str:
+        """下载音频到临时文件，返回本地路径"""
+        import aiohttp
+
+        if self._http_session is None:
+            self._http_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=300)
+            )
+        suffix = Path(urlparse(audio_url).path).suffix or ".m4a"
+        fd, audio_path = tempfile.mkstemp(prefix="audio_", suffix=suffix)
+        try:
+            async with self._http_session.get(audio_url) as response:
+                response.raise_for_status()
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.content.iter_chunked(1 << 16):
+                        f.write(chunk)
+        except BaseException:
+            self.discard_audio(audio_path)
+            raise
+        return audio_path
+
+    def discard_audio(self, audio_path: str):
+        """删除已处理完的临时音频"""
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+
+    def journal_mark(self, record_id: str, stage: str, **fields):
+        """在构建日志中记录阶段完成（未启用日志时忽略）"""
+        if self.journal is not None:
+            self.journal.mark(record_id, stage, **fields)
+
+    def mark_written(self, shard: str, record_ids: List[str]):
+        """分片落盘回调：把分片内的记录标记为 written"""
+        if self.journal is not None:
+            self.journal.mark_written(record_ids, shard)
+
+    def open_training_writer(self, output_dir: str = "training_data", **options) -> ShardedJsonlWriter:
+        """打开分片输出：启用构建日志时续写，否则清空后重新写
+
+        构建日志会跳过已 written 的记录，因此有日志时不能清空输出目录，否则这些记录不会再出现在上传文件中；
+        续写后把分片已丢失的记录退回 labeled。没有日志时每次运行都会重新产出全部样本，续写会重复写入。
+        """
+        resume = self.journal is not None
+        writer = ShardedJsonlWriter(output_dir, resume=resume, on_shard_closed=self.mark_written, **options)
+        if resume:
+            self.journal.reconcile_shards([shard["name"] for shard in writer.shards])
+        return writer
+
+    def lookup_transcription(self, audio_path: str) -> Tuple[Optional[str], Optional[str]]:
+        """按音频内容哈希查询转录缓存，返回 (内容哈希, 缓存文本)"""
+        if self.transcription_cache is None:
+            return None, None
+        content_hash = TranscriptionCache.hash_file(audio_path)
+        return content_hash, self.transcription_cache.get(content_hash, *self.transcription_model)
+
+    def transcribe_batch(self, items: List[Tuple[str, str]]) -> List[Union[str, Exception]]:
+        """批量Whisper转录（在工作线程中执行），items为 (record_id, 音频路径)；解码失败的条目返回异常"""
+        results = self.transcriber.transcribe_batch(dict(items))
+        return [results[record_id] for record_id, _ in items]
+
+    def build_training_sample(self, transcription: str, summary: str) -> Dict:
+        """构造训练样本"""
+        return {
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"请总结这段话：{transcription}"},
+                {"role": "assistant", "content": summary}
+            ]
+        }
+
+    async def close(self):
+        """释放HTTP会话和线程池"""
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+        if self._batcher is not None:
+            await self._batcher.close()
+            self._batcher = None
+        self._stage_limits = None
+        if self._transcribe_executor is not None:
+            self._transcribe_executor.shutdown(wait=False)
+            self._transcribe_executor = None
+        if self.transcription_cache is not None:
+            self.transcription_cache.close()
+            self.transcription_cache = None
+        if self.labeler is not None:
+            await self.labeler.close()
+            self.labeler = None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
     
-    async def prepare_fine_tuning_file(self, training_data: List[Dict]) -> str:
-        """准备OpenAI微调文件"""
-        file_path = "training_data.jsonl"
-        with open(file_path, "w", encoding="utf-8") as f:
-            for sample in training_data:
-                f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+    async def generate_expected_summary(self, text: str) -> str:
+        """生成期望的总结（基线模型），归一化去重并缓存"""
+        return await self.labeler.summarize(text)
+    
+    async def prepare_fine_tuning_file(self, training_data: AsyncIterator[Tuple[str, Dict]],
+                                       writer: Optional[ShardedJsonlWriter] = None) -> str:
+        """准备OpenAI微调文件：流式写入分片，再按顺序拼接上传
+
+        未传 writer 时用 open_training_writer() 续写 training_data；应在开始迭代 training_data 之前调用。
+        """
+        if writer is None:
+            writer = self.open_training_writer()
+        async for record_id, sample in training_data:
+            writer.write(sample, key=record_id)
+        manifest = writer.close()
+        print(f"写入 {manifest['total_samples']} 个训练样本, {len(manifest['shards'])} 个分片")
         
         # 上传到OpenAI
-        with open(file_path, "rb") as f:
-            response = openai.files.create(file=f, purpose="fine-tune")
+        with writer.open_concatenated() as f:
+            response = openai.files.create(file=("training_data.jsonl", f), purpose="fine-tune")
         
         return response.id
+
+    async def upload_training_file(self, output_dir: str) -> str:
+        """按manifest顺序拼接分片并上传到OpenAI"""
+        with open_manifest(output_dir) as f:
+            response = openai.files.create(file=("training_data.jsonl", f), purpose="fine-tune")
+        return response.id
     
     async def start_fine_tuning(self, training_file_id: str) -> str:
         """启动微调作业"""
@@ -81,43 +379,126 @@ class AudioFineTuningPipeline:
         return job.id
     
     async def monitor_training(self, job_id: str):
-        """监控训练进度"""
-        while True:
-            job = openai.fine_tuning.jobs.retrieve(job_id)
-            print(f"状态: {job.status}")
-            
-            if job.status == "succeeded":
-                print(f"微调完成! 模型ID: {job.fine_tuned_model}")
-                return job.fine_tuned_model
-            elif job.status == "failed":
-                print(f"微调失败: {job.error}")
-                return None
-            
-            await asyncio.sleep(60)  # 每分钟检查一次
+        """监控训练进度：打印新的作业事件，作业结束后返回微调模型ID"""
+        watcher = FineTuneJobWatcher(
+            openai.AsyncOpenAI(api_key=openai.api_key),
+            on_event=lambda _, event: print(f"[{event.level}] {event.message}")
+        )
+        try:
+            job = await watcher.wait(job_id)
+        finally:
+            await watcher.close()
+
+        if job.status == "succeeded":
+            print(f"微调完成! 模型ID: {job.fine_tuned_model}")
+            return job.fine_tuned_model
+        print(f"微调{'失败' if job.status == 'failed' else '已取消'}: {job.error}")
+        return None
+
+async def build_corpus(pipeline: AudioFineTuningPipeline, output_dir: str = "corpus",
+                       user_ids: Optional[List[str]] = None, partitions: int = 4,
+                       max_samples_per_shard: int = 1000) -> Dict:
+    """全量构建：把所有用户分成若干分区并发处理，合并为一个分片化输出
+
+    分区按用户轮流分配，每个分区按用户顺序读取记录并写入 output_dir/part-XXX/，
+    所有分区共享同一个转录批处理器（建议以 transcribe_processes 启用进程池）、标签层和缓存。
+    各分区可以独立断点续跑；结束后合并出 output_dir/manifest.json。
+    """
+    if user_ids is None:
+        users = KeysetPageReader(pipeline.supabase, table="users", columns=("id", "created_at"))
+        user_ids = [user["id"] async for user in users.iter_records()]
+    parts = [user_ids[i::partitions] for i in range(partitions)]
+    part_dirs = [Path(output_dir) / f"part-{i:03d}" for i in range(partitions)]
+    print(f"📦 {len(user_ids)} 个用户, {partitions} 个分区")
+
+    writers = []
+    for part_dir in part_dirs:
+        prefix = part_dir.name
+        writers.append(ShardedJsonlWriter(
+            str(part_dir),
+            max_samples_per_shard=max_samples_per_shard,
+            resume=True,
+            on_shard_closed=lambda shard, keys, prefix=prefix: pipeline.mark_written(f"{prefix}/{shard}", keys)
+        ))
+    if pipeline.journal is not None:
+        pipeline.journal.reconcile_shards([
+            f"{part_dir.name}/{shard['name']}" for part_dir, writer in zip(part_dirs, writers) for shard in writer.shards
+        ])
+
+    async def partition_records(users: List[str]) -> AsyncIterator[Dict]:
+        for user_id in users:
+            async for record in pipeline.record_reader.iter_records(user_id):
+                yield record
+
+    async def run_partition(users: List[str], writer: ShardedJsonlWriter):
+        async for record_id, sample in pipeline.iter_training_samples(partition_records(users)):
+            writer.write(sample, key=record_id)
+        writer.close()
+
+    pipeline.reset_cache_stats()
+    await asyncio.gather(*(run_partition(users, writer) for users, writer in zip(parts, writers)))
+    pipeline.report_cache_stats()
+
+    manifest = merge_manifests(output_dir, part_dirs)
+    print(f"✅ 合并完成: {manifest['total_samples']} 个样本, {len(manifest['shards'])} 个分片")
+    return manifest
+
+async def _as_async_iter(records: Union[Iterable[Dict], AsyncIterable[Dict]]) -> AsyncIterator[Dict]:
+    """统一同步/异步可迭代对象"""
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
 
 async def main():
     pipeline = AudioFineTuningPipeline(
         supabase_url="YOUR_SUPABASE_URL",
         supabase_key="YOUR_SUPABASE_KEY", 
-        openai_key="YOUR_OPENAI_KEY"
+        openai_key="YOUR_OPENAI_KEY",
+        journal_path="training_data/journal.sqlite3",
+        warm_up=True
     )
-    
-    # 1. 收集训练数据
-    training_data = await pipeline.collect_training_data("user_id_here")
-    print(f"收集到 {len(training_data)} 个训练样本")
-    
-    # 2. 准备微调文件
-    file_id = await pipeline.prepare_fine_tuning_file(training_data)
-    print(f"训练文件上传完成: {file_id}")
-    
-    # 3. 启动微调
-    job_id = await pipeline.start_fine_tuning(file_id)
-    print(f"微调作业启动: {job_id}")
-    
-    # 4. 监控训练
-    model_id = await pipeline.monitor_training(job_id)
-    if model_id:
-        print(f"微调模型可用: {model_id}")
+    try:
+        # 1. 收集训练数据（根据构建日志从断点继续）
+        writer = pipeline.open_training_writer("training_data")
+        pipeline.reset_cache_stats()
+        training_data = pipeline.collect_training_data("user_id_here")
+
+        # 2. 准备微调文件
+        file_id = await pipeline.prepare_fine_tuning_file(training_data, writer)
+        pipeline.report_cache_stats()
+        print(f"训练文件上传完成: {file_id}")
+
+        # 3. 启动微调
+        job_id = await pipeline.start_fine_tuning(file_id)
+        print(f"微调作业启动: {job_id}")
+
+        # 4. 监控训练
+        model_id = await pipeline.monitor_training(job_id)
+        if model_id:
+            print(f"微调模型可用: {model_id}")
+    finally:
+        await pipeline.close()
+
+async def corpus_main():
+    """全量用户语料构建（5000-10000样本规模）"""
+    pipeline = AudioFineTuningPipeline(
+        supabase_url="YOUR_SUPABASE_URL",
+        supabase_key="YOUR_SUPABASE_KEY",
+        openai_key="YOUR_OPENAI_KEY",
+        journal_path="corpus/journal.sqlite3",
+        transcribe_processes=os.cpu_count() or 1,
+        download_concurrency=32,
+        label_concurrency=32
+    )
+    try:
+        await build_corpus(pipeline, "corpus")
+        file_id = await pipeline.upload_training_file("corpus")
+        print(f"训练文件上传完成: {file_id}")
+    finally:
+        await pipeline.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(corpus_main() if "--corpus" in sys.argv else main())
\ No newline at end of file
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+微调作业监控：异步轮询、自适应退避、增量拉取作业事件、同一事件循环监控多个作业
+"""
+
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import openai
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobUpdate(NamedTuple):
+    job_id: str
+    status: str
+    events: List          # 本次新增的作业事件，按时间升序
+    job: object           # fine_tuning.jobs.retrieve 返回的作业对象
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+class FineTuneJobWatcher:
+    """用 AsyncOpenAI 客户端监控一个或多个微调作业
+
+    每个作业一个轮询协程：间隔从 min_interval 开始，每次查询后乘以 backoff，最多到 max_interval；
+    状态变化时回到 min_interval。作业刚启动或刚开始训练时查询较密，长时间训练时查询逐渐稀疏。
+    事件接口按时间倒序分页，每次只翻到上次见过的最新事件为止，不会重复拉取历史事件。
+
+    结果可以通过 watch() 异步迭代，也可以通过回调获取：
+    on_event(job_id, event) 对每条新事件调用，on_terminal(job) 在作业进入终态时调用。
+    """
+
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None, min_interval: float = 2.0,
+                 max_interval: float = 60.0, backoff: float = 1.5, event_page_size: int = 50,
+                 on_event: Optional[Callable[[str, object], None]] = None,
+                 on_terminal: Optional[Callable[[object], None]] = None):
+        self.client = client or openai.AsyncOpenAI()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.event_page_size = event_page_size
+        self.on_event = on_event
+        self.on_terminal = on_terminal
+        self.requests_sent = 0
+
+    async def watch(self, job_ids: Iterable[str]) -> AsyncIterator[JobUpdate]:
+        """并发监控多个作业，产出每次状态变化或新事件，所有作业都进入终态后结束"""
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self._watch_job(job_id, queue)) for job_id in dict.fromkeys(job_ids)]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                update = await queue.get()
+                if isinstance(update, BaseException):
+                    raise update
+                if update.terminal:
+                    remaining -= 1
+                yield update
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait(self, job_id: str):
+        """监控单个作业直到终态，返回最终的作业对象"""
+        async for update in self.watch([job_id]):
+            if update.terminal:
+                return update.job
+
+    async def wait_all(self, job_ids: Iterable[str]) -> Dict[str, object]:
+        """监控多个作业直到全部终态，返回 {job_id: 最终作业对象}"""
+        return {update.job_id: update.job async for update in self.watch(job_ids) if update.terminal}
+
+    async def close(self):
+        await self.client.close()
+
+    async def _watch_job(self, job_id: str, queue: asyncio.Queue):
+        last_event_id = None
+        last_status = None
+        interval = self.min_interval
+        try:
+            while True:
+                try:
+                    self.requests_sent += 1
+                    job, events = await asyncio.gather(
+                        self.client.fine_tuning.jobs.retrieve(job_id),
+                        self._new_events(job_id, last_event_id)
+                    )
+                except (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError) as e:
+                    print(f"⚠️ 作业 {job_id} 查询失败，{interval:.0f}s 后重试: {e}")
+                    await asyncio.sleep(interval)
+                    interval = min(interval * self.backoff, self.max_interval)
+                    continue
+
+                if events:
+                    last_event_id = events[-1].id
+                    if self.on_event is not None:
+                        for event in events:
+                            self.on_event(job_id, event)
+                status_changed = job.status != last_status
+                if events or status_changed:
+                    last_status = job.status
+                    update = JobUpdate(job_id, job.status, events, job)
+                    if update.terminal and self.on_terminal is not None:
+                        self.on_terminal(job)
+                    await queue.put(update)
+                    if update.terminal:
+                        return
+                # 状态变化（如 queued → running）后重新从短间隔开始，其余情况逐步放慢
+                interval = self.min_interval if status_changed else min(interval * self.backoff, self.max_interval)
+                await asyncio.sleep(interval)
+        except Exception as e:
+            await queue.put(e)
+
+    async def _new_events(self, job_id: str, last_event_id: Optional[str]) -> List:
+        """拉取 last_event_id 之后的新事件（接口按时间倒序返回），按时间升序返回"""
+        events = []
+        after = None
+        while True:
+            params = {"limit": self.event_page_size}
+            if after is not None:
+                params["after"] = after
+            page = await self.client.fine_tuning.jobs.list_events(job_id, **params)
+            self.requests_sent += 1
+            for event in page.data:
+                if event.id == last_event_id:
+                    return events[::-1]
+                events.append(event)
+            if not page.data or not page.has_more:
+                return events[::-1]
+            after = page.data[-1].id
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+模型注册表：首次使用时才加载，进程内共享同一个实例，支持后台预热
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+class ModelRegistry:
+    """按名称登记模型加载函数，get() 时加载并缓存
+
+    只上传文件或轮询作业的运行永远不会触发模型加载；
+    同一进程中的多个 Pipeline/Processor 共享一份模型，不重复占用内存。
+    每个名称单独加锁，多个线程同时 get 同一个模型时只加载一次。
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """登记加载函数；已登记的名称保持不变"""
+        with self._lock:
+            self._loaders.setdefault(name, loader)
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """返回模型实例，未加载时在当前线程加载"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            if name not in self._instances:
+                self._instances[name] = self._loaders[name]()
+            return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm_up(self, name: str) -> Future:
+        """在后台线程中提前加载，返回完成时带有模型实例的 Future"""
+        future: Future = Future()
+
+        def load():
+            try:
+                future.set_result(self.get(name))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=load, name=f"warm-up-{name}", daemon=True).start()
+        return future
+
+    def unload(self, name: str):
+        """释放模型（下次 get 时重新加载）"""
+        with self._locks[name]:
+            self._instances.pop(name, None)
+
+
+# 进程级默认注册表
+registry = ModelRegistry()
+
+
+def whisper_model_key(model_name: str, device: Optional[str] = None) -> str:
+    """登记Whisper模型，返回注册表中的名称"""
+    key = f"whisper:{model_name}:{device or 'auto'}"
+
+    def load():
+        import whisper
+        return whisper.load_model(model_name, device=device)
+
+    registry.register(key, load)
+    return key
+
+
+def step_audio_key(model_path: str, quantize_int8: bool = False) -> str:
+    """登记Step-Audio模型和tokenizer，返回注册表中的名称；实例为 (model, tokenizer, device)
+
+    quantize_int8=True 时登记CPU上float32加载后做动态int8量化（nn.Linear）的版本，
+    与非量化版本分开缓存。
+    """
+    key = f"step-audio:{model_path}" + (":int8" if quantize_int8 else "")
+
+    def load():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if quantize_int8:
+            device, dtype = torch.device("cpu"), torch.float32
+        else:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            dtype = torch.bfloat16 if torch.cuda.is_available() else torch.float32
+        model = AutoModel.from_pretrained(
+            model_path,
+            trust_remote_code=True,
+            torch_dtype=dtype
+        ).to(device)
+        tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        model.eval()
+        if quantize_int8:
+            model = quantize_dynamic_int8(model)
+        return model, tokenizer, device
+
+    registry.register(key, load)
+    return key
+
+
+def step_audio_config_key(model_path: str) -> str:
+    """登记Step-Audio的模型配置（只读config.json，不加载权重），返回注册表中的名称"""
+    key = f"step-audio-config:{model_path}"
+
+    def load():
+        from transformers import AutoConfig
+        return AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+
+    registry.register(key, load)
+    return key
+
+
+def quantize_dynamic_int8(model):
+    """把模型中的 nn.Linear 替换为动态int8量化版本（权重int8，激活按批动态量化），只用于CPU推理"""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def causal_lm_key(model_path: str) -> str:
+    """登记因果语言模型（如投机解码的草稿模型），返回注册表中的名称；实例为模型本身"""
+    key = f"causal-lm:{model_path}"
+
+    def load():
+        import torch
+        from transformers import AutoModelForCausalLM
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        dtype = torch.bfloat16 if torch.cuda.is_available() else torch.float32
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype=dtype).to(device)
+        return model.eval()
+
+    registry.register(key, load)
+    return key
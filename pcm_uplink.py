@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+PCM音频上行：int16 PCM按精确时长切块，逐块base64编码进预分配的消息缓冲区后按单调时钟定时发送
+"""
+
+import asyncio
+import binascii
+import time
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+from realtime_client import RealtimeClient
+
+SAMPLE_WIDTH = 2  # pcm16
+
+PCMBuffer = Union[bytes, bytearray, memoryview, "numpy.ndarray"]
+
+
+class PacingStats(NamedTuple):
+    """一次定时发送的统计，时间单位为秒
+
+    jitter 是每块实际入队时间相对计划时间的延迟；延迟超过一块的时长（按倍速折算）时，
+    以同样速度消费的接收端在这块到达前已经没有音频可用，计为一次 underrun。
+    """
+    chunks: int
+    audio_seconds: float
+    elapsed: float
+    speed: Optional[float]
+    mean_jitter: float
+    max_jitter: float
+    underruns: int
+
+    @property
+    def realtime_factor(self) -> float:
+        """发送速度是实时的多少倍"""
+        return self.audio_seconds / self.elapsed if self.elapsed else float("inf")
+
+
+class PCMUplink:
+    """把 pcm16 音频切成 chunk_ms 时长的块，组装成 input_audio_buffer.append 消息
+
+    切块通过 memoryview 完成，不复制原始音频；块边界总是整数个采样（200ms@16kHz 为 3200 个采样、6400 字节），
+    每块的base64（8536 字节）恰好是完整的4字节组。消息JSON直接写进预分配的字节缓冲区，以文本帧发送，
+    不经过 str、json.dumps 和再次UTF-8编码。两个缓冲区轮换：一个等待写入连接时可以编码下一块。
+    标准库没有编码进已有缓冲区的base64接口，b2a_base64 每块仍会产生一个临时bytes（8.5KB）再复制进缓冲区；
+    用numpy按位运算直接写进缓冲区实测慢约3倍，因此保留这一次复制。
+    """
+
+    PREFIX = b'{"type":"input_audio_buffer.append","event_id":"'
+    MIDDLE = b'","audio":"'
+    SUFFIX = b'"}'
+    MAX_EVENT_ID = 128
+
+    def __init__(self, sample_rate: int = 16000, chunk_ms: int = 200, channels: int = 1):
+        if sample_rate * chunk_ms % 1000:
+            raise ValueError(f"{chunk_ms}ms 在 {sample_rate}Hz 下不是整数个采样")
+        self.sample_rate = sample_rate
+        self.chunk_ms = chunk_ms
+        self.channels = channels
+        self.samples_per_chunk = sample_rate * chunk_ms // 1000
+        self.chunk_bytes = self.samples_per_chunk * SAMPLE_WIDTH * channels
+        frame_size = (len(self.PREFIX) + self.MAX_EVENT_ID + len(self.MIDDLE)
+                      + 4 * -(-self.chunk_bytes // 3) + len(self.SUFFIX))
+        self._frames = [bytearray(frame_size), bytearray(frame_size)]
+        self._pending: List[Optional[asyncio.Future]] = [None, None]
+        self._next = 0
+
+    def chunks(self, pcm: PCMBuffer) -> Iterator[memoryview]:
+        """按块大小切分（最后一块可能较短），返回原始音频上的 memoryview"""
+        view = memoryview(pcm).cast("B")
+        frame_bytes = SAMPLE_WIDTH * self.channels
+        if len(view) % frame_bytes:
+            raise ValueError(f"{self.channels} 声道 pcm16 音频的字节数必须是 {frame_bytes} 的整数倍")
+        for start in range(0, len(view), self.chunk_bytes):
+            yield view[start:start + self.chunk_bytes]
+
+    def chunk_seconds(self, chunk: memoryview) -> float:
+        return len(chunk) / SAMPLE_WIDTH / self.sample_rate / self.channels
+
+    def encode(self, chunk: memoryview, event_id: str, frame: Optional[bytearray] = None) -> memoryview:
+        """把一块音频编码成完整的 input_audio_buffer.append 消息，返回缓冲区中有效部分的视图"""
+        frame = self._frames[0] if frame is None else frame
+        event_id = event_id.encode("ascii")
+        if len(event_id) > self.MAX_EVENT_ID:
+            raise ValueError(f"event_id 超过 {self.MAX_EVENT_ID} 字节")
+        position = 0
+        for part in (self.PREFIX, event_id, self.MIDDLE, binascii.b2a_base64(chunk, newline=False), self.SUFFIX):
+            frame[position:position + len(part)] = part
+            position += len(part)
+        return memoryview(frame)[:position]
+
+    async def send_chunk(self, client: RealtimeClient, chunk: memoryview, event_id: str):
+        """编码并放入发送队列；缓冲区上一次的内容写入连接之后才会被复用"""
+        index = self._next
+        self._next ^= 1
+        if self._pending[index] is not None:
+            await self._pending[index]
+        self._pending[index] = await client.send_frame(self.encode(chunk, event_id, self._frames[index]))
+
+    async def stream(self, client: RealtimeClient, pcm: PCMBuffer, event_prefix: str = "audio_chunk",
+                     speed: Optional[float] = 1.0) -> PacingStats:
+        """按音频时长定时发送整段音频，等全部写入连接后返回统计
+
+        第 i 块的计划发送时间是 开始时间 + 前 i 块的音频时长 / speed，按 time.monotonic() 计算，
+        发送本身的耗时和 sleep 的误差不会逐块累积；落后时立即发送下一块追上计划。
+        speed=1 为实时（麦克风速率），speed=N 为N倍速回放，speed=None 不限速。
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed 必须为正数，不限速请传 None")
+        start = time.monotonic()
+        offset = 0.0
+        count = 0
+        jitters = []
+        underruns = 0
+        for chunk in self.chunks(pcm):
+            duration = self.chunk_seconds(chunk)
+            if speed is not None:
+                deadline = start + offset / speed
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.send_chunk(client, chunk, f"{event_prefix}_{count}")
+            if speed is not None:
+                jitter = time.monotonic() - deadline
+                jitters.append(jitter)
+                if jitter > duration / speed:
+                    underruns += 1
+            offset += duration
+            count += 1
+        await self.flush()
+        return PacingStats(
+            chunks=count,
+            audio_seconds=offset,
+            elapsed=time.monotonic() - start,
+            speed=speed,
+            mean_jitter=sum(jitters) / len(jitters) if jitters else 0.0,
+            max_jitter=max(jitters, default=0.0),
+            underruns=underruns,
+        )
+
+    async def flush(self):
+        """等待已放入队列的音频块全部写入连接"""
+        await asyncio.gather(*(pending for pending in self._pending if pending is not None))
+        self._pending = [None, None]
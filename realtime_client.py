@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Step Realtime API 异步客户端：一条持久WebSocket连接上的事件分发、有界发送队列、按 event_id 等待的请求和按事件完成的等待
+"""
+
+import asyncio
+import inspect
+import json
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Union
+
+import websockets
+
+WS_URL = "wss://api.stepfun.com/v1/realtime"
+DEFAULT_MODEL = "step-audio-2-mini"
+# 一次回复的文本和语音转录都已完整
+TERMINAL_EVENTS = ("response.text.done", "response.audio_transcript.done")
+
+Handler = Callable[["RealtimeEvent"], Union[None, Awaitable[None]]]
+
+
+class RealtimeError(Exception):
+    """服务端对某个客户端事件返回的 error 事件"""
+
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(error.get("message", "Unknown error"))
+        self.error = error
+
+
+class RealtimeEvent(NamedTuple):
+    """服务端事件：type 为事件类型，data 为完整的JSON对象"""
+    type: str
+    data: Dict[str, Any]
+
+    @property
+    def response_id(self) -> Optional[str]:
+        return self.data.get("response_id") or self.data.get("response", {}).get("id")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+
+class RealtimeResponse:
+    """一次 response 的事件累积：文本、语音转录，response.done 后 done 完成"""
+
+    def __init__(self, response_id: str):
+        self.response_id = response_id
+        self.text = ""
+        self.transcript = ""
+        self.events: List[RealtimeEvent] = []
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def add(self, event: RealtimeEvent):
+        self.events.append(event)
+        if event.type == "response.text.done":
+            self.text = event.get("content", event.get("text", ""))
+        elif event.type == "response.audio_transcript.done":
+            self.transcript = event.get("transcript", "")
+        elif event.type == "response.done" and not self.done.done():
+            self.done.set_result(self)
+
+    def fail(self, exc: Exception):
+        """连接断开时结束 done；调用方可能已超时不再等待，标记异常已取回，避免 never retrieved 警告"""
+        if not self.done.done():
+            self.done.set_exception(exc)
+            self.done.exception()
+
+
+class EventWaiter:
+    """等待同一个 response 的一组终止事件，由 RealtimeClient.expect() 创建
+
+    未指定 response_id 时绑定到登记之后第一个到达的回复。event_types 中的事件都到达后完成；
+    response.done 先到达时（回复只有其中一部分内容）也完成，events 中是实际收到的事件。
+    只有针对 event_ids 中的触发事件、或指明本回复 response_id 的 error 事件使等待抛出 RealtimeError；
+    同一连接上其他请求的错误交给各自的 request() 处理。
+    """
+
+    def __init__(self, event_types: Iterable[str], response_id: Optional[str] = None,
+                 event_ids: Iterable[str] = ()):
+        self.event_types = set(event_types)
+        self.response_id = response_id
+        self.event_ids = set(event_ids)
+        self.events: Dict[str, RealtimeEvent] = {}
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def feed(self, event: RealtimeEvent):
+        if self.future.done():
+            return
+        if event.type == "error":
+            error = event.get("error", {})
+            response_id = event.get("response_id") or error.get("response_id")
+            if error.get("event_id") in self.event_ids or (response_id and response_id == self.response_id):
+                self.future.set_exception(RealtimeError(error))
+            return
+        response_id = event.response_id
+        if response_id is None or event.type not in self.event_types | {"response.created", "response.done"}:
+            return
+        if self.response_id is None:
+            self.response_id = response_id
+        elif response_id != self.response_id:
+            return
+        if event.type in self.event_types:
+            self.events[event.type] = event
+        if self.event_types <= self.events.keys() or event.type == "response.done":
+            self.future.set_result(self.events)
+
+    async def wait(self, timeout: Optional[float] = None) -> Dict[str, RealtimeEvent]:
+        """等到完成，返回 事件类型→事件；timeout 秒内没有完成时取消等待并抛出 asyncio.TimeoutError，
+        已收到的事件仍在 events 中"""
+        return await asyncio.wait_for(self.future, timeout)
+
+
+class RealtimeClient:
+    """Step Realtime API 的持久连接客户端
+
+    一条WebSocket连接由读、写两个后台任务驱动：
+    - 读任务把每个服务端事件交给 handlers 表中该类型（以及 "*"）的处理函数，异步处理函数作为单独的任务执行；
+    - 写任务从有界队列中取出事件发送，队列满时 send() 等待，形成反压。
+    request() 发送带 event_id 的事件并返回等待其回复事件的 Future：同类回复按发送顺序匹配，
+    服务端针对该 event_id 的 error 事件使 Future 抛出 RealtimeError。
+    多个并发的 create_response() 共用同一条连接；服务端同一时间只处理一个 response 时
+    max_active_responses 应为 1，之后的请求在客户端排队。
+    由服务端VAD等触发、没有对应请求的回复用 expect() 在触发前登记等待。
+    """
+
+    def __init__(self, api_key: str, url: str = WS_URL, model: str = DEFAULT_MODEL,
+                 send_queue_size: int = 64, max_active_responses: int = 1):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.websocket = None
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.session: Dict[str, Any] = {}
+        self._send_queue: Optional[asyncio.Queue] = None
+        self._send_queue_size = send_queue_size
+        self._response_slots = asyncio.Semaphore(max_active_responses)
+        self._item_lock = asyncio.Lock()
+        self._requests: Dict[str, asyncio.Future] = {}
+        self._awaiting: Dict[str, Deque[str]] = defaultdict(deque)
+        self._responses: Dict[str, RealtimeResponse] = {}
+        self._waiters: List[EventWaiter] = []
+        self._tasks: List[asyncio.Task] = []
+        self._handler_tasks = set()
+
+    def on(self, event_type: str, handler: Optional[Handler] = None):
+        """登记事件处理函数，event_type 为 "*" 时接收所有事件；不传 handler 时作为装饰器使用"""
+        if handler is None:
+            return lambda fn: self.on(event_type, fn) or fn
+        self.handlers[event_type].append(handler)
+
+    async def connect(self):
+        self.websocket = await websockets.connect(
+            f"{self.url}?model={self.model}",
+            additional_headers={"Authorization": f"Bearer {self.api_key}"}
+        )
+        self._send_queue = asyncio.Queue(maxsize=self._send_queue_size)
+        self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._write_loop())]
+        return self
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.websocket is not None:
+            await self.websocket.close()
+        self._fail_pending(ConnectionError("连接已关闭"))
+        self._drain_send_queue(ConnectionError("连接已关闭"))
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._tasks) and not any(task.done() for task in self._tasks)
+
+    async def ping(self, timeout: float = 5) -> bool:
+        """健康检查：连接正常且在 timeout 秒内收到pong"""
+        if not self.connected:
+            return False
+        try:
+            await asyncio.wait_for(await self.websocket.ping(), timeout)
+            return True
+        except (asyncio.TimeoutError, websockets.ConnectionClosed):
+            return False
+
+    async def send(self, event: Dict[str, Any]) -> str:
+        """放入发送队列（队列满时等待），返回事件的 event_id"""
+        event.setdefault("event_id", f"evt_{uuid.uuid4().hex}")
+        await self._send_queue.put(event)
+        return event["event_id"]
+
+    async def send_frame(self, payload: Union[bytes, bytearray, memoryview]) -> asyncio.Future:
+        """把已编码为UTF-8 JSON的消息放入发送队列，以文本帧原样发送
+
+        返回消息写入连接后完成的 Future；在它完成之前 payload 所在的缓冲区不能被改写。
+        连接已关闭时立即抛出 ConnectionError；之后断开时 Future 以 ConnectionError 结束。
+        """
+        if not self.connected:
+            raise ConnectionError("连接已关闭")
+        sent = asyncio.get_running_loop().create_future()
+        await self._send_queue.put((payload, sent))
+        if not self.connected:
+            # 等待入队期间连接断开：队列已被清空过，这一条不会再有人处理
+            self._drain_send_queue(ConnectionError("连接已断开"))
+        return sent
+
+    async def request(self, event: Dict[str, Any], reply_type: str) -> Any:
+        """发送事件并等待对应的 reply_type 回复，返回回复事件（response.create 返回 RealtimeResponse）"""
+        return await (await self._send_expecting(event, reply_type))
+
+    async def _send_expecting(self, event: Dict[str, Any], reply_type: str) -> asyncio.Future:
+        """登记按顺序匹配的回复后发送事件，返回回复到达时完成的 Future"""
+        event_id = event.setdefault("event_id", f"evt_{uuid.uuid4().hex}")
+        future = asyncio.get_running_loop().create_future()
+        self._requests[event_id] = future
+        self._awaiting[reply_type].append(event_id)
+        future.add_done_callback(lambda _: self._requests.pop(event_id, None))
+        try:
+            await self.send(event)
+        except BaseException:
+            # 没有发出的请求不会有回复，不能占住按顺序匹配的位置
+            self._awaiting[reply_type].remove(event_id)
+            future.cancel()
+            raise
+        return future
+
+    def expect(self, *event_types: str, response_id: Optional[str] = None,
+               event_ids: Iterable[str] = ()) -> EventWaiter:
+        """登记等待一个回复的终止事件（默认 TERMINAL_EVENTS），应在发送触发回复的事件之前调用
+
+        event_ids 为触发回复的事件的 event_id，服务端拒绝这些事件时等待立即失败。
+        """
+        waiter = EventWaiter(event_types or TERMINAL_EVENTS, response_id, event_ids)
+        self._waiters.append(waiter)
+        waiter.future.add_done_callback(lambda _: self._waiters.remove(waiter))
+        return waiter
+
+    async def update_session(self, session: Dict[str, Any]) -> RealtimeEvent:
+        """发送 session.update，等待 session.updated"""
+        updated = await self.request({"type": "session.update", "session": session}, "session.updated")
+        self.session = updated.get("session", session)
+        return updated
+
+    async def create_response(self, text: str, **response: Any) -> RealtimeResponse:
+        """发送一条用户文本消息并请求回复，等待 response.done 后返回累积的回复"""
+        event = {"type": "response.create"}
+        if response:
+            event["response"] = response
+        async with self._response_slots:
+            # 消息和 response.create 必须相邻入队，否则并发时回复可能针对别的消息
+            async with self._item_lock:
+                await self.send({
+                    "type": "conversation.item.create",
+                    "item": {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+                })
+                created = await self._send_expecting(event, "response.created")
+            result: RealtimeResponse = await created
+            return await result.done
+
+    async def _write_loop(self):
+        while True:
+            event = await self._send_queue.get()
+            if isinstance(event, tuple):
+                payload, sent = event
+                try:
+                    await self.websocket.send(payload, text=True)
+                except BaseException:
+                    if not sent.done():
+                        sent.set_exception(ConnectionError("连接已断开"))
+                    raise
+                if not sent.done():
+                    sent.set_result(None)
+            else:
+                await self.websocket.send(json.dumps(event, ensure_ascii=False))
+
+    async def _read_loop(self):
+        try:
+            async for message in self.websocket:
+                try:
+                    data = json.loads(message)
+                except ValueError as e:
+                    print(f"❌ 解析消息失败: {e}")
+                    continue
+                self._dispatch(RealtimeEvent(data.get("type", "unknown"), data))
+        finally:
+            self._fail_pending(ConnectionError("连接已断开"))
+
+    def _dispatch(self, event: RealtimeEvent):
+        reply = event
+        if event.type == "response.created":
+            reply = self._responses[event.response_id] = RealtimeResponse(event.response_id)
+        if event.type == "error":
+            self._reject(event)
+        elif self._awaiting[event.type]:
+            future = self._requests.get(self._awaiting[event.type].popleft())
+            if future is not None and not future.done():
+                future.set_result(reply)
+
+        for waiter in list(self._waiters):
+            waiter.feed(event)
+
+        response = self._responses.get(event.response_id) if event.response_id else None
+        if response is not None:
+            response.add(event)
+            if event.type == "response.done":
+                del self._responses[event.response_id]
+
+        for handler in self.handlers.get(event.type, []) + self.handlers.get("*", []):
+            try:
+                result = handler(event)
+            except Exception as e:
+                print(f"❌ 处理事件 {event.type} 失败: {e}")
+                continue
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._handler_tasks.add(task)
+                task.add_done_callback(self._handler_tasks.discard)
+
+    def _reject(self, event: RealtimeEvent):
+        error = event.get("error", {})
+        event_id = error.get("event_id")
+        future = self._requests.get(event_id) if event_id else None
+        if future is None:
+            return
+        for pending in self._awaiting.values():
+            if event_id in pending:
+                pending.remove(event_id)
+        if not future.done():
+            future.set_exception(RealtimeError(error))
+
+    def _fail_pending(self, exc: Exception):
+        for future in list(self._requests.values()):
+            if not future.done():
+                future.set_exception(exc)
+        for response in self._responses.values():
+            response.fail(exc)
+        for waiter in list(self._waiters):
+            if not waiter.future.done():
+                waiter.future.set_exception(exc)
+        self._requests.clear()
+        self._awaiting.clear()
+        self._responses.clear()
+        self._drain_send_queue(exc)
+
+    def _drain_send_queue(self, exc: Exception):
+        """丢弃还没有写入连接的消息，send_frame() 的 Future 以 exc 结束"""
+        if self._send_queue is None:
+            return
+        while not self._send_queue.empty():
+            event = self._send_queue.get_nowait()
+            if isinstance(event, tuple) and not event[1].done():
+                event[1].set_exception(exc)
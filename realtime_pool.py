@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Step Realtime 会话池：按 session.update 配置复用已连接、已配置的会话
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from realtime_client import DEFAULT_MODEL, WS_URL, RealtimeClient
+
+
+def config_key(session: Dict[str, Any]) -> str:
+    """session.update 配置的哈希：键顺序不同的同一配置得到同一个值"""
+    payload = json.dumps(session, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class RealtimeSessionPool:
+    """预先连接并发送过 session.update 的 RealtimeClient 池，按配置哈希分组
+
+    acquire(config) 优先取该配置下最近归还的空闲会话，只做一次出队，不经过网络；
+    没有可用会话时新建连接并等待 session.updated。归还时连接已断开的会话和上下文中出错的会话直接丢弃。
+    后台维护任务每 health_interval 秒：关闭空闲超过 idle_timeout 的会话（prewarm() 指定数量以内的不算），
+    对其余空闲会话发ping，失败的关闭；每个配置的空闲会话少于预热数量时重新连接补足。
+    会话复用时对话上下文保留，需要隔离上下文的调用方不应共用配置。
+    """
+
+    def __init__(self, api_key: str, url: str = WS_URL, model: str = DEFAULT_MODEL,
+                 max_idle_per_config: int = 4, idle_timeout: float = 300, health_interval: float = 30,
+                 ping_timeout: float = 5, on_connect: Optional[Callable[[RealtimeClient], None]] = None,
+                 **client_options: Any):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.max_idle_per_config = max_idle_per_config
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.on_connect = on_connect
+        self.client_options = client_options
+        self.configs: Dict[str, Dict[str, Any]] = {}
+        self.warm_targets: Dict[str, int] = {}
+        self.stats = {"hits": 0, "connects": 0, "discarded": 0, "evicted": 0, "reconnects": 0}
+        self._idle: Dict[str, Deque[Tuple[RealtimeClient, float]]] = defaultdict(deque)
+        self._maintenance: Optional[asyncio.Task] = None
+        self._closing = set()
+
+    async def prewarm(self, session: Dict[str, Any], count: int = 1):
+        """为配置建立 count 个空闲会话，并在维护时保持这个数量"""
+        key = config_key(session)
+        self.configs[key] = session
+        self.warm_targets[key] = max(self.warm_targets.get(key, 0), count)
+        await self._fill(key)
+        self._start_maintenance()
+
+    @asynccontextmanager
+    async def acquire(self, session: Dict[str, Any]) -> AsyncIterator[RealtimeClient]:
+        """取出一个该配置的会话，正常退出上下文时归还
+
+        上下文中抛出异常（包括超时和取消）时会话可能还有进行中的回复，其事件会串到下一个使用者，
+        因此关闭丢弃而不归还。
+        """
+        key = config_key(session)
+        self.configs.setdefault(key, session)
+        client = self._take_idle(key) or await self._connect(key)
+        try:
+            yield client
+        except BaseException:
+            self.stats["discarded"] += 1
+            self._close_later(client)
+            raise
+        self._release(key, client)
+
+    async def close(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+        clients = [client for idle in self._idle.values() for client, _ in idle]
+        self._idle.clear()
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def idle_count(self, session: Dict[str, Any]) -> int:
+        return len(self._idle.get(config_key(session), ()))
+
+    def _take_idle(self, key: str) -> Optional[RealtimeClient]:
+        idle = self._idle.get(key)
+        while idle:
+            client, _ = idle.pop()
+            if client.connected:
+                self.stats["hits"] += 1
+                return client
+            self.stats["discarded"] += 1
+            self._close_later(client)
+        return None
+
+    async def _connect(self, key: str) -> RealtimeClient:
+        client = RealtimeClient(self.api_key, url=self.url, model=self.model, **self.client_options)
+        if self.on_connect is not None:
+            self.on_connect(client)
+        await client.connect()
+        try:
+            await client.update_session(self.configs[key])
+        except BaseException:
+            await client.close()
+            raise
+        self.stats["connects"] += 1
+        return client
+
+    def _release(self, key: str, client: RealtimeClient):
+        idle = self._idle[key]
+        limit = max(self.max_idle_per_config, self.warm_targets.get(key, 0))
+        if not client.connected or len(idle) >= limit:
+            self.stats["discarded"] += 1
+            self._close_later(client)
+            return
+        idle.append((client, time.monotonic()))
+
+    def _close_later(self, client: RealtimeClient):
+        task = asyncio.ensure_future(client.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _fill(self, key: str):
+        missing = self.warm_targets.get(key, 0) - len(self._idle[key])
+        if missing <= 0:
+            return
+        clients = await asyncio.gather(*(self._connect(key) for _ in range(missing)), return_exceptions=True)
+        for client in clients:
+            if isinstance(client, RealtimeClient):
+                # 连接期间可能有会话被归还，空闲数不超过上限
+                self._release(key, client)
+            else:
+                print(f"❌ 会话预热失败: {client}")
+
+    def _start_maintenance(self):
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    async def check_health(self):
+        """淘汰超时和ping失败的空闲会话，并按预热数量重新连接"""
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            # 最近使用的前 warm_targets[key] 个会话不因空闲超时淘汰，只做ping检查
+            entries = sorted(idle, key=lambda entry: entry[1], reverse=True)
+            keep_warm = self.warm_targets.get(key, 0)
+            expired = [entry for i, entry in enumerate(entries)
+                       if i >= keep_warm and now - entry[1] >= self.idle_timeout]
+            for entry in expired:
+                idle.remove(entry)
+                self.stats["evicted"] += 1
+                self._close_later(entry[0])
+
+            # ping期间会话留在空闲队列里，并发的 acquire 照常取用，不会因队列暂时为空而新建连接
+            checked = [entry for entry in entries if entry not in expired]
+            healthy = await asyncio.gather(*(client.ping(self.ping_timeout) for client, _ in checked))
+            for entry, ok in zip(checked, healthy):
+                # 已被取走的会话归使用者处理：断开的会话在归还时丢弃
+                if not ok and entry in idle:
+                    idle.remove(entry)
+                    self.stats["evicted"] += 1
+                    self._close_later(entry[0])
+            before = len(idle)
+            await self._fill(key)
+            self.stats["reconnects"] += len(idle) - before
+
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Supabase音频记录分页读取：按 (created_at, id) 键集分页、只取需要的列、预取下一页
+"""
+
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+# Pipeline只用到 id 和 audio_url；created_at 作为分页游标
+RECORD_COLUMNS = ("id", "audio_url", "created_at")
+
+
+class KeysetPageReader:
+    """以键集分页方式逐页读取某个用户的记录
+
+    相比 OFFSET 分页，键集分页每页的查询代价与页码无关，且翻页期间新增的记录不会导致重复或遗漏。
+    处理当前页的同时后台请求下一页，内存占用约为两页记录，与总行数无关。
+    """
+
+    def __init__(self, client, table: str = "audio_records",
+                 columns: Sequence[str] = RECORD_COLUMNS, page_size: int = 500):
+        self.client = client
+        self.table = table
+        self.columns = tuple(columns)
+        self.page_size = page_size
+        self.pages_fetched = 0
+
+    async def iter_records(self, user_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """按 (created_at, id) 升序逐条产出记录，user_id 为空时读取整张表"""
+        next_page = asyncio.create_task(asyncio.to_thread(self.fetch_page, user_id, None))
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                if len(page) == self.page_size:
+                    cursor = (page[-1]["created_at"], page[-1]["id"])
+                    next_page = asyncio.create_task(asyncio.to_thread(self.fetch_page, user_id, cursor))
+                for record in page:
+                    yield record
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    def fetch_page(self, user_id: Optional[str], cursor: Optional[Tuple[str, str]]) -> List[Dict]:
+        """读取游标之后的一页（同步，在工作线程中执行）"""
+        query = self.client.table(self.table).select(",".join(self.columns))
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        if cursor is not None:
+            created_at, record_id = cursor
+            # 时间戳含 ':' '.' '+'，按PostgREST语法加双引号
+            query = query.or_(
+                f'created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt."{record_id}")'
+            )
+        response = query.order("created_at").order("id").limit(self.page_size).execute()
+        self.pages_fetched += 1
+        return response.data
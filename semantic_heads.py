@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+语义分类头：在池化后的 encode_audio 特征上做情绪/紧急程度/话题分类，不额外跑模型
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import torch
+
+EMOTIONS = ("平静", "开心", "焦虑", "兴奋", "疲惫")
+URGENCY_LEVELS = ("普通", "重要", "紧急")
+# 与客户端 CategoryBadge 和 PROMPT_OPTIMIZATION_README 中的分类一致
+TOPIC_CATEGORIES = ("daily_life", "work_meeting", "learning_notes", "personal_thoughts")
+
+HEADS: Dict[str, Sequence[str]] = {
+    "emotion": EMOTIONS,
+    "urgency": URGENCY_LEVELS,
+    "topic_category": TOPIC_CATEGORIES,
+}
+
+
+def masked_mean(features: torch.Tensor, mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """[batch, frames, dim] 按有效帧求均值 → [batch, dim]"""
+    if mask is None:
+        return features.mean(dim=1)
+    mask = mask.to(features.dtype).unsqueeze(-1)
+    return (features * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+
+
+class SemanticHeads(torch.nn.Module):
+    """多个线性分类头合并为一个 [dim, 总类别数] 的矩阵，整批一次矩阵乘法得到所有任务的结果
+
+    池化特征先按训练集的均值和标准差标准化（fit 时统计，随 state_dict 保存）：
+    编码器特征各维的尺度差别很大，直接做线性分类难以收敛。
+    """
+
+    def __init__(self, dim: int, heads: Dict[str, Sequence[str]] = HEADS):
+        super().__init__()
+        self.heads = {task: tuple(labels) for task, labels in heads.items()}
+        self.linear = torch.nn.Linear(dim, sum(len(labels) for labels in self.heads.values()))
+        self.register_buffer("feature_mean", torch.zeros(dim))
+        self.register_buffer("feature_std", torch.ones(dim))
+
+    def forward(self, pooled: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """[batch, dim] → {任务: [batch, 类别数] logits}"""
+        pooled = (pooled.to(self.linear.weight.dtype) - self.feature_mean) / self.feature_std
+        logits = self.linear(pooled)
+        return dict(zip(self.heads, logits.split([len(labels) for labels in self.heads.values()], dim=-1)))
+
+    @torch.inference_mode()
+    def predict(self, pooled: torch.Tensor) -> List[Dict[str, object]]:
+        """返回每条音频的标签及其概率，如 {"emotion": "平静", "emotion_score": 0.82, ...}"""
+        results: List[Dict[str, object]] = [{} for _ in range(pooled.shape[0])]
+        for task, logits in self.forward(pooled).items():
+            scores, indices = logits.softmax(dim=-1).max(dim=-1)
+            for result, index, score in zip(results, indices.tolist(), scores.tolist()):
+                result[task] = self.heads[task][index]
+                result[f"{task}_score"] = score
+        return results
+
+    def fit(self, pooled: torch.Tensor, targets: Dict[str, torch.Tensor],
+            epochs: int = 200, lr: float = 0.01) -> float:
+        """用已标注的池化特征训练分类头（targets 为各任务的类别下标，-100 表示该条未标注），返回最终损失"""
+        self.feature_mean.copy_(pooled.mean(dim=0))
+        self.feature_std.copy_(pooled.std(dim=0).nan_to_num(1.0).clamp(min=1e-6))
+        optimizer = torch.optim.Adam(self.parameters(), lr=lr)
+        loss = torch.zeros(())
+        for _ in range(epochs):
+            optimizer.zero_grad()
+            logits = self.forward(pooled)
+            loss = sum(torch.nn.functional.cross_entropy(logits[task], target) for task, target in targets.items())
+            loss.backward()
+            optimizer.step()
+        return loss.item()
+
+    def save(self, path: str):
+        torch.save({"heads": self.heads, "state_dict": self.state_dict()}, path)
+
+    @classmethod
+    def load(cls, path: str, map_location=None) -> "SemanticHeads":
+        checkpoint = torch.load(path, map_location=map_location)
+        dim = checkpoint["state_dict"]["linear.weight"].shape[1]
+        heads = cls(dim, checkpoint["heads"])
+        heads.load_state_dict(checkpoint["state_dict"])
+        return heads.eval()
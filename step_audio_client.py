@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Step-Audio HTTP API客户端：长连接池、超时和带抖动的重试，批量请求并发流水线
+"""
+
+import asyncio
+import random
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+
+# 部署的Step-Audio API端点
+DEFAULT_ENDPOINT = "https://your-step-audio-api.com/process"
+# 可以重试的HTTP状态码：限流和网关/服务暂时不可用
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头为等待秒数：支持秒数和HTTP日期两种格式，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    # HTTP日期总是GMT；没有时区的日期也按UTC计算
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - time.time())
+
+
+class StepAudioAPIClient:
+    """复用同一个 aiohttp.ClientSession 的API客户端
+
+    连接池按主机限制并发连接数（limit_per_host），连接保持keep-alive，
+    后续请求不再重复TCP+TLS握手。连接失败、超时和 RETRY_STATUSES 按指数退避重试，
+    等待时间取 [0, min(max_backoff, backoff * 2^n)] 内的随机值（full jitter），
+    服务端返回 Retry-After 时至少等待该时长。
+    session 绑定创建时的事件循环，在新的事件循环中使用时自动重建。
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, limit: int = 100, limit_per_host: int = 16,
+                 total_timeout: float = 120, connect_timeout: float = 10, max_retries: int = 3,
+                 backoff: float = 0.5, max_backoff: float = 8):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def process(self, audio_url: str) -> Dict[str, Any]:
+        """处理单个音频URL，返回API的JSON结果；不可重试的错误抛出 aiohttp.ClientResponseError"""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self.session.post(self.endpoint, json={"audio_url": audio_url}) as response:
+                    if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                        response.raise_for_status()
+                        return await response.json()
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            self.retries += 1
+            await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+    async def process_many(self, audio_urls: Sequence[str],
+                           return_exceptions: bool = False) -> List[Any]:
+        """并发处理多个音频URL，结果与输入一一对应
+
+        同时在途的请求数等于每主机连接数上限，连接池里的连接被流水线式地复用。
+        return_exceptions=True 时失败的请求以异常对象的形式放在结果中，不影响其他请求。
+        """
+        slots = asyncio.Semaphore(self.limit_per_host)
+
+        async def process_one(audio_url: str):
+            async with slots:
+                return await self.process(audio_url)
+
+        return await asyncio.gather(*(process_one(url) for url in audio_urls),
+                                    return_exceptions=return_exceptions)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
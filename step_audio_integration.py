@@ -3,32 +3,113 @@
 Step-Audio-2-mini 音频处理集成方案
 """
 
+import copy
+import hashlib
 import torch
-from transformers import AutoModel, AutoTokenizer
 import numpy as np
-import soundfile as sf
 import asyncio
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, List, NamedTuple, Sequence, Tuple, Union
+
+from audio_frontend import decode_audio, iter_windows, prepare_batch
+from constrained_decoding import DecodeResult, SummaryConstraint, constrained_decode
+from model_registry import causal_lm_key, registry, step_audio_config_key, step_audio_key
+from semantic_heads import HEADS, SemanticHeads, masked_mean
+from transcription_cache import TranscriptionCache
+from vad import SilenceTrimmer, TrimResult
+
+# 总结prompt的固定前缀：指令放在转录文本之前，才能预填充一次后复用KV缓存
+SUMMARY_PREFIX = "请用5-10个中文字总结以下内容的核心要点：\n<|audio_start|>\n"
+
+def local_revision(model_path: str) -> Optional[str]:
+    """本地checkpoint目录的版本：权重和配置文件的名字、大小、修改时间的哈希；不是本地目录时返回None"""
+    path = Path(model_path)
+    if not path.is_dir():
+        return None
+    digest = hashlib.sha256()
+    for file in sorted(path.rglob("*")):
+        if file.is_file() and file.suffix in (".safetensors", ".bin", ".pt", ".json"):
+            stat = file.stat()
+            digest.update(f"{file.relative_to(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return "local-" + digest.hexdigest()[:16]
+
 
 class StepAudioProcessor:
-    def __init__(self, model_path: str = "stepfun-ai/Step-Audio-2-mini"):
-        """初始化Step-Audio模型"""
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"使用设备: {self.device}")
-        
-        # 加载模型和tokenizer
-        self.model = AutoModel.from_pretrained(
-            model_path,
-            trust_remote_code=True,
-            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32
-        ).to(self.device)
+    def __init__(self, model_path: str = "stepfun-ai/Step-Audio-2-mini",
+                 cache_dir: Optional[str] = ".cache", warm_up: bool = False,
+                 semantic_heads_path: Optional[str] = None, trim_silence: bool = True,
+                 cpu_int8: bool = False, num_threads: Optional[int] = None,
+                 interop_threads: Optional[int] = None, cache_summary_prompt: bool = True,
+                 constrained_summary: bool = False, draft_model_path: Optional[str] = None,
+                 num_draft_tokens: int = 4):
+        """初始化Step-Audio模型
+
+        模型和tokenizer在第一次使用时才加载，同一进程内的多个实例共享一份；
+        warm_up=True 时在后台线程提前加载。
+        semantic_heads_path 为训练好的语义分类头（fit_semantic_heads / SemanticHeads.save 的输出），
+        未提供时不做语义分类，semantic_info 为 None。
+        trim_silence=True 时ASR之前裁掉静音段，全静音的音频不调用模型。
+        cpu_int8=True 时使用CPU推理模式：float32加载后对线性层做动态int8量化；
+        num_threads/interop_threads 设置PyTorch的算子内/算子间线程数（进程级设置）。
+        cache_summary_prompt=True 时总结prompt的固定前缀只预填充一次，之后每次只计算转录文本部分。
+        constrained_summary=True 时总结改用约束贪心解码：只生成汉字，满5-10字即停止（不再采样，同一文本总结固定）；
+        默认 False，保持 temperature=0.3 的采样生成；
+        draft_model_path 为与主模型共用tokenizer的小模型，提供时用它做投机解码，每次提出 num_draft_tokens 个token。
+        """
+        configure_threads(num_threads, interop_threads)
+        if cpu_int8:
+            self.device = torch.device("cpu")
+        else:
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"使用设备: {self.device}" + (" (int8动态量化)" if cpu_int8 else ""))
         
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            model_path,
-            trust_remote_code=True
+        self.model_path = model_path
+        self.cpu_int8 = cpu_int8
+        self.model_key = step_audio_key(model_path, quantize_int8=cpu_int8)
+        if warm_up:
+            registry.warm_up(self.model_key)
+
+        self.transcription_cache = (
+            TranscriptionCache(str(Path(cache_dir) / "transcriptions.sqlite3")) if cache_dir else None
         )
-        
-        self.model.eval()
+        self.semantic_heads = (
+            SemanticHeads.load(semantic_heads_path, map_location=self.device).to(self.device)
+            if semantic_heads_path else None
+        )
+        self.silence_trimmer = SilenceTrimmer() if trim_silence else None
+        self.cache_summary_prompt = cache_summary_prompt
+        self._summary_prefix = None
+        self.constrained_summary = constrained_summary
+        self.draft_key = causal_lm_key(draft_model_path) if draft_model_path else None
+        self.num_draft_tokens = num_draft_tokens
+        self._summary_constraint = None
+        self._model_id = None
+
+    @property
+    def model(self):
+        return registry.get(self.model_key)[0]
+
+    @property
+    def tokenizer(self):
+        return registry.get(self.model_key)[1]
+
+    @property
+    def model_id(self):
+        """转录缓存键中的 (模型名, 版本)
+
+        版本由权重版本和影响转录结果的设置组成：权重版本取HF快照的commit哈希，本地目录取权重文件的哈希；
+        设置包括是否int8量化、是否裁剪静音，不同设置的转录互不复用。
+        模型未加载时只读取配置，缓存全部命中的运行不加载模型。
+        """
+        if self._model_id is None:
+            revision = local_revision(self.model_path)
+            if revision is None:
+                config = (self.model.config if registry.is_loaded(self.model_key)
+                          else registry.get(step_audio_config_key(self.model_path)))
+                revision = getattr(config, "_commit_hash", None) or "main"
+            settings = ["int8" if self.cpu_int8 else "float", "trim" if self.silence_trimmer else "full"]
+            self._model_id = (self.model_path, "+".join([revision, *settings]))
+        return self._model_id
         
     async def process_audio(self, audio_path: str) -> Dict[str, Any]:
         """
@@ -40,72 +121,144 @@ class StepAudioProcessor:
         Returns:
             包含转录文本和总结的字典
         """
-        # 读取音频
-        audio_data, sample_rate = sf.read(audio_path)
+        # 读取音频（直接解码为float32单声道）
+        audio_data, sample_rate = decode_audio(audio_path)
         
+        # 裁掉静音段，全静音时不调用模型
+        trim = self.trim_silence(prepare_batch([(audio_data, sample_rate)])[0])
+        if trim.silent:
+            return self.silent_result()
+
         # 准备输入
-        inputs = self.prepare_audio_input(audio_data, sample_rate)
+        inputs = torch.from_numpy(trim.audio).to(self.device)
         
-        with torch.no_grad():
-            # 语音识别
-            transcription = await self.transcribe_audio(inputs)
+        with torch.inference_mode():
+            # 音频编码只做一次，语音识别和语义分析共用
+            features = self.model.encode_audio(inputs)
+
+            # 语音识别（同时得到解码置信度）
+            transcription, confidence = await self.transcribe_with_confidence(inputs, features)
             
             # 智能总结（利用模型的理解能力）
             summary = await self.generate_summary(transcription)
             
             # 提取语义信息
-            semantic_info = await self.extract_semantic_info(inputs)
+            semantic_info = await self.extract_semantic_info(inputs, features)
         
         return {
             "transcription": transcription,
             "summary": summary,
             "semantic_info": semantic_info,
-            "confidence": self.calculate_confidence(inputs)
+            "confidence": confidence,
+            "speech_segments": trim.segment_seconds()
+        }
+
+    def trim_silence(self, audio: np.ndarray) -> TrimResult:
+        """VAD裁剪；关闭时原样返回整段"""
+        if self.silence_trimmer is not None:
+            return self.silence_trimmer.trim(audio)
+        return TrimResult(audio, [(0, len(audio))] if len(audio) else [], 16000, len(audio))
+
+    @staticmethod
+    def silent_result() -> Dict[str, Any]:
+        """全静音音频的结果：不含任何语音段"""
+        return {
+            "transcription": "",
+            "summary": "",
+            "semantic_info": None,
+            "confidence": None,
+            "speech_segments": []
         }
     
     def prepare_audio_input(self, audio_data: np.ndarray, sample_rate: int):
-        """准备音频输入"""
-        # 重采样到16kHz（如需要）
-        if sample_rate != 16000:
-            import librosa
-            audio_data = librosa.resample(
-                audio_data, 
-                orig_sr=sample_rate, 
-                target_sr=16000
-            )
+        """准备音频输入：混为单声道、去直流、重采样到16kHz"""
+        audio_data = prepare_batch([(audio_data, sample_rate)])[0]
         
-        # 转换为模型输入格式
-        audio_tensor = torch.from_numpy(audio_data).float().to(self.device)
-        return audio_tensor
+        # 转换为模型输入格式（float32，CPU上不复制）
+        return torch.from_numpy(audio_data).to(self.device)
     
-    async def transcribe_audio(self, audio_input) -> str:
-        """语音转文字"""
-        # 使用Step-Audio的ASR能力
-        outputs = self.model.generate(
+    async def transcribe_audio(self, audio_input, features=None) -> str:
+        """语音转文字，features 为已计算的 encode_audio 输出（可选）"""
+        transcription, _ = await self.transcribe_with_confidence(audio_input, features)
+        return transcription
+
+    async def transcribe_with_confidence(self, audio_input, features=None) -> Tuple[str, Optional[float]]:
+        """语音转文字并返回置信度；命中转录缓存时未经解码，置信度为 None"""
+        content_hash = None
+        if self.transcription_cache is not None:
+            content_hash = TranscriptionCache.hash_bytes(audio_input.detach().cpu().numpy())
+            cached = self.transcription_cache.get(content_hash, *self.model_id)
+            if cached is not None:
+                return cached, None
+
+        outputs = self.generate_transcript(audio_input, features)
+        transcription = self.tokenizer.decode(outputs.sequences[0], skip_special_tokens=True)
+        if content_hash is not None:
+            self.transcription_cache.put(content_hash, *self.model_id, transcription)
+        return transcription, float(self.calculate_confidence(outputs)[0])
+    
+    def generate_transcript(self, audio_input, features=None):
+        """ASR解码，返回带 sequences/scores 的 generate 输出"""
+        # 使用Step-Audio的ASR能力；传入 encoder_outputs 时 generate 跳过音频编码器
+        if features is None:
+            features = self.model.encode_audio(audio_input)
+        return self.model.generate(
             audio_input,
+            encoder_outputs=(features,),
             max_new_tokens=512,
             temperature=0.1,  # 低温度提高准确性
-            do_sample=False
+            do_sample=False,
+            output_scores=True,
+            return_dict_in_generate=True
         )
-        
-        transcription = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return transcription
-    
+
+    async def stream_transcription(self, audio_path: str, window_seconds: float = 30,
+                                   overlap_seconds: float = 2,
+                                   max_overlap_tokens: int = 48) -> AsyncIterator[str]:
+        """长音频流式转录：逐窗口读取和解码，每个窗口产出一段新增文本
+
+        窗口之间重叠 overlap_seconds，重叠部分的token会被两个窗口都转录出来，
+        拼接时用 merge_overlap 去掉新窗口开头与上一窗口结尾重复的token。
+        各段依次拼接即为完整转录；内存中只保留当前窗口和上一窗口末尾的token。
+        """
+        windows = iter_windows(audio_path, window_seconds, overlap_seconds)
+        previous: List[int] = []
+        while True:
+            window = await asyncio.to_thread(next, windows, None)
+            if window is None:
+                return
+            trim = self.trim_silence(window)
+            if trim.silent:
+                continue
+            tokens = await asyncio.to_thread(self._transcribe_window_tokens, trim.audio)
+            new_tokens = merge_overlap(previous, tokens, max_overlap_tokens)
+            previous = (previous + new_tokens)[-max_overlap_tokens:]
+            text = self.tokenizer.decode(torch.tensor(new_tokens, dtype=torch.long), skip_special_tokens=True)
+            if text:
+                yield text
+
+    def _transcribe_window_tokens(self, window: np.ndarray) -> List[int]:
+        """转录一个窗口，返回生成的token id（不含填充）"""
+        with torch.inference_mode():
+            outputs = self.generate_transcript(torch.from_numpy(window).to(self.device))
+        generated = outputs.sequences[0, outputs.sequences.shape[1] - len(outputs.scores):].tolist()
+        pad_token_id = self.tokenizer.pad_token_id
+        return [token for token in generated if token != pad_token_id]
+
     async def generate_summary(self, text: str) -> str:
         """
         生成5-10字的中文总结
         利用Step-Audio的语义理解能力
         """
-        # 构造总结prompt
-        prompt = f"""<|audio_start|>
-{text}
-<|audio_end|>
+        if self.constrained_summary:
+            return self.tokenizer.decode(self.decode_summary(text).tokens, skip_special_tokens=True)
 
-请用5-10个中文字总结上述内容的核心要点："""
-        
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
+        if self.cache_summary_prompt:
+            inputs = self.summary_inputs(text)
+        else:
+            inputs = self.tokenizer(self.summary_prompt(text), return_tensors="pt").to(self.device)
         
-        with torch.no_grad():
+        with torch.inference_mode():
             outputs = self.model.generate(
                 **inputs,
                 max_new_tokens=20,
@@ -115,70 +268,349 @@ class StepAudioProcessor:
             )
         
         summary = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # 提取总结部分
-        summary = summary.split("：")[-1].strip()[:10]
-        
-        return summary
+        return self.extract_summary(summary)
+
+    @property
+    def draft_model(self):
+        return registry.get(self.draft_key) if self.draft_key else None
+
+    @property
+    def summary_constraint(self) -> SummaryConstraint:
+        """5-10个汉字的总结约束，第一次使用时扫描一遍词表"""
+        if self._summary_constraint is None:
+            self._summary_constraint = SummaryConstraint(self.tokenizer)
+        return self._summary_constraint
+
+    def decode_summary(self, text: str) -> DecodeResult:
+        """约束解码一条总结（有草稿模型时为投机解码），返回token和解码步数统计"""
+        if self.cache_summary_prompt:
+            inputs = self.summary_inputs(text)
+        else:
+            inputs = self.tokenizer(self.summary_prompt(text), return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            return constrained_decode(
+                self.model,
+                inputs["input_ids"],
+                self.summary_constraint,
+                past_key_values=inputs.get("past_key_values"),
+                draft_model=self.draft_model,
+                num_draft_tokens=self.num_draft_tokens
+            )
+
+    @staticmethod
+    def summary_prompt(text: str) -> str:
+        """构造总结prompt"""
+        return SUMMARY_PREFIX + StepAudioProcessor.summary_body(text)
+
+    @staticmethod
+    def summary_body(text: str) -> str:
+        """prompt中随转录文本变化的部分"""
+        return f"""{text}
+<|audio_end|>
+
+总结："""
+
+    @property
+    def summary_prefix(self) -> Tuple[torch.Tensor, Any]:
+        """固定前缀的 (input_ids, past_key_values)，第一次使用时预填充"""
+        if self._summary_prefix is None:
+            prefix_ids = self.tokenizer(SUMMARY_PREFIX, return_tensors="pt")["input_ids"].to(self.device)
+            with torch.inference_mode():
+                past_key_values = self.model(input_ids=prefix_ids, use_cache=True).past_key_values
+            self._summary_prefix = (prefix_ids, past_key_values)
+        return self._summary_prefix
+
+    def summary_inputs(self, text: str) -> Dict[str, Any]:
+        """generate 的输入：完整的 input_ids 加上前缀的KV缓存，模型只计算转录文本部分的token
+
+        generate 会在传入的缓存上原地追加，所以每次使用缓存的副本。
+        """
+        prefix_ids, past_key_values = self.summary_prefix
+        body_ids = self.tokenizer(
+            self.summary_body(text), return_tensors="pt", add_special_tokens=False
+        )["input_ids"].to(self.device)
+        input_ids = torch.cat([prefix_ids, body_ids], dim=1)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": copy.deepcopy(past_key_values),
+        }
+
+    @staticmethod
+    def extract_summary(decoded: str) -> str:
+        """从解码结果中提取总结部分"""
+        return decoded.split("：")[-1].strip()[:10]
     
-    async def extract_semantic_info(self, audio_input) -> Dict[str, Any]:
+    async def extract_semantic_info(self, audio_input, features=None) -> Optional[Dict[str, Any]]:
         """
         提取语义和副语言信息
         Step-Audio的独特能力：理解情绪、语调等
         """
-        # 提取音频特征
-        features = self.model.encode_audio(audio_input)
+        # 提取音频特征（未传入时单独编码）
+        if features is None:
+            features = self.model.encode_audio(audio_input)
         
         # 分析语义信息
-        semantic_info = {
-            "emotion": self.detect_emotion(features),
-            "urgency": self.detect_urgency(features),
-            "topic_category": self.classify_topic(features)
-        }
-        
-        return semantic_info
-    
-    def detect_emotion(self, features) -> str:
-        """检测说话者情绪"""
-        # 简化实现，实际可以使用模型的情绪理解能力
-        emotions = ["平静", "开心", "焦虑", "兴奋", "疲惫"]
-        # 基于特征计算情绪
-        return emotions[0]  # 简化返回
-    
-    def detect_urgency(self, features) -> str:
-        """检测内容紧急程度"""
-        return "普通"  # 可以扩展为: 紧急/重要/普通
-    
-    def classify_topic(self, features) -> str:
-        """分类话题类型"""
-        return "daily_life"  # 与之前的分类系统对接
+        return self.classify_semantics(features if features.dim() == 3 else features[None])[0]
+
+    def classify_semantics(self, features: torch.Tensor,
+                           frame_mask: Optional[torch.Tensor] = None) -> List[Optional[Dict[str, Any]]]:
+        """在 [batch, frames, dim] 的编码特征上批量做情绪/紧急程度/话题分类
+
+        有效帧均值池化后经分类头一次矩阵乘法得到全部标签，不再调用模型；
+        未加载分类头时没有可信的标签，每条返回 None。
+        """
+        if self.semantic_heads is None:
+            return [None] * features.shape[0]
+        return self.semantic_heads.predict(masked_mean(features, frame_mask))
+
+    def fit_semantic_heads(self, samples: Sequence[Tuple[str, Dict[str, str]]], output_path: str,
+                           heads: Dict[str, Sequence[str]] = HEADS, **fit_options) -> float:
+        """用人工标注的音频训练语义分类头，保存到 output_path 并立即启用，返回最终损失
+
+        samples 为 (音频路径, {任务: 标签})，标签须在 heads 对应的类别中；某条缺少的任务不参与该任务的训练。
+        特征与推理时一致：解码、裁剪静音、encode_audio 后按有效帧均值池化（全静音的音频不裁剪）。
+        """
+        pooled = []
+        with torch.inference_mode():
+            for audio_path, _ in samples:
+                audio = prepare_batch([decode_audio(audio_path)])[0]
+                trim = self.trim_silence(audio)
+                audio = audio if trim.silent else trim.audio
+                pooled.append(masked_mean(self.model.encode_audio(torch.from_numpy(audio).to(self.device)))[0])
+        pooled = torch.stack(pooled).float()
+
+        semantic_heads = SemanticHeads(pooled.shape[-1], heads).to(self.device)
+        targets = {}
+        for task, labels in semantic_heads.heads.items():
+            # 缺少该任务标注的样本记为 -100，cross_entropy 默认忽略
+            target = [labels.index(sample_labels[task]) if task in sample_labels else -100
+                      for _, sample_labels in samples]
+            if any(index >= 0 for index in target):
+                targets[task] = torch.tensor(target, device=self.device)
+        loss = semantic_heads.fit(pooled, targets, **fit_options)
+        semantic_heads.save(output_path)
+        self.semantic_heads = semantic_heads.eval()
+        return loss
     
-    def calculate_confidence(self, inputs) -> float:
-        """计算置信度分数"""
-        # 基于模型输出的logits计算置信度
-        return 0.95  # 简化实现
+    def calculate_confidence(self, outputs) -> torch.Tensor:
+        """由 generate(output_scores=True, return_dict_in_generate=True) 的输出计算每条序列的置信度
+
+        置信度为生成token概率的几何平均 exp(mean log p)，填充token不计入；返回 [batch]。
+        """
+        generated = outputs.sequences[:, outputs.sequences.shape[1] - len(outputs.scores):]
+        pad_token_id = self.tokenizer.pad_token_id
+        total = torch.zeros(generated.shape[0], device=generated.device)
+        count = torch.zeros(generated.shape[0], device=generated.device)
+        for step, logits in enumerate(outputs.scores):
+            tokens = generated[:, step]
+            log_probs = logits.float().log_softmax(dim=-1).gather(1, tokens[:, None]).squeeze(1)
+            valid = (tokens != pad_token_id).float() if pad_token_id is not None else torch.ones_like(total)
+            total += log_probs * valid
+            count += valid
+        return torch.exp(total / count.clamp(min=1))
+
+    # ---- 批量接口：每个阶段对整批只调用一次 generate/encode_audio ----
+
+    def process_batch(self, audio_paths: List[str]) -> List[Union[Dict[str, Any], Exception]]:
+        """批量处理多个音频文件（同步，供微批服务在工作线程中调用），结果与输入一一对应
+
+        每个文件单独解码，解码失败的条目结果为对应的异常，不影响同批其他文件。
+        """
+        results: List[Any] = [None] * len(audio_paths)
+        decoded = {}
+        for i, audio_path in enumerate(audio_paths):
+            try:
+                decoded[i] = decode_audio(audio_path)
+            except Exception as e:
+                results[i] = e
+        # 去直流、按采样率分组重采样，再裁掉静音；全静音的片段不进入批次
+        trims = dict(zip(decoded, (self.trim_silence(audio) for audio in prepare_batch(list(decoded.values())))))
+        for i, trim in trims.items():
+            if trim.silent:
+                results[i] = self.silent_result()
+        active = [i for i, trim in trims.items() if not trim.silent]
+        if not active:
+            return results
+
+        inputs = [torch.from_numpy(trims[i].audio).to(self.device) for i in active]
+        with torch.inference_mode():
+            encoded = self.encode_batch(inputs)
+            transcriptions, confidences = self.transcribe_batch(inputs, encoded)
+            summaries = self.generate_summaries(transcriptions)
+            semantic_infos = self.classify_semantics(encoded.features, encoded.frame_mask)
+        for i, transcription, summary, semantic_info, confidence in zip(
+                active, transcriptions, summaries, semantic_infos, confidences):
+            results[i] = {
+                "transcription": transcription,
+                "summary": summary,
+                "semantic_info": semantic_info,
+                "confidence": confidence,
+                "speech_segments": trims[i].segment_seconds()
+            }
+        return results
+
+    def encode_batch(self, audio_inputs: List[torch.Tensor]) -> "EncodedBatch":
+        """整批做一次音频编码，结果供ASR解码和语义分析共用"""
+        audio_batch, attention_mask = self.pad_audio(audio_inputs)
+        features = self.model.encode_audio(audio_batch)
+        # 把样本级掩码换算到编码器帧上：第 j 帧覆盖 [j*hop, (j+1)*hop) 个样本
+        hop = audio_batch.shape[1] / features.shape[1]
+        lengths = attention_mask.sum(dim=1)
+        frame_counts = torch.clamp(torch.ceil(lengths / hop), min=1).long()
+        frame_mask = torch.arange(features.shape[1], device=self.device)[None, :] < frame_counts[:, None]
+        return EncodedBatch(audio_batch, features, frame_mask.long())
+
+    def transcribe_batch(self, audio_inputs: List[torch.Tensor],
+                         encoded: Optional["EncodedBatch"] = None) -> Tuple[List[str], List[Optional[float]]]:
+        """批量语音转文字，返回 (转录, 置信度)；缓存命中的片段不进入批次，置信度为 None
+
+        encoded 为 encode_batch 的结果（可选）。
+        """
+        transcriptions: List[Optional[str]] = [None] * len(audio_inputs)
+        confidences: List[Optional[float]] = [None] * len(audio_inputs)
+        hashes: List[Optional[str]] = [None] * len(audio_inputs)
+        if self.transcription_cache is not None:
+            for i, audio_input in enumerate(audio_inputs):
+                hashes[i] = TranscriptionCache.hash_bytes(audio_input.detach().cpu().numpy())
+                transcriptions[i] = self.transcription_cache.get(hashes[i], *self.model_id)
+
+        pending = [i for i, text in enumerate(transcriptions) if text is None]
+        if pending:
+            if encoded is None:
+                encoded = self.encode_batch([audio_inputs[i] for i in pending])
+            else:
+                encoded = encoded.select(pending)
+            outputs = self.model.generate(
+                encoded.audio,
+                attention_mask=encoded.frame_mask,
+                encoder_outputs=(encoded.features,),
+                max_new_tokens=512,
+                temperature=0.1,
+                do_sample=False,
+                output_scores=True,
+                return_dict_in_generate=True
+            )
+            texts = self.tokenizer.batch_decode(outputs.sequences, skip_special_tokens=True)
+            for i, text, confidence in zip(pending, texts, self.calculate_confidence(outputs).tolist()):
+                transcriptions[i] = text
+                confidences[i] = confidence
+                if hashes[i] is not None:
+                    self.transcription_cache.put(hashes[i], *self.model_id, text)
+        return transcriptions, confidences
+
+    def generate_summaries(self, texts: List[str]) -> List[str]:
+        """批量生成总结：prompt左填充后一次 generate；约束解码模式下逐条解码"""
+        if not texts:
+            return []
+        if self.constrained_summary:
+            # 约束解码每条至多10步，且复用前缀KV缓存，逐条解码
+            return [self.tokenizer.decode(self.decode_summary(text).tokens, skip_special_tokens=True)
+                    for text in texts]
+        # 逐条编码后自行左填充：tokenizer 经注册表共享，不能改它的 padding_side / pad_token
+        pad_id = self.tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = self.tokenizer.eos_token_id
+        rows = [self.tokenizer(self.summary_prompt(text), return_tensors="pt")["input_ids"][0] for text in texts]
+        width = max(len(row) for row in rows)
+        input_ids = torch.full((len(rows), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+        for i, row in enumerate(rows):
+            input_ids[i, width - len(row):] = row
+            attention_mask[i, width - len(row):] = 1
+        outputs = self.model.generate(
+            input_ids=input_ids.to(self.device),
+            attention_mask=attention_mask.to(self.device),
+            pad_token_id=pad_id,
+            max_new_tokens=20,
+            temperature=0.3,
+            do_sample=True,
+            top_p=0.9
+        )
+        return [self.extract_summary(text) for text in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+    def pad_audio(self, audio_inputs: List[torch.Tensor]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """把不等长的音频右填充成 [batch, samples]，返回 (音频, attention_mask)"""
+        lengths = torch.tensor([len(audio) for audio in audio_inputs], device=self.device)
+        audio_batch = torch.nn.utils.rnn.pad_sequence(audio_inputs, batch_first=True)
+        attention_mask = torch.arange(audio_batch.shape[1], device=self.device)[None, :] < lengths[:, None]
+        return audio_batch, attention_mask.long()
+
+
+def configure_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """设置PyTorch线程数；算子间线程池只能在首次并行计算前设置一次，之后的设置会被忽略"""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            print(f"⚠️ 算子间线程数已固定为 {torch.get_num_interop_threads()}，忽略 interop_threads={interop_threads}")
+
+
+def merge_overlap(previous: Sequence[int], tokens: Sequence[int], max_overlap: int = 48,
+                  min_match: int = 3) -> List[int]:
+    """去掉 tokens 开头与 previous 结尾重复的部分，返回需要追加的token
+
+    优先取 previous 后缀与 tokens 前缀完全相同的最长重叠；窗口边界处常有一两个token识别不同，
+    找不到时在双方 max_overlap 范围内找最长公共片段（至少 min_match 个token），从片段之后接上。
+    """
+    tail = list(previous[-max_overlap:])
+    head = list(tokens[:max_overlap])
+    for k in range(min(len(tail), len(head)), min_match - 1, -1):
+        if tail[-k:] == head[:k]:
+            return list(tokens[k:])
+
+    # 最长公共子串（动态规划，规模不超过 max_overlap²）
+    best_length, best_end = 0, 0
+    lengths = [0] * (len(head) + 1)
+    for i in range(1, len(tail) + 1):
+        previous_row = lengths[:]
+        for j in range(1, len(head) + 1):
+            lengths[j] = previous_row[j - 1] + 1 if tail[i - 1] == head[j - 1] else 0
+            if lengths[j] > best_length:
+                best_length, best_end = lengths[j], j
+    if best_length >= min_match:
+        return list(tokens[best_end:])
+    return list(tokens)
+
+
+class EncodedBatch(NamedTuple):
+    """一批音频的编码结果：audio [batch, samples]，features [batch, frames, dim]，frame_mask [batch, frames]"""
+    audio: torch.Tensor
+    features: torch.Tensor
+    frame_mask: torch.Tensor
+
+    def select(self, indices: List[int]) -> "EncodedBatch":
+        index = torch.tensor(indices, device=self.features.device)
+        return EncodedBatch(self.audio[index], self.features[index], self.frame_mask[index])
 
 
 # Edge Function集成
 class StepAudioEdgeFunction:
-    """用于Supabase Edge Function的轻量级版本"""
-    
-    @staticmethod
-    async def process_via_api(audio_url: str) -> Dict[str, Any]:
+    """用于Supabase Edge Function的轻量级版本；所有调用共享同一个连接池"""
+
+    _client = None
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            from step_audio_client import StepAudioAPIClient
+            cls._client = StepAudioAPIClient()
+        return cls._client
+
+    @classmethod
+    async def process_via_api(cls, audio_url: str) -> Dict[str, Any]:
         """
         通过API调用Step-Audio服务
         适合Edge Function环境
         """
-        import aiohttp
-        
-        # 部署的Step-Audio API端点
-        API_ENDPOINT = "https://your-step-audio-api.com/process"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                API_ENDPOINT,
-                json={"audio_url": audio_url}
-            ) as response:
-                return await response.json()
+        return await cls.client().process(audio_url)
+
+    @classmethod
+    async def process_many(cls, audio_urls: List[str]) -> List[Dict[str, Any]]:
+        """批量调用，请求在连接池上并发进行，结果与输入一一对应"""
+        return await cls.client().process_many(audio_urls)
 
 
 # 本地测试脚本
@@ -193,8 +625,15 @@ async def test_step_audio():
     
     print(f"转录文本: {result['transcription']}")
     print(f"AI总结: {result['summary']}")
-    print(f"情绪识别: {result['semantic_info']['emotion']}")
-    print(f"置信度: {result['confidence']:.2%}")
+    if result["semantic_info"] is not None:
+        print(f"情绪识别: {result['semantic_info']['emotion']}")
+    if result["confidence"] is not None:
+        print(f"置信度: {result['confidence']:.2%}")
+    if processor.silence_trimmer is not None:
+        print(processor.silence_trimmer.report())
+    if processor.transcription_cache is not None:
+        stats = processor.transcription_cache.stats()
+        print(f"转录缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}")
 
 if __name__ == "__main__":
     asyncio.run(test_step_audio())
\ No newline at end of file
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Step-Audio微批推理服务：把并发请求攒成批次，每个阶段整批调用一次模型
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from batching import MicroBatcher
+from step_audio_integration import StepAudioProcessor
+
+
+class StepAudioBatchServer:
+    """StepAudioProcessor 的异步微批前端
+
+    process_audio(path) 与 StepAudioProcessor.process_audio 的返回一致；
+    并发调用在 max_wait_ms 内被聚合为至多 max_batch_size 条的批次，
+    由 processor.process_batch 在单独的推理线程中执行，结果经future返回各调用方。
+    模型同一时间只执行一个批次，等待中的请求自然积累成下一批。
+    """
+
+    def __init__(self, processor: Optional[StepAudioProcessor] = None,
+                 max_batch_size: int = 8, max_wait_ms: float = 10):
+        self.processor = processor or StepAudioProcessor()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="step-audio")
+        self.batcher = MicroBatcher(
+            self.processor.process_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            workers=1,
+            executor=self._executor
+        )
+
+    async def process_audio(self, audio_path: str) -> Dict[str, Any]:
+        """提交单个音频，等待所在批次完成后返回结果"""
+        return await self.batcher.submit(audio_path)
+
+    async def close(self):
+        await self.batcher.close()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        self.batcher.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def create_app(max_batch_size: int = 8, max_wait_ms: float = 10):
+    """FastAPI应用：/transcribe-and-summarize 经微批服务处理"""
+    from contextlib import asynccontextmanager
+    from fastapi import FastAPI
+
+    server: Dict[str, StepAudioBatchServer] = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        server["batch"] = StepAudioBatchServer(
+            StepAudioProcessor(warm_up=True), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+        )
+        async with server["batch"]:
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/transcribe-and-summarize")
+    async def process_audio(audio_url: str):
+        result = await server["batch"].process_audio(audio_url)
+        return {
+            "transcription": result["transcription"],
+            "summary": result["summary"],
+            "confidence": result["confidence"]
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
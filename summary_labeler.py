@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+训练标签生成：文本归一化去重 + 磁盘缓存 + 异步限流请求OpenAI兼容接口
+"""
+
+import asyncio
+import hashlib
+import random
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from step_audio_client import parse_retry_after
+
+SUMMARY_PROMPT = "用5-10个中文字总结核心内容"
+
+_PUNCTUATION = re.compile(r"[\s　。，、！？；：,.!?;:…~～\"'“”‘’]+")
+
+
+def normalize_transcription(text: str) -> str:
+    """归一化转录文本：全半角统一、去除空白和标点、小写
+
+    只在标点空白上有差异的转录（如短语音备忘）归一化后相同，共用同一条标签。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _PUNCTUATION.sub(" ", text).strip()
+
+
+class RateLimitError(Exception):
+    """接口返回429或5xx，可重试"""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SummaryCache:
+    """以 (prompt, 模型, 归一化文本) 的哈希为键的SQLite总结缓存"""
+
+    def __init__(self, db_path: str = ".cache/summaries.sqlite3"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(prompt: str, model: str, text: str) -> str:
+        return hashlib.sha256("\0".join((prompt, model, text)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)", (key, summary)
+            )
+            self._conn.commit()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SummaryLabeler:
+    """为转录文本生成期望总结（训练标签）
+
+    - 归一化后相同的文本只请求一次，并发中的重复请求共享同一个结果
+    - 结果写入磁盘缓存，增量构建时不再重复付费
+    - 同时在途的请求数不超过 max_in_flight，429/5xx 时指数退避重试
+    - 任意OpenAI兼容的 /chat/completions 接口都可以作为后端（包括本地桩服务）
+    """
+
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1",
+                 model: str = "gpt-4o-mini", prompt: str = SUMMARY_PROMPT,
+                 max_in_flight: int = 8, max_retries: int = 6,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 cache_path: Optional[str] = ".cache/summaries.sqlite3"):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.prompt = prompt
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = SummaryCache(cache_path) if cache_path else None
+        self.requests_sent = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def summarize(self, text: str) -> str:
+        """生成单条总结"""
+        normalized = normalize_transcription(text)
+        key = SummaryCache.key(self.prompt, self.model, normalized)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            summary = await self._request(text)
+            if self.cache is not None:
+                self.cache.put(key, summary)
+            future.set_result(summary)
+            return summary
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    async def summarize_many(self, texts: List[str]) -> List[str]:
+        """批量生成总结，按输入顺序返回"""
+        return list(await asyncio.gather(*(self.summarize(text) for text in texts)))
+
+    async def _request(self, text: str) -> str:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.prompt},
+                {"role": "user", "content": text}
+            ],
+            "max_tokens": 20
+        }
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    self.requests_sent += 1
+                    async with self._session.post(f"{self.base_url}/chat/completions", json=payload) as response:
+                        if response.status == 429 or response.status >= 500:
+                            raise RateLimitError(response.status, parse_retry_after(response.headers.get("Retry-After")))
+                        response.raise_for_status()
+                        data = await response.json()
+                return data["choices"][0]["message"]["content"].strip()
+            except (RateLimitError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                # 退避时不占用在途名额，加随机抖动避免同时重试
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if isinstance(e, RateLimitError) and e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
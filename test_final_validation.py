@@ -4,26 +4,23 @@
 """
 
 import asyncio
-import websockets
-import json
 import time
 
+from realtime_client import RealtimeClient, RealtimeError, RealtimeEvent
+
 API_KEY = "8FyDGELcpTdfh1JNOoePkfXzCtExQHL8DSdEX9UYfl4dCsE77R4WIUOIJqanw0Cl"
-WS_URL = "wss://api.stepfun.com/v1/realtime"
+RESPONSE_TIMEOUT = 7  # 每个场景等待回复的上限 (秒)
 
 class FinalValidator:
     def __init__(self):
-        self.websocket = None
+        self.client = RealtimeClient(API_KEY)
+        self.client.on("error", lambda event: print(f"❌ 错误: {event.get('error', {})}"))
         self.responses = []
-        self.test_completed = False
         
     async def connect(self):
         """连接API"""
         try:
-            self.websocket = await websockets.connect(
-                f"{WS_URL}?model=step-audio-2-mini",
-                additional_headers={"Authorization": f"Bearer {API_KEY}"}
-            )
+            await self.client.connect()
             print("✅ 连接成功")
             return True
         except Exception as e:
@@ -36,7 +33,7 @@ class FinalValidator:
         # 配置智能分类系统
         config = {
             "event_id": "intelligent_config",
-            "type": "session.update", 
+            "type": "session.update",
             "session": {
                 "modalities": ["text", "audio"],
                 "instructions": """你是专业的音频智能分析助手。请：
@@ -68,9 +65,9 @@ class FinalValidator:
             }
         }
         
-        await self.websocket.send(json.dumps(config))
         print("📤 发送智能分类配置")
-        await asyncio.sleep(1.5)
+        await asyncio.wait_for(self.client.request(config, "session.updated"), RESPONSE_TIMEOUT)
+        print("✅ 智能分类系统配置成功")
     
     async def test_scenarios(self):
         """测试不同场景"""
@@ -105,6 +102,7 @@ class FinalValidator:
         for i, scenario in enumerate(scenarios, 1):
             print(f"\n🧪 测试 {i}/{len(scenarios)}: {scenario['name']}")
             test_start = time.time()
+            response = self.client.expect(event_ids=(f"test_{i}", f"response_{i}"))
             
             # 创建消息
             create_msg = {
@@ -118,94 +116,78 @@ class FinalValidator:
                 }
             }
             
-            await self.websocket.send(json.dumps(create_msg))
+            await self.client.send(create_msg)
             
             # 请求响应
             response_msg = {
                 "event_id": f"response_{i}",
                 "type": "response.create"
             }
-            await self.websocket.send(json.dumps(response_msg))
+            await self.client.send(response_msg)
             
             print(f"📤 输入: {scenario['text']}")
             print(f"🎯 期望: {scenario['expected']}")
             
-            # 等待响应
-            await asyncio.sleep(7)
-        
-        self.test_completed = True
+            # 等待响应：文本和语音转录到达即进行下一个场景
+            try:
+                events = await response.wait(RESPONSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"⚠️ {RESPONSE_TIMEOUT}秒内没有收到回复")
+                continue
+            except RealtimeError as e:
+                print(f"⚠️ 回复失败: {e}")
+                continue
+            if "response.text.done" in events:
+                self.analyze_response(i, events["response.text.done"], time.time() - test_start)
     
-    async def listen_and_analyze(self):
-        """监听响应并分析"""
-        test_count = 0
+    def analyze_response(self, test_count: int, event: RealtimeEvent, response_time: float):
+        """分析一条回复的质量"""
+        content = event.get("content", "")
         
-        async for message in self.websocket:
-            try:
-                data = json.loads(message)
-                event_type = data.get("type", "unknown")
-                
-                if event_type == "session.updated":
-                    print("✅ 智能分类系统配置成功")
-                    
-                elif event_type == "response.text.done":
-                    content = data.get("content", "")
-                    test_count += 1
-                    
-                    print(f"💡 AI总结: {content}")
-                    
-                    # 分析回复质量
-                    char_count = len(content)
-                    quality_score = 0
-                    
-                    # 长度评分
-                    if 3 <= char_count <= 8:
-                        print(f"   ✅ 长度合适: {char_count}字")
-                        quality_score += 2
-                    else:
-                        print(f"   ⚠️ 长度问题: {char_count}字 (建议3-8字)")
-                    
-                    # 相关性评分  
-                    relevance_keywords = {
-                        1: ["自然", "环境", "风", "鸟"],
-                        2: ["工作", "会议", "讨论", "设计"], 
-                        3: ["机械", "运转", "空调", "嗡嗡"],
-                        4: ["生活", "交流", "外卖", "晚餐"],
-                        5: ["学习", "笔记", "Python", "编程"]
-                    }
-                    
-                    if test_count in relevance_keywords:
-                        keywords = relevance_keywords[test_count]
-                        if any(kw in content for kw in keywords):
-                            print(f"   ✅ 内容相关")
-                            quality_score += 2
-                        else:
-                            print(f"   ⚠️ 相关性待提升")
-                    
-                    # 响应速度评分
-                    print(f"   ✅ 响应及时 (<7秒)")
-                    quality_score += 1
-                    
-                    total_score = f"{quality_score}/5"
-                    status = "优秀" if quality_score >= 4 else "良好" if quality_score >= 3 else "待优化"
-                    print(f"   📊 评分: {total_score} ({status})")
-                    
-                    self.responses.append({
-                        "test_id": test_count,
-                        "content": content,
-                        "score": quality_score,
-                        "char_count": char_count
-                    })
-                    
-                    if test_count >= 5 and self.test_completed:
-                        await self.generate_final_report()
-                        return
-                        
-                elif event_type == "error":
-                    error_info = data.get("error", {})
-                    print(f"❌ 错误: {error_info}")
-                    
-            except Exception as e:
-                print(f"❌ 解析失败: {e}")
+        print(f"💡 AI总结: {content}")
+        
+        # 分析回复质量
+        char_count = len(content)
+        quality_score = 0
+        
+        # 长度评分
+        if 3 <= char_count <= 8:
+            print(f"   ✅ 长度合适: {char_count}字")
+            quality_score += 2
+        else:
+            print(f"   ⚠️ 长度问题: {char_count}字 (建议3-8字)")
+        
+        # 相关性评分  
+        relevance_keywords = {
+            1: ["自然", "环境", "风", "鸟"],
+            2: ["工作", "会议", "讨论", "设计"], 
+            3: ["机械", "运转", "空调", "嗡嗡"],
+            4: ["生活", "交流", "外卖", "晚餐"],
+            5: ["学习", "笔记", "Python", "编程"]
+        }
+        
+        if test_count in relevance_keywords:
+            keywords = relevance_keywords[test_count]
+            if any(kw in content for kw in keywords):
+                print(f"   ✅ 内容相关")
+                quality_score += 2
+            else:
+                print(f"   ⚠️ 相关性待提升")
+        
+        # 响应速度评分 (超过 RESPONSE_TIMEOUT 的回复不会到这里)
+        print(f"   ✅ 响应及时 ({response_time:.1f}秒)")
+        quality_score += 1
+        
+        total_score = f"{quality_score}/5"
+        status = "优秀" if quality_score >= 4 else "良好" if quality_score >= 3 else "待优化"
+        print(f"   📊 评分: {total_score} ({status})")
+        
+        self.responses.append({
+            "test_id": test_count,
+            "content": content,
+            "score": quality_score,
+            "char_count": char_count
+        })
     
     async def generate_final_report(self):
         """生成最终测试报告"""
@@ -279,22 +261,15 @@ async def main():
     if not await validator.connect():
         return
     
-    # 启动监听
-    listen_task = asyncio.create_task(validator.listen_and_analyze())
-    
     try:
         await validator.test_intelligent_classification()
         await validator.test_scenarios()
-        
-        # 等待完成
-        await listen_task
+        await validator.generate_final_report()
         
     except Exception as e:
         print(f"❌ 测试异常: {e}")
     finally:
-        listen_task.cancel()
-        if validator.websocket:
-            await validator.websocket.close()
+        await validator.client.close()
         print("🔌 测试完成，连接已关闭")
 
 if __name__ == "__main__":
@@ -5,38 +5,36 @@ Step Realtime API 智能音频分类测试
 """
 
 import asyncio
-import websockets
-import json
-import base64
 import numpy as np
 import time
 
+from pcm_uplink import PCMUplink
+from realtime_client import TERMINAL_EVENTS, RealtimeError, RealtimeEvent
+from realtime_pool import RealtimeSessionPool
+
 API_KEY = "8FyDGELcpTdfh1JNOoePkfXzCtExQHL8DSdEX9UYfl4dCsE77R4WIUOIJqanw0Cl"
-WS_URL = "wss://api.stepfun.com/v1/realtime"
+TEST_SCENARIOS = ("environment_sound", "human_voice")
 
 class IntelligentAudioTester:
     def __init__(self):
-        self.websocket = None
+        self.pool = RealtimeSessionPool(API_KEY, on_connect=lambda client: client.on("*", self.record_event))
+        self.client = None
         self.test_results = []
         self.current_test = None
         
     async def connect(self):
-        """连接到Step Realtime API"""
+        """连接到Step Realtime API：为两种场景各预热一个已配置的会话"""
         try:
-            self.websocket = await websockets.connect(
-                f"{WS_URL}?model=step-audio-2-mini",
-                additional_headers={
-                    "Authorization": f"Bearer {API_KEY}"
-                }
-            )
+            await asyncio.gather(*(self.pool.prewarm(self.session_config(scenario)) for scenario in TEST_SCENARIOS))
             print("✅ 成功连接到Step Realtime API")
             return True
         except Exception as e:
             print(f"❌ 连接失败: {e}")
             return False
     
-    async def send_session_config(self, test_scenario):
-        """根据测试场景发送不同的session配置"""
+    @staticmethod
+    def session_config(test_scenario):
+        """根据测试场景生成不同的session配置"""
         
         if test_scenario == "environment_sound":
             instructions = """你是一个专业的环境音分析助手。
@@ -63,28 +61,21 @@ class IntelligentAudioTester:
             silence_duration = 600  # 标准静音检测
             threshold = 0.5  # 标准阈值
         
-        config = {
-            "event_id": f"session_config_{test_scenario}",
-            "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": instructions,
-                "voice": voice,
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": threshold,
-                    "silence_duration_ms": silence_duration
-                }
+        return {
+            "modalities": ["text", "audio"],
+            "instructions": instructions,
+            "voice": voice,
+            "input_audio_format": "pcm16",
+            "output_audio_format": "pcm16",
+            "turn_detection": {
+                "type": "server_vad",
+                "threshold": threshold,
+                "silence_duration_ms": silence_duration
             }
         }
-        
-        await self.websocket.send(json.dumps(config))
-        print(f"📤 发送{test_scenario}专用配置")
     
     async def generate_environment_audio(self, sound_type):
-        """生成不同类型的环境音"""
+        """生成不同类型的环境音，返回16位PCM采样"""
         sample_rate = 16000
         duration = 3.0  # 3秒音频
         
@@ -142,37 +133,24 @@ class IntelligentAudioTester:
             audio_data = voice * envelope * 0.3
         
         # 转换为16位PCM
-        audio_int16 = np.clip(audio_data * 32767, -32767, 32767).astype(np.int16)
-        audio_bytes = audio_int16.tobytes()
-        
-        return base64.b64encode(audio_bytes).decode()
+        return np.clip(audio_data * 32767, -32767, 32767).astype(np.int16)
     
     async def send_test_audio(self, audio_data, test_name):
         """发送测试音频并记录时间"""
         start_time = time.time()
         
-        # 分块发送音频 (模拟实时流)
-        chunk_size = 3200  # 200ms的音频数据
-        for i in range(0, len(audio_data), chunk_size):
-            chunk = audio_data[i:i+chunk_size]
-            
-            message = {
-                "event_id": f"audio_chunk_{test_name}_{i//chunk_size}",
-                "type": "input_audio_buffer.append",
-                "audio": chunk
-            }
-            
-            await self.websocket.send(json.dumps(message))
-            await asyncio.sleep(0.2)  # 模拟实时发送
+        # 分块发送音频 (模拟实时流)：每块200ms，即3200个采样，按实时速率定时发送
+        stats = await PCMUplink(chunk_ms=200).stream(self.client, audio_data, f"audio_chunk_{test_name}")
         
-        print(f"📤 发送{test_name}音频数据")
+        print(f"📤 发送{test_name}音频数据: {stats.chunks} 块, 最大抖动 {stats.max_jitter * 1000:.1f}ms, "
+              f"欠载 {stats.underruns} 次")
         
         # 提交音频缓冲区
         commit_message = {
             "event_id": f"commit_{test_name}",
             "type": "input_audio_buffer.commit"
         }
-        await self.websocket.send(json.dumps(commit_message))
+        await self.client.send(commit_message)
         
         return start_time
     
@@ -187,21 +165,27 @@ class IntelligentAudioTester:
             "responses": []
         }
         
-        # 配置session
-        await self.send_session_config(test_scenario)
-        await asyncio.sleep(1)
-        
-        # 生成和发送测试音频
+        # 生成测试音频
         if sound_type in ["nature", "mechanical", "music"]:
             audio_data = await self.generate_environment_audio(sound_type)
         else:  # human_speech
             audio_data = await self.generate_environment_audio("human_speech")
         
-        send_start = await self.send_test_audio(audio_data, f"{test_scenario}_{sound_type}")
-        
-        # 等待响应 (最多10秒)
+        # 从会话池取出该场景已配置好的会话，发送测试音频
+        # 超时或出错时异常穿过 acquire：会话可能还有进行中的回复，由会话池关闭丢弃，不会串到下一个测试
         response_timeout = 10
-        await asyncio.sleep(response_timeout)
+        try:
+            async with self.pool.acquire(self.session_config(test_scenario)) as client:
+                self.client = client
+                # 服务端VAD在音频提交后自动回复：发送前登记等待，文本和语音转录都到达即结束 (最多10秒)
+                test_name = f"{test_scenario}_{sound_type}"
+                response = client.expect(*TERMINAL_EVENTS, event_ids=(f"commit_{test_name}",))
+                send_start = await self.send_test_audio(audio_data, test_name)
+                await response.wait(response_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {response_timeout}秒内没有收到完整回复")
+        except RealtimeError as e:
+            print(f"⚠️ 回复失败: {e}")
         
         # 分析结果
         await self.analyze_test_result()
@@ -278,61 +262,56 @@ class IntelligentAudioTester:
         
         return score
     
-    async def listen_for_responses(self):
-        """监听服务器响应并记录测试数据"""
-        async for message in self.websocket:
-            try:
-                data = json.loads(message)
-                event_type = data.get("type", "unknown")
-                
-                # 记录响应时间
-                if self.current_test:
-                    response_data = {
-                        "type": event_type,
-                        "time": time.time() - self.current_test["start_time"],
-                        "data": data
-                    }
-                
-                if event_type == "session.created":
-                    print("✅ Session创建成功")
-                    
-                elif event_type == "session.updated":
-                    print("✅ Session配置更新成功")
-                    
-                elif event_type == "conversation.item.input_audio_transcription.completed":
-                    transcript = data.get("transcript", "")
-                    print(f"🎤 转录完成: {transcript}")
-                    
-                    if self.current_test:
-                        response_data["transcript"] = transcript
-                        self.current_test["responses"].append(response_data)
-                    
-                elif event_type == "response.text.done":
-                    content = data.get("content", "")
-                    print(f"💡 AI分析结果: {content}")
-                    
-                    if self.current_test:
-                        response_data["content"] = content
-                        self.current_test["responses"].append(response_data)
-                    
-                elif event_type == "response.audio_transcript.done":
-                    transcript = data.get("transcript", "")
-                    print(f"🤖 AI回复转录: {transcript}")
-                    
-                    if self.current_test:
-                        response_data["ai_transcript"] = transcript
-                        self.current_test["responses"].append(response_data)
-                    
-                elif event_type == "error":
-                    error_info = data.get("error", {})
-                    print(f"❌ 错误: {error_info.get('message', 'Unknown error')}")
-                    
-                    if self.current_test:
-                        response_data["error"] = error_info
-                        self.current_test["responses"].append(response_data)
-                    
-            except Exception as e:
-                print(f"❌ 解析消息失败: {e}")
+    def record_event(self, event: RealtimeEvent):
+        """处理服务器事件并记录测试数据"""
+        data = event.data
+        event_type = event.type
+        
+        # 记录响应时间
+        if self.current_test:
+            response_data = {
+                "type": event_type,
+                "time": time.time() - self.current_test["start_time"],
+                "data": data
+            }
+        
+        if event_type == "session.created":
+            print("✅ Session创建成功")
+            
+        elif event_type == "session.updated":
+            print("✅ Session配置更新成功")
+            
+        elif event_type == "conversation.item.input_audio_transcription.completed":
+            transcript = data.get("transcript", "")
+            print(f"🎤 转录完成: {transcript}")
+            
+            if self.current_test:
+                response_data["transcript"] = transcript
+                self.current_test["responses"].append(response_data)
+            
+        elif event_type == "response.text.done":
+            content = data.get("content", "")
+            print(f"💡 AI分析结果: {content}")
+            
+            if self.current_test:
+                response_data["content"] = content
+                self.current_test["responses"].append(response_data)
+            
+        elif event_type == "response.audio_transcript.done":
+            transcript = data.get("transcript", "")
+            print(f"🤖 AI回复转录: {transcript}")
+            
+            if self.current_test:
+                response_data["ai_transcript"] = transcript
+                self.current_test["responses"].append(response_data)
+            
+        elif event_type == "error":
+            error_info = data.get("error", {})
+            print(f"❌ 错误: {error_info.get('message', 'Unknown error')}")
+            
+            if self.current_test:
+                response_data["error"] = error_info
+                self.current_test["responses"].append(response_data)
 
 async def main():
     """主测试函数 - 全面测试智能音频分类"""
@@ -347,9 +326,6 @@ async def main():
         print("❌ 连接失败，测试终止")
         return
     
-    # 启动响应监听
-    listen_task = asyncio.create_task(tester.listen_for_responses())
-    
     try:
         # 测试场景定义
         test_scenarios = [
@@ -370,10 +346,6 @@ async def main():
         for i, (scenario, sound_type) in enumerate(test_scenarios, 1):
             print(f"\n{'='*20} 测试 {i}/{len(test_scenarios)} {'='*20}")
             await tester.run_classification_test(scenario, sound_type)
-            
-            if i < len(test_scenarios):
-                print("⏸️ 等待3秒后进行下一测试...")
-                await asyncio.sleep(3)
         
         # 生成最终报告
         print(f"\n{'='*60}")
@@ -409,9 +381,7 @@ async def main():
     except Exception as e:
         print(f"\n❌ 测试过程中出错: {e}")
     finally:
-        listen_task.cancel()
-        if tester.websocket:
-            await tester.websocket.close()
+        await tester.pool.close()
         print("🔌 连接已关闭")
 
 if __name__ == "__main__":
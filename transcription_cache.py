@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+基于内容哈希的转录结果持久化缓存（SQLite，按大小LRU淘汰）
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class TranscriptionCache:
+    """以 (音频内容哈希, 模型名, 模型版本) 为键缓存转录文本
+
+    音频记录大多在两次数据集构建之间保持不变，命中缓存即可跳过转录。
+    总大小超过 max_bytes 时按最近访问时间淘汰最旧的条目，直到降到上限的90%。
+    可以在多个工作线程间共享。
+    """
+
+    def __init__(self, db_path: str = ".cache/transcriptions.sqlite3",
+                 max_bytes: int = 256 * 1024 * 1024):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcriptions (
+                content_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (content_hash, model_name, model_version)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transcriptions_access ON transcriptions (last_access)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcriptions"
+        ).fetchone()[0]
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """计算音频文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_bytes(data) -> str:
+        """计算内存中音频数据（bytes/memoryview/numpy数组）的SHA-256"""
+        return hashlib.sha256(memoryview(data).cast("B")).hexdigest()
+
+    def get(self, content_hash: str, model_name: str, model_version: str) -> Optional[str]:
+        """查询缓存，命中时刷新访问时间"""
+        key = (content_hash, model_name, model_version)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM transcriptions "
+                "WHERE content_hash = ? AND model_name = ? AND model_version = ?",
+                key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE transcriptions SET last_access = ? "
+                "WHERE content_hash = ? AND model_name = ? AND model_version = ?",
+                (time.time(),) + key
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, content_hash: str, model_name: str, model_version: str, text: str):
+        """写入转录结果，必要时淘汰最久未访问的条目"""
+        size = len(content_hash) + len(model_name) + len(model_version) + len(text.encode("utf-8"))
+        key = (content_hash, model_name, model_version)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM transcriptions "
+                "WHERE content_hash = ? AND model_name = ? AND model_version = ?",
+                key
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcriptions "
+                "(content_hash, model_name, model_version, text, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                key + (text, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    def _evict(self, target_bytes: int):
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM transcriptions ORDER BY last_access"
+        )
+        expired = []
+        for rowid, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            expired.append((rowid,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM transcriptions WHERE rowid = ?", expired)
+
+    def reset_stats(self):
+        """清零命中统计（每次运行开始时调用）"""
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中/未命中次数和当前占用大小"""
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+基于能量和过零率的语音活动检测：ASR之前裁掉静音段，并保留裁剪后到原始音频的时间映射
+"""
+
+import threading
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class TrimResult(NamedTuple):
+    """裁剪结果：audio 为拼接后的语音段，segments 为各段在原始音频中的 [start, end) 样本下标"""
+    audio: np.ndarray
+    segments: List[Tuple[int, int]]
+    sample_rate: int
+    original_samples: int
+
+    @property
+    def silent(self) -> bool:
+        return not self.segments
+
+    def to_original(self, seconds: float) -> float:
+        """把裁剪后音频中的时间（秒）换算回原始音频中的时间"""
+        if not self.segments:
+            return 0.0
+        sample = seconds * self.sample_rate
+        starts = np.array([start for start, _ in self.segments])
+        lengths = np.array([end - start for start, end in self.segments])
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        index = min(int(np.searchsorted(offsets, sample, side="right")) - 1, len(self.segments) - 1)
+        return float(starts[index] + sample - offsets[index]) / self.sample_rate
+
+    def segment_seconds(self) -> List[Tuple[float, float]]:
+        """语音段在原始音频中的起止时间（秒）"""
+        return [(start / self.sample_rate, end / self.sample_rate) for start, end in self.segments]
+
+
+class SilenceTrimmer:
+    """按帧计算对数能量和过零率，判定语音帧后合并成段
+
+    能量阈值相对每条音频的噪声底（帧能量的低分位数）自适应，并设绝对下限：
+    能量高于强阈值的帧直接判为语音；能量略低但过零率高的帧（清辅音）也判为语音。
+    高低分位数之间相差不到 margin_db 时估计不出噪声底（没有停顿的连续语音，或稳定的环境噪声/交流声），
+    此时用绝对下限 min_speech_db，并要求过零率低于 zcr_threshold（排除白噪声）、带回差的过零率对应的频率
+    高于 min_pitch_hz（排除交流声），稳定的环境噪声不会被当成语音。
+    语音段两侧各保留 padding_ms，间隔短于 min_silence_ms 的静音并入语音，短于 min_speech_ms 的段丢弃。
+    全部帧为静音时返回空段，调用方可以完全跳过模型。
+    统计累计处理的时长和被跳过的时长，供 report() 输出。
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: float = 25, hop_ms: float = 10,
+                 floor_percentile: float = 10, margin_db: float = 12, min_speech_db: float = -45,
+                 zcr_threshold: float = 0.25, min_pitch_hz: float = 100, padding_ms: float = 200, min_silence_ms: float = 300,
+                 min_speech_ms: float = 150):
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.hop = int(sample_rate * hop_ms / 1000)
+        self.floor_percentile = floor_percentile
+        self.margin_db = margin_db
+        self.min_speech_db = min_speech_db
+        self.zcr_threshold = zcr_threshold
+        self.min_pitch_hz = min_pitch_hz
+        self.padding_frames = int(padding_ms / hop_ms)
+        self.min_silence_frames = int(min_silence_ms / hop_ms)
+        self.min_speech_frames = int(min_speech_ms / hop_ms)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def frame_features(self, audio: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回每帧的对数能量（dBFS）和过零率，[frames]"""
+        if len(audio) < self.frame:
+            audio = np.pad(audio, (0, self.frame - len(audio)))
+        frames = np.lib.stride_tricks.sliding_window_view(audio, self.frame)[::self.hop]
+        energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame - 1)
+        return energy_db, zcr
+
+    def hysteresis_zcr(self, audio: np.ndarray, ratio: float = 1.0) -> np.ndarray:
+        """带回差的过零率：幅度低于帧内 ratio×RMS 的样本不算换号，叠加在低频信号上的小噪声不会产生假过零，
+        结果接近基频的两倍除以采样率"""
+        if len(audio) < self.frame:
+            audio = np.pad(audio, (0, self.frame - len(audio)))
+        frames = np.lib.stride_tricks.sliding_window_view(audio, self.frame)[::self.hop]
+        level = ratio * np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1, keepdims=True))
+        signs = np.where(frames > level, 1, np.where(frames < -level, -1, 0)).astype(np.int8)
+        # 回差区内的样本沿用上一个有效符号
+        last = np.maximum.accumulate(np.where(signs != 0, np.arange(self.frame), 0), axis=1)
+        held = np.take_along_axis(signs, last, axis=1)
+        crossings = (held[:, 1:] != held[:, :-1]) & (held[:, :-1] != 0)
+        return np.count_nonzero(crossings, axis=1) / (self.frame - 1)
+
+    def speech_mask(self, audio: np.ndarray) -> np.ndarray:
+        """逐帧语音判定，已做补边和短静音/短语音平滑"""
+        energy_db, zcr = self.frame_features(audio)
+        floor, ceiling = np.percentile(energy_db, [self.floor_percentile, 100 - self.floor_percentile])
+        if ceiling - floor < self.margin_db:
+            # 能量分布没有高低两簇（整段连续语音或整段稳定的环境音），低分位数不是噪声底：
+            # 按绝对下限判定能量，过零率高的（宽带噪声）不算，带回差的过零率低于基音下限的（50/60Hz 交流声）也不算
+            pitch_zcr = self.hysteresis_zcr(audio)
+            mask = ((energy_db > self.min_speech_db) & (zcr < self.zcr_threshold)
+                    & (pitch_zcr > 2 * self.min_pitch_hz / self.sample_rate))
+        else:
+            strong = max(floor + self.margin_db, self.min_speech_db)
+            weak = max(floor + self.margin_db / 2, self.min_speech_db - 10)
+            mask = (energy_db > strong) | ((energy_db > weak) & (zcr > self.zcr_threshold))
+
+        mask = self._drop_short_runs(mask, value=False, min_length=self.min_silence_frames)
+        mask = self._drop_short_runs(mask, value=True, min_length=self.min_speech_frames)
+        if self.padding_frames and mask.any():
+            kernel = np.ones(2 * self.padding_frames + 1)
+            mask = np.convolve(mask.astype(np.float32), kernel, mode="same") > 0
+        return mask
+
+    def trim(self, audio: np.ndarray) -> TrimResult:
+        """裁掉静音段，返回拼接后的语音和时间映射"""
+        mask = self.speech_mask(audio)
+        # 帧级判定换算为样本区间：第 i 帧覆盖 [i*hop, i*hop+frame)
+        edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+        segments = [
+            (int(start * self.hop), int(min(end * self.hop - self.hop + self.frame, len(audio))))
+            for start, end in zip(edges[::2], edges[1::2])
+        ]
+        trimmed = np.concatenate([audio[start:end] for start, end in segments]) if segments else audio[:0]
+        self._record(len(audio), len(trimmed))
+        return TrimResult(trimmed, segments, self.sample_rate, len(audio))
+
+    def reset_stats(self):
+        with self._lock:
+            self.clips = 0
+            self.silent_clips = 0
+            self.input_samples = 0
+            self.kept_samples = 0
+
+    def stats(self) -> Dict[str, float]:
+        """累计处理的片段数、全静音片段数、输入/保留/跳过的秒数"""
+        with self._lock:
+            return {
+                "clips": self.clips,
+                "silent_clips": self.silent_clips,
+                "input_seconds": self.input_samples / self.sample_rate,
+                "kept_seconds": self.kept_samples / self.sample_rate,
+                "skipped_seconds": (self.input_samples - self.kept_samples) / self.sample_rate,
+            }
+
+    def report(self) -> str:
+        stats = self.stats()
+        skipped_ratio = stats["skipped_seconds"] / stats["input_seconds"] if stats["input_seconds"] else 0
+        return (f"静音裁剪: {stats['clips']} 段音频, {stats['silent_clips']} 段全静音已跳过, "
+                f"跳过 {stats['skipped_seconds']:.1f}s / {stats['input_seconds']:.1f}s ({skipped_ratio:.1%})")
+
+    def _record(self, input_samples: int, kept_samples: int):
+        with self._lock:
+            self.clips += 1
+            self.silent_clips += kept_samples == 0
+            self.input_samples += input_samples
+            self.kept_samples += kept_samples
+
+    @staticmethod
+    def _drop_short_runs(mask: np.ndarray, value: bool, min_length: int) -> np.ndarray:
+        """把值为 value 且长度小于 min_length 的连续段翻转；静音段只处理两段语音之间的间隔"""
+        if min_length <= 1 or not len(mask):
+            return mask
+        changes = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+        starts = np.concatenate([[0], changes])
+        ends = np.concatenate([changes, [len(mask)]])
+        mask = mask.copy()
+        for start, end in zip(starts, ends):
+            internal = start > 0 and end < len(mask)
+            if mask[start] == value and end - start < min_length and (value or internal):
+                mask[start:end] = not value
+        return mask
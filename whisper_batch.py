@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Whisper批量转录引擎：按时长分桶、逐段提取log-mel、批量解码
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+from model_registry import registry, whisper_model_key
+
+# 词之间不加空格的语言，相邻窗口的文本直接拼接
+UNSPACED_LANGUAGES = {"zh", "ja", "th", "lo", "km", "my", "yue", "bo"}
+
+
+class BatchTranscriber:
+    """把多个音频片段合并成批次送入Whisper
+
+    Whisper编码器的输入固定为30秒窗口，长音频按30秒切窗后与其他片段一起组批。
+    批次内的解码步数由最长的片段决定，因此按实际时长分桶：
+    同一批次中短片段的填充比例不超过 max_padding_ratio。
+    切窗点取每个窗口末尾 search_seconds 内能量最低的位置，避免把词切成两半。
+    language=None 时逐窗口自动检测语言。
+    """
+
+    def __init__(self, model, batch_size: int = 16, max_padding_ratio: float = 0.3,
+                 language: Optional[str] = None, search_seconds: float = 5):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_padding_ratio = max_padding_ratio
+        self.search_samples = int(search_seconds * SAMPLE_RATE)
+        self.options = whisper.DecodingOptions(
+            language=language,
+            without_timestamps=True,
+            fp16=model.device.type == "cuda"
+        )
+
+    def transcribe_batch(self, audio_paths: Dict[str, str]) -> Dict[str, Union[str, Exception]]:
+        """批量转录，返回 {record_id: 转录文本}
+
+        每个文件单独解码，解码失败的记录对应的值为异常，不影响同批其他记录。
+        """
+        clips, failed = {}, {}
+        for record_id, path in audio_paths.items():
+            try:
+                clips[record_id] = whisper.load_audio(path)
+            except Exception as e:
+                failed[record_id] = e
+        results = self.transcribe_arrays(clips) if clips else {}
+        return {record_id: failed.get(record_id, results.get(record_id)) for record_id in audio_paths}
+
+    def transcribe_arrays(self, clips: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """转录已解码的16kHz单声道float32音频"""
+        windows = []
+        for record_id, audio in clips.items():
+            for index, (start, end) in enumerate(self.split_windows(audio)):
+                windows.append((record_id, index, audio[start:end]))
+
+        texts: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        for bucket in self.plan_buckets([len(w[2]) / SAMPLE_RATE for w in windows]):
+            batch = [windows[i] for i in bucket]
+            for (record_id, index, _), result in zip(batch, self._decode([w[2] for w in batch])):
+                texts[(record_id, index)] = (result.text, result.language)
+
+        results = {}
+        for record_id, index, _ in windows:
+            text, language = texts[(record_id, index)]
+            previous = results.get(record_id)
+            if not previous or not text or language in UNSPACED_LANGUAGES:
+                results[record_id] = (previous or "") + text
+            else:
+                results[record_id] = previous + " " + text
+        return results
+
+    def split_windows(self, audio: np.ndarray, frame: int = SAMPLE_RATE // 50) -> List[Tuple[int, int]]:
+        """把长音频切成不超过30秒的窗口，返回 [start, end) 样本下标
+
+        每个窗口在最后 search_samples 内找20ms帧能量最低处切开，而不是固定在30秒整点。
+        """
+        spans = []
+        start = 0
+        while len(audio) - start > N_SAMPLES:
+            search = audio[start + N_SAMPLES - self.search_samples:start + N_SAMPLES]
+            frames = search[:len(search) // frame * frame].reshape(-1, frame)
+            quietest = int(np.argmin(np.mean(np.square(frames), axis=1)))
+            end = start + N_SAMPLES - self.search_samples + quietest * frame + frame // 2
+            spans.append((start, end))
+            start = end
+        spans.append((start, len(audio)))
+        return spans
+
+    def plan_buckets(self, durations: List[float]) -> List[List[int]]:
+        """按时长降序贪心分桶，返回每个批次的下标列表
+
+        填充比例 = 1 - 桶内总时长 / (片段数 × 桶内最长时长)，
+        超过 max_padding_ratio 或达到 batch_size 时开启新桶。
+        """
+        order = sorted(range(len(durations)), key=lambda i: durations[i], reverse=True)
+        buckets: List[List[int]] = []
+        current: List[int] = []
+        total = 0.0
+        for i in order:
+            if current:
+                longest = durations[current[0]]
+                padding = 1 - (total + durations[i]) / ((len(current) + 1) * longest) if longest else 0
+                if len(current) >= self.batch_size or padding > self.max_padding_ratio:
+                    buckets.append(current)
+                    current, total = [], 0.0
+            current.append(i)
+            total += durations[i]
+        if current:
+            buckets.append(current)
+        return buckets
+
+    def log_mel(self, audios: List[np.ndarray]) -> torch.Tensor:
+        """逐段提取log-mel后堆叠成批
+
+        log_mel_spectrogram 把动态范围限制在输入最大值以下8dB内，对整批一起计算时
+        安静的片段会按批内最响的片段截断，特征随同批片段变化；逐段计算与单条 transcribe 一致。
+        """
+        return torch.stack([
+            whisper.log_mel_spectrogram(torch.from_numpy(whisper.pad_or_trim(audio)).to(self.model.device),
+                                        n_mels=self.model.dims.n_mels)
+            for audio in audios
+        ])
+
+    def _decode(self, audios: List[np.ndarray]) -> List[whisper.DecodingResult]:
+        """一次前向完成整批解码"""
+        return whisper.decode(self.model, self.log_mel(audios), self.options)
+
+
+# ---- 进程池工作进程：每个进程只加载一次模型 ----
+
+_worker_transcriber: Optional[BatchTranscriber] = None
+
+
+def init_worker(model_name: str, batch_size: int, max_padding_ratio: float, num_threads: int = 1,
+                language: Optional[str] = None):
+    """ProcessPoolExecutor 的 initializer：限定线程数并加载模型"""
+    global _worker_transcriber
+    # 每个进程固定少量线程，避免多进程间线程超订
+    torch.set_num_threads(num_threads)
+    model = registry.get(whisper_model_key(model_name, device="cpu"))
+    _worker_transcriber = BatchTranscriber(model, batch_size=batch_size, max_padding_ratio=max_padding_ratio,
+                                           language=language)
+
+
+def transcribe_in_worker(items: List[Tuple[str, str]]) -> List[Union[str, Exception]]:
+    """在工作进程中批量转录，items 为 (record_id, 音频路径)；解码失败的条目返回异常"""
+    results = _worker_transcriber.transcribe_batch(dict(items))
+    return [results[record_id] for record_id, _ in items]